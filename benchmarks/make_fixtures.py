@@ -0,0 +1,137 @@
+"""Fixtures de données de marché des benchmarks, au format de LocalFileProvider.
+
+benchmarks/fixtures/ contient:
+    prices.csv.gz  cours de clôture ajustés (dates x symboles)
+    tickers.json   fiches Yahoo (Ticker.info) par symbole
+    search.json    réponses de l'API Yahoo Search par requête
+
+Les fixtures livrées sont synthétiques et déterministes; "record" les remplace par de vraies réponses
+Yahoo Finance obtenues via YFinanceProvider. L'application peut aussi tourner sur ces fixtures:
+    PORTFOLIO_DATA_PROVIDER=local:benchmarks/fixtures PORTFOLIO_DATA_SHIFT_TO_TODAY=1 streamlit run streamlit_app.py
+
+Usage:
+    python benchmarks/make_fixtures.py synthesize           # fixtures synthétiques déterministes
+    python benchmarks/make_fixtures.py record AAPL MC.PA    # enregistrement réel (réseau requis)
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+BENCHMARK_SYMBOL = '^GSPC'
+SYNTHETIC_START = '2019-01-01'
+SYNTHETIC_END = '2026-09-30'
+SYNTHETIC_UNIVERSE = {
+    'USA': ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'NVDA', 'META', 'JPM', 'JNJ', 'XOM', 'PG', 'KO', 'PFE'],
+    'France': ['MC.PA', 'OR.PA', 'TTE.PA', 'SAN.PA', 'AIR.PA', 'BNP.PA', 'SU.PA', 'AI.PA'],
+    'Germany': ['SAP.DE', 'SIE.DE', 'ALV.DE', 'BAS.DE'],
+    'UK': ['SHEL.L', 'HSBA.L', 'AZN.L', 'ULVR.L'],
+    'Japan': ['7203.T', '6758.T', '9984.T'],
+    'Switzerland': ['NESN.SW', 'NOVN.SW', 'ROG.SW'],
+    'Netherlands': ['ASML.AS', 'INGA.AS'],
+    'Crypto': ['BTC-USD', 'ETH-USD']
+}
+SYNTHETIC_SECTORS = ['Technology', 'Healthcare', 'Financial Services', 'Energy', 'Consumer Defensive',
+                     'Industrials', 'Consumer Cyclical', 'Basic Materials', 'Communication Services']
+
+
+def synthesize(fixtures_dir: str = FIXTURES_DIR, seed: int = 42):
+    """Écrit des fixtures synthétiques déterministes (cours corrélés au marché, info, recherche)"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(SYNTHETIC_START, SYNTHETIC_END)
+    market = rng.normal(0.0004, 0.011, len(dates))
+    columns = {BENCHMARK_SYMBOL: 4000 * np.exp(np.cumsum(market))}
+    tickers, search = {}, {}
+    for region, symbols in SYNTHETIC_UNIVERSE.items():
+        for symbol in symbols:
+            symbol_rng = np.random.default_rng(zlib.crc32(symbol.encode()) + seed)
+            beta = symbol_rng.uniform(0.5, 1.6)
+            volatility = 0.035 if region == 'Crypto' else symbol_rng.uniform(0.008, 0.02)
+            returns = beta * market + symbol_rng.normal(0.0002, volatility, len(dates))
+            closes = symbol_rng.uniform(20, 500) * np.exp(np.cumsum(returns))
+            listed = symbol_rng.integers(0, len(dates) // 4) if symbol_rng.random() < 0.2 else 0
+            closes[:listed] = np.nan
+            columns[symbol] = closes
+            name = f"{symbol.split('.')[0].split('-')[0].title()} {region} Corp"
+            asset_type = 'CRYPTOCURRENCY' if region == 'Crypto' else 'EQUITY'
+            tickers[symbol] = {
+                'symbol': symbol,
+                'shortName': name,
+                'currentPrice': round(float(closes[-1]), 2),
+                'currency': {'USA': 'USD', 'UK': 'GBp', 'Japan': 'JPY', 'Switzerland': 'CHF'}.get(region, 'EUR'),
+                'exchange': {'USA': 'NMS', 'France': 'PAR', 'Germany': 'GER', 'UK': 'LSE', 'Japan': 'JPX',
+                             'Switzerland': 'EBS', 'Netherlands': 'AMS'}.get(region, 'CCC'),
+                'sector': str(symbol_rng.choice(SYNTHETIC_SECTORS)),
+                'industry': 'Synthetic',
+                'quoteType': asset_type,
+                'marketCap': int(symbol_rng.uniform(1e9, 2e12)),
+                'beta': round(beta, 3)
+            }
+            if region == 'Crypto':
+                del tickers[symbol]['sector'], tickers[symbol]['industry']
+            search[name.lower()] = {'quotes': [{'symbol': symbol, 'shortname': name, 'exchange': tickers[symbol]['exchange'],
+                                                'typeDisp': 'Equity' if region != 'Crypto' else 'Cryptocurrency'}]}
+    prices = pd.DataFrame(columns, index=dates).round(2)
+    prices.index.name = 'Date'
+    _write(fixtures_dir, prices, tickers, search)
+
+
+def record(symbols: List[str], start: str, fixtures_dir: str = FIXTURES_DIR):
+    """Enregistre les vraies réponses Yahoo Finance (cours, fiches, recherche par nom) pour les symboles"""
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from streamlit_app import YFinanceProvider
+
+    provider = YFinanceProvider()
+    symbols = list(dict.fromkeys(symbols + [BENCHMARK_SYMBOL]))
+    end = datetime.now().date() + timedelta(days=1)
+    frames = provider.history(symbols, pd.Timestamp(start).date(), end)
+    prices = pd.DataFrame({symbol: frame['Close'] for symbol, frame in frames.items()}).reindex(columns=symbols).round(4)
+    prices.index.name = 'Date'
+    tickers, search = {}, {}
+    for symbol in symbols:
+        if symbol == BENCHMARK_SYMBOL:
+            continue
+        info = provider.metadata(symbol)
+        tickers[symbol] = {k: info.get(k) for k in ('symbol', 'shortName', 'currentPrice', 'regularMarketPrice',
+                                                    'currency', 'exchange', 'sector', 'industry', 'quoteType',
+                                                    'marketCap', 'beta', 'isin') if info.get(k) is not None}
+        name = info.get('shortName') or symbol
+        results = provider.search(name, limit=10)
+        search[name.lower()] = {'quotes': [{'symbol': r['symbol'], 'shortname': r['name'], 'exchange': r['exchange'],
+                                            'typeDisp': r['type']} for r in results]}
+    _write(fixtures_dir, prices, tickers, search)
+
+
+def _write(fixtures_dir: str, prices: pd.DataFrame, tickers: Dict, search: Dict):
+    os.makedirs(fixtures_dir, exist_ok=True)
+    # mtime=0: fichier identique d'une génération à l'autre
+    with gzip.GzipFile(os.path.join(fixtures_dir, 'prices.csv.gz'), 'wb', mtime=0) as f:
+        f.write(prices.to_csv(date_format='%Y-%m-%d').encode('utf-8'))
+    with open(os.path.join(fixtures_dir, 'tickers.json'), 'w', encoding='utf-8') as f:
+        json.dump(tickers, f, indent=1, sort_keys=True)
+    with open(os.path.join(fixtures_dir, 'search.json'), 'w', encoding='utf-8') as f:
+        json.dump(search, f, indent=1, sort_keys=True)
+    print(f"Fixtures écrites dans {fixtures_dir}: {prices.shape[1]} symboles, {len(prices)} séances")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Gestion des fixtures de données de marché")
+    commands = parser.add_subparsers(dest='command', required=True)
+    synthesize_parser = commands.add_parser('synthesize', help="Fixtures synthétiques déterministes")
+    synthesize_parser.add_argument('--seed', type=int, default=42)
+    record_parser = commands.add_parser('record', help="Enregistrement depuis Yahoo Finance (réseau requis)")
+    record_parser.add_argument('symbols', nargs='+')
+    record_parser.add_argument('--start', default=SYNTHETIC_START)
+    args = parser.parse_args()
+    if args.command == 'synthesize':
+        synthesize(seed=args.seed)
+    else:
+        record(args.symbols, args.start)
@@ -0,0 +1,296 @@
+"""Suite de benchmarks hors ligne: portefeuilles synthétiques (10 à 100k lots) et données de marché locales.
+
+Pour chaque fonction et chaque taille, la suite mesure:
+    cold_ms   premier appel, caches vidés (store SQLite, métadonnées, st.cache_resource)
+    warm_ms   meilleur temps sur plusieurs appels, caches remplis
+    peak_mb   pic d'allocation Python (tracemalloc) pendant un appel à froid
+    calls     appels au fournisseur de données (LocalFileProvider sur benchmarks/fixtures) pendant l'appel à froid
+
+Les résultats sont comparés à benchmarks/baseline.json; une régression (temps ou mémoire au-delà de la
+tolérance, ou appel réseau supplémentaire) donne un code de sortie non nul. Les temps de référence
+dépendent de la machine: régénérer la baseline avec --update-baseline avant de comparer ailleurs.
+
+Usage:
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --quick --only frontier
+    python benchmarks/run_benchmarks.py --update-baseline
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+WORK_DIR = tempfile.mkdtemp(prefix='portfolio-bench-')
+os.environ['PORTFOLIO_PRICE_STORE'] = os.path.join(WORK_DIR, 'prices.sqlite')
+os.environ['PORTFOLIO_METADATA_CACHE'] = os.path.join(WORK_DIR, 'metadata.json')
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+import streamlit as st  # noqa: E402
+import streamlit.config  # noqa: E402
+import streamlit.logger  # noqa: E402
+
+streamlit.config.get_config_options()
+streamlit.logger.set_log_level('error')
+
+import streamlit_app  # noqa: E402
+from make_fixtures import BENCHMARK_SYMBOL, FIXTURES_DIR  # noqa: E402
+
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, 'baseline.json')
+LOT_SIZES = [10, 1_000, 10_000, 100_000]
+SYMBOL_SIZES = [5, 20, 39]
+QUICK_LIMIT = 10_000
+
+
+class Benchmark(NamedTuple):
+    name: str
+    sizes: List[int]
+    build: Callable[[int], Dict]
+    run: Callable[[Dict], object]
+    reset: Optional[Callable[[Dict], None]] = None
+    repeats: int = 5
+
+
+def synthetic_portfolio(provider: streamlit_app.LocalFileProvider, n_lots: int, seed: int = 0) -> pd.DataFrame:
+    """Portefeuille synthétique sur l'univers des fixtures, avec cas limites (prix d'achat nuls, achats du jour, dates manquantes)"""
+    rng = np.random.default_rng(seed)
+    today = pd.Timestamp(datetime.now().date())
+    closes = provider.prices.drop(columns=BENCHMARK_SYMBOL)
+    symbols = closes.columns.to_numpy()
+    symbol = rng.choice(symbols, n_lots)
+    span_days = (today - closes.apply(pd.Series.first_valid_index)).dt.days.reindex(symbol).to_numpy()
+    purchase_date = today - pd.to_timedelta((rng.random(n_lots) * span_days).astype(int), unit='D')
+    purchase_date = pd.Series(purchase_date).where(rng.random(n_lots) >= 0.01)
+    last_price = closes.ffill().iloc[-1].reindex(symbol).to_numpy()
+    buying_price = last_price / rng.lognormal(0.05, 0.4, n_lots)
+    buying_price[rng.random(n_lots) < 0.01] = 0.0
+    quantity = rng.integers(1, 1_000, n_lots).astype(float)
+    tickers = provider.tickers
+    return pd.DataFrame({
+        'name': [tickers[s]['shortName'] for s in symbol],
+        'symbol': symbol,
+        'purchase_date': purchase_date.to_numpy(),
+        'quantity': quantity,
+        'buyingPrice': buying_price,
+        'lastPrice': last_price,
+        'amount': quantity * last_price,
+        'sector': [tickers[s].get('sector', 'Unknown') for s in symbol],
+        'asset_type': 'Stock'
+    })
+
+
+def reference_annualized_returns(df: pd.DataFrame) -> np.ndarray:
+    """Implémentation ligne à ligne de référence"""
+    today = pd.Timestamp(datetime.now().date())
+    values = []
+    for _, row in df.iterrows():
+        days = max(1, (today - row['purchase_date']).days) if pd.notna(row['purchase_date']) else 1
+        values.append(streamlit_app.PortfolioManager.calculate_annualized_return(
+            row['buyingPrice'] * row['quantity'], row['lastPrice'] * row['quantity'], days
+        ))
+    return np.array(values, dtype=float)
+
+
+def check_equivalence(provider: streamlit_app.LocalFileProvider):
+    df = synthetic_portfolio(provider, 2_000, seed=1)
+    expected = reference_annualized_returns(df)
+    st.session_state.portfolio_df = df.copy()
+    streamlit_app.PortfolioManager().update_portfolio_metrics()
+    actual = st.session_state.portfolio_df['annualized_return'].to_numpy()
+    np.testing.assert_allclose(actual, expected, rtol=1e-6, atol=1e-6)
+    print("Équivalence avec l'implémentation ligne à ligne: OK")
+
+
+def analysed_portfolio(provider: streamlit_app.LocalFileProvider, n_lots: int) -> Dict:
+    df, _ = streamlit_app.compute_portfolio_metrics(synthetic_portfolio(provider, n_lots))
+    return {'df': df}
+
+
+def import_frame(provider: streamlit_app.LocalFileProvider, n_lots: int) -> Dict:
+    """Positions telles qu'importées: 1% sans symbole, à résoudre par nom (10 noms distincts)"""
+    df = synthetic_portfolio(provider, n_lots)[['name', 'symbol', 'quantity', 'buyingPrice', 'lastPrice']]
+    unresolved = np.random.default_rng(2).random(len(df)) < 0.01
+    names = [info['shortName'] for info in list(provider.tickers.values())[:10]]
+    df.loc[unresolved, 'symbol'] = ''
+    df.loc[unresolved, 'name'] = np.resize(names, int(unresolved.sum()))
+    return {'df': df}
+
+
+def frontier_inputs(provider: streamlit_app.LocalFileProvider, n_symbols: int) -> Dict:
+    end_date = datetime.now().date()
+    return {
+        'symbols': [s for s in provider.prices.columns if s != BENCHMARK_SYMBOL][:n_symbols],
+        'start_date': (end_date - timedelta(days=3 * 365)).isoformat(),
+        'end_date': end_date.isoformat()
+    }
+
+
+def reset_session_portfolio(state: Dict):
+    st.session_state.portfolio_df = state['df'].copy()
+
+
+def benchmarks(provider: streamlit_app.LocalFileProvider) -> List[Benchmark]:
+    analyzer = streamlit_app.DiversificationAnalyzer
+    return [
+        Benchmark('update_portfolio_metrics', LOT_SIZES,
+                  lambda n: {'df': synthetic_portfolio(provider, n), 'manager': streamlit_app.PortfolioManager()},
+                  lambda s: s['manager'].update_portfolio_metrics(), reset_session_portfolio),
+        Benchmark('enhance_dataframe', LOT_SIZES, lambda n: import_frame(provider, n),
+                  lambda s: streamlit_app.enhance_dataframe(s['df'])),
+        Benchmark('concentration_metrics', LOT_SIZES, lambda n: analysed_portfolio(provider, n),
+                  lambda s: analyzer.calculate_concentration_metrics(s['df'])),
+        Benchmark('sector_diversification', LOT_SIZES, lambda n: analysed_portfolio(provider, n),
+                  lambda s: analyzer.analyze_sector_diversification(s['df'])),
+        Benchmark('geographic_diversification', LOT_SIZES, lambda n: analysed_portfolio(provider, n),
+                  lambda s: analyzer.analyze_geographic_diversification(s['df'])),
+        Benchmark('advanced_metrics', LOT_SIZES, lambda n: analysed_portfolio(provider, n),
+                  lambda s: streamlit_app.RiskPerformanceAnalyzer.calculate_advanced_metrics(s['df']), repeats=3),
+        Benchmark('efficient_frontier', SYMBOL_SIZES, lambda n: frontier_inputs(provider, n),
+                  lambda s: streamlit_app.EfficientFrontier.get_efficient_frontier(
+                      s['symbols'], s['start_date'], s['end_date'], frontier_points=25), repeats=3),
+        Benchmark('frontier_curve', SYMBOL_SIZES, lambda n: frontier_inputs(provider, n),
+                  lambda s: streamlit_app.EfficientFrontier.generate_efficient_frontier_curve(
+                      s['symbols'], s['start_date'], s['end_date'], num_portfolios=50, seed=0), repeats=3)
+    ]
+
+
+@contextmanager
+def installed_provider(provider: streamlit_app.MarketDataProvider):
+    """Sert les données de marché depuis provider le temps du bloc (get_market_data remplacé, hors cache)"""
+    saved = streamlit_app.get_market_data
+    streamlit_app.get_market_data = lambda: provider
+    try:
+        yield provider
+    finally:
+        streamlit_app.get_market_data = saved
+
+
+def clear_caches():
+    """Repart à froid: caches Streamlit et fichiers du store de prix et des métadonnées"""
+    st.cache_resource.clear()
+    st.cache_data.clear()
+    for entry in os.listdir(WORK_DIR):
+        os.remove(os.path.join(WORK_DIR, entry))
+
+
+def measure(benchmark: Benchmark, size: int, provider: streamlit_app.LocalFileProvider) -> Dict:
+    state = benchmark.build(size)
+    reset = benchmark.reset or (lambda s: None)
+    clear_caches()
+    reset(state)
+    provider.calls.clear()
+    start = time.perf_counter()
+    benchmark.run(state)
+    cold = time.perf_counter() - start
+    calls = dict(provider.calls)
+    clear_caches()
+    reset(state)
+    tracemalloc.start()
+    benchmark.run(state)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    warm = float('inf')
+    for _ in range(benchmark.repeats):
+        reset(state)
+        start = time.perf_counter()
+        benchmark.run(state)
+        warm = min(warm, time.perf_counter() - start)
+    return {
+        'warm_ms': round(warm * 1e3, 3),
+        'cold_ms': round(cold * 1e3, 3),
+        'peak_mb': round(peak / 1024 ** 2, 3),
+        'network_calls': sum(calls.values()),
+        'calls': calls
+    }
+
+
+def compare(result: Dict, reference: Optional[Dict], time_tolerance: float, memory_tolerance: float) -> List[str]:
+    """Écarts significatifs par rapport à la baseline (bruit absolu ignoré: 2 ms, 1 Mo)"""
+    if reference is None:
+        return []
+    regressions = []
+    for key in ('warm_ms', 'cold_ms'):
+        limit = reference[key] * (1 + time_tolerance)
+        if result[key] > limit and result[key] - reference[key] > 2:
+            regressions.append(f"{key} {reference[key]:.1f} -> {result[key]:.1f}")
+    if result['peak_mb'] > reference['peak_mb'] * (1 + memory_tolerance) and result['peak_mb'] - reference['peak_mb'] > 1:
+        regressions.append(f"peak_mb {reference['peak_mb']:.1f} -> {result['peak_mb']:.1f}")
+    if result['network_calls'] > reference['network_calls']:
+        regressions.append(f"network_calls {reference['network_calls']} -> {result['network_calls']}")
+    return regressions
+
+
+def load_baseline(path: str) -> Dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f).get('results', {})
+
+
+def save_baseline(path: str, results: Dict):
+    payload = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.platform(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'results': results
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, indent=2, sort_keys=True)
+        f.write('\n')
+    print(f"Baseline enregistrée: {path}")
+
+
+def run(only: Optional[List[str]] = None, quick: bool = False, baseline_path: str = BASELINE_PATH,
+        update_baseline: bool = False, time_tolerance: float = 0.5, memory_tolerance: float = 0.2) -> int:
+    provider = streamlit_app.LocalFileProvider(FIXTURES_DIR, shift_to_today=True)
+    baseline = load_baseline(baseline_path)
+    results, failures = {}, 0
+    with installed_provider(provider):
+        check_equivalence(provider)
+        print(f"{'cas':<36}{'warm ms':>10}{'cold ms':>10}{'pic Mo':>9}{'réseau':>8}  statut")
+        for benchmark in benchmarks(provider):
+            if only and not any(pattern in benchmark.name for pattern in only):
+                continue
+            for size in benchmark.sizes:
+                if quick and size > QUICK_LIMIT:
+                    continue
+                case = f"{benchmark.name}[{size}]"
+                result = measure(benchmark, size, provider)
+                results[case] = result
+                regressions = compare(result, baseline.get(case), time_tolerance, memory_tolerance)
+                failures += bool(regressions)
+                status = 'RÉGRESSION: ' + ', '.join(regressions) if regressions else ('OK' if case in baseline else 'nouveau')
+                print(f"{case:<36}{result['warm_ms']:>10.2f}{result['cold_ms']:>10.2f}{result['peak_mb']:>9.2f}"
+                      f"{result['network_calls']:>8}  {status}")
+    shutil.rmtree(WORK_DIR, ignore_errors=True)
+    if update_baseline:
+        save_baseline(baseline_path, {**baseline, **results})
+        return 0
+    if failures:
+        print(f"{failures} régression(s) par rapport à {baseline_path}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmarks hors ligne de Portfolio Analyzer")
+    parser.add_argument('--only', nargs='+', help="Ne lancer que les benchmarks dont le nom contient ces motifs")
+    parser.add_argument('--quick', action='store_true', help=f"Tailles limitées à {QUICK_LIMIT:,} lots")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true', help="Enregistrer les résultats comme référence")
+    parser.add_argument('--time-tolerance', type=float, default=0.5, help="Hausse de temps tolérée (0.5 = +50%%)")
+    parser.add_argument('--memory-tolerance', type=float, default=0.2, help="Hausse de pic mémoire tolérée")
+    args = parser.parse_args()
+    sys.exit(run(args.only, args.quick, args.baseline, args.update_baseline, args.time_tolerance, args.memory_tolerance))
@@ -0,0 +1,157 @@
+"""Génération des rapports de portefeuilles en lot, sans interface Streamlit.
+
+Chaque fichier (CSV, Excel, JSON, JSON Lines) du répertoire d'entrée est importé puis analysé
+dans un pool de processus. Les historiques de prix et les métadonnées passent par les caches
+disques partagés de l'application (PORTFOLIO_PRICE_STORE, PORTFOLIO_METADATA_CACHE), remplis
+une seule fois pour l'ensemble des portefeuilles avant les analyses.
+
+Usage:
+    python portfolio_batch.py portefeuilles/ rapports/ --workers 4
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Tuple
+
+import pandas as pd
+import streamlit.config
+import streamlit.logger
+
+# Avertissements du mode "bare" (hors `streamlit run`) sans objet pour un traitement en lot; la
+# configuration est lue d'abord, sinon son chargement rétablit le niveau de log par défaut
+streamlit.config.get_config_options()
+streamlit.logger.set_log_level('error')
+
+import streamlit_app as app  # noqa: E402
+
+SUPPORTED_EXTENSIONS = ('.csv', '.xlsx', '.json', '.jsonl', '.ndjson')
+SUMMARY_COLUMNS = ['portfolio', 'status', 'positions', 'total_value', 'portfolio_performance', 'annualized_return',
+                   'portfolio_volatility', 'sharpe_ratio', 'sortino_ratio', 'max_drawdown', 'var_95', 'beta', 'hhi',
+                   'concentration_level', 'error']
+
+
+def load_portfolio(path: str) -> pd.DataFrame:
+    """Importe et enrichit un fichier de portefeuille"""
+    with open(path, 'rb') as file:
+        positions = app.PortfolioImporter().read(file, os.path.basename(path), os.path.getsize(path))
+    return app.compact_portfolio_frame(app.enhance_dataframe(positions))
+
+
+def analyse_portfolio(name: str, df: pd.DataFrame, output_dir: str, benchmark: str) -> Dict:
+    """Calcule métriques, diversification et risque d'un portefeuille et écrit ses rapports"""
+    df, metrics = app.compute_portfolio_metrics(df)
+    concentration, sector_analysis, geo_analysis = app.get_diversification_analytics(df)
+    risk_metrics = app.RiskPerformanceAnalyzer.calculate_advanced_metrics(df, benchmark=benchmark)
+    target = Path(output_dir) / name
+    target.mkdir(parents=True, exist_ok=True)
+    app.build_export_frame(df).to_csv(target / 'positions.csv', index=False)
+    sector_analysis.to_csv(target / 'sectors.csv')
+    geo_analysis.to_csv(target / 'regions.csv')
+    report = app.build_json_report(df)
+    report.update({'metrics': metrics, 'concentration': concentration, 'risk': risk_metrics})
+    with open(target / 'report.json', 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2, ensure_ascii=False, default=str)
+    return {
+        'portfolio': name,
+        'status': 'ok',
+        'positions': len(df),
+        **{key: metrics.get(key) for key in ('total_value', 'portfolio_performance', 'annualized_return')},
+        **{key: risk_metrics.get(key) for key in ('portfolio_volatility', 'sharpe_ratio', 'sortino_ratio',
+                                                  'max_drawdown', 'var_95', 'beta')},
+        'hhi': concentration['hhi'],
+        'concentration_level': concentration['concentration_level']
+    }
+
+
+def prefetch_market_data(portfolios: Dict[str, pd.DataFrame], benchmark: str, refresh_prices: bool,
+                         beta_window_days: int = 730) -> Tuple[int, int]:
+    """Remplit une fois les caches partagés (historiques, derniers prix) pour tous les portefeuilles"""
+    symbols = sorted({
+        symbol
+        for df in portfolios.values() if 'symbol' in df.columns
+        for symbol in df['symbol'].dropna().astype(str).str.strip().unique() if symbol
+    })
+    if not symbols:
+        return 0, 0
+    start_date = datetime.now() - timedelta(days=beta_window_days)
+    for df in portfolios.values():
+        if 'purchase_date' in df.columns and df['purchase_date'].notna().any():
+            start_date = min(start_date, df['purchase_date'].min().to_pydatetime())
+    app.get_price_store().get_history(symbols + [benchmark], start_date, datetime.now() + timedelta(days=1))
+    updated = 0
+    if refresh_prices:
+        report = app.TickerService.get_last_prices(symbols)
+        for df in portfolios.values():
+            if 'symbol' in df.columns:
+                updated += app.apply_last_prices(df, report['prices'])
+    # Les processus d'analyse relisent le cache de métadonnées depuis le disque
+    app.get_metadata_cache().flush()
+    return len(symbols), updated
+
+
+def run_batch(input_dir: str, output_dir: str, workers: int, benchmark: str, refresh_prices: bool) -> pd.DataFrame:
+    """Importe, analyse et exporte tous les portefeuilles du répertoire; retourne le tableau récapitulatif"""
+    paths = sorted(p for p in Path(input_dir).iterdir() if p.suffix.lower() in SUPPORTED_EXTENSIONS)
+    summaries, portfolios = [], {}
+    started = time.perf_counter()
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = {executor.submit(load_portfolio, str(path)): path.stem for path in paths}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                df = future.result()
+            except Exception as e:
+                print(f"Erreur lors de l'import de {name}: {e}", file=sys.stderr)
+                summaries.append({'portfolio': name, 'status': 'import_error', 'error': str(e)})
+                continue
+            if df.empty:
+                summaries.append({'portfolio': name, 'status': 'empty', 'positions': 0})
+                continue
+            portfolios[name] = df
+        print(f"{len(portfolios)}/{len(paths)} portefeuilles importés en {time.perf_counter() - started:.1f}s")
+        symbol_count, updated = prefetch_market_data(portfolios, benchmark, refresh_prices)
+        print(f"Données de marché: {symbol_count} symboles, {updated} prix actualisés")
+        for name in [name for name, df in portfolios.items() if 'amount' not in df.columns]:
+            del portfolios[name]
+            summaries.append({'portfolio': name, 'status': 'no_prices', 'error': "Aucun prix actuel disponible"})
+        futures = {
+            executor.submit(analyse_portfolio, name, df, output_dir, benchmark): name
+            for name, df in portfolios.items()
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                summaries.append(future.result())
+            except Exception as e:
+                print(f"Erreur lors de l'analyse de {name}: {e}", file=sys.stderr)
+                summaries.append({'portfolio': name, 'status': 'analysis_error', 'error': str(e)})
+    summary = pd.DataFrame(summaries, columns=SUMMARY_COLUMNS).sort_values('portfolio', ignore_index=True)
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    summary.to_csv(Path(output_dir) / 'summary.csv', index=False)
+    print(f"{(summary['status'] == 'ok').sum()}/{len(paths)} rapports générés en {time.perf_counter() - started:.1f}s")
+    return summary
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Rapports de portefeuilles en lot (sans interface)")
+    parser.add_argument('input_dir', help="Répertoire des fichiers de portefeuille")
+    parser.add_argument('output_dir', help="Répertoire des rapports générés")
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) - 1),
+                        help="Nombre de processus d'analyse")
+    parser.add_argument('--benchmark', default='^GSPC', help="Indice de référence (bêta, alpha)")
+    parser.add_argument('--no-refresh', action='store_true',
+                        help="Conserver les derniers prix des fichiers au lieu de les actualiser")
+    args = parser.parse_args(argv)
+    summary = run_batch(args.input_dir, args.output_dir, args.workers, args.benchmark, not args.no_refresh)
+    return 0 if (summary['status'] == 'ok').all() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,9 +3,33 @@ import pandas as pd
 import yfinance as yf
 import numpy as np
 import requests
+import atexit
+import bisect
+import cProfile
+import functools
+import hashlib
+import io
 import json
+import marshal
+import multiprocessing
+import os
+import pstats
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
 import time
-from typing import List, Dict, Optional, Tuple
+import unicodedata
+import uuid
+from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import Any, Callable, List, Dict, Optional, Tuple
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from sklearn.covariance import LedoitWolf
 from sklearn.linear_model import LinearRegression
 from datetime import datetime, timedelta
 import plotly.express as px
@@ -57,689 +81,1814 @@ custom_css = """
 """
 st.markdown(custom_css, unsafe_allow_html=True)
 
-class TickerService:
-    """Service pour la recherche et validation des tickers"""
+MARKET_DATA_PROVIDER = os.environ.get('PORTFOLIO_DATA_PROVIDER', 'yfinance')
+MARKET_DATA_SHIFT_TO_TODAY = os.environ.get('PORTFOLIO_DATA_SHIFT_TO_TODAY', '0') == '1'
+
+class DataNotFound(LookupError):
+    """Donnée inexistante chez le fournisseur (symbole inconnu, réponse non enregistrée): l'hôte a bien répondu"""
+
+class MarketDataProvider(ABC):
+    """Source de données de marché: cours récents, métadonnées, historiques OHLCV et recherche de tickers"""
+
+    def __init__(self):
+        self.calls: Counter = Counter()
+        self._calls_lock = threading.Lock()
+
+    def _count(self, kind: str):
+        with self._calls_lock:
+            self.calls[kind] += 1
+        trace = current_trace()
+        if trace is not None:
+            trace.count_network(kind, getattr(threading.current_thread(), 'open_spans', None) or ())
+
+    def host(self, method: str) -> str:
+        """Hôte (ou point d'accès) interrogé par une méthode, clé des disjoncteurs"""
+        return type(self).__name__
+
+    @abstractmethod
+    def quotes(self, symbols: List[str], timeout: int = 10) -> pd.DataFrame:
+        """Clôtures quotidiennes des dernières séances (dates x symboles)"""
+
+    @abstractmethod
+    def last_price(self, symbol: str) -> Optional[float]:
+        """Dernier cours connu d'un symbole"""
+
+    @abstractmethod
+    def metadata(self, symbol: str) -> Dict:
+        """Fiche du titre au format Yahoo (shortName, sector, currentPrice...)"""
+
+    @abstractmethod
+    def history(self, symbols: List[str], start, end) -> Dict[str, pd.DataFrame]:
+        """Historiques OHLCV ajustés sur [start, end[, un DataFrame par symbole trouvé"""
+
+    @abstractmethod
+    def search(self, query: str, limit: int = 10, timeout: float = 5) -> List[Dict]:
+        """Tickers correspondant à une requête (symbol, name, type, exchange, source)"""
 
     @staticmethod
-    def search_tickers(query: str, limit: int = 10) -> List[Dict]:
-        """Recherche de tickers avec Yahoo Finance"""
+    def _split_download(data: pd.DataFrame, symbols: List[str]) -> Dict[str, pd.DataFrame]:
+        """Découpe un téléchargement groupé (colonnes champ x symbole) en un DataFrame par symbole"""
+        frames = {}
+        if data is None or data.empty:
+            return frames
+        for symbol in symbols:
+            if isinstance(data.columns, pd.MultiIndex):
+                if symbol not in data.columns.get_level_values(-1):
+                    continue
+                sub = data.xs(symbol, axis=1, level=-1)
+            else:
+                sub = data
+            sub = sub.dropna(subset=['Close'])
+            if not sub.empty:
+                frames[symbol] = sub
+        return frames
+
+    @staticmethod
+    def _parse_search(payload: Dict, limit: int) -> List[Dict]:
+        results = []
+        for quote in payload.get("quotes", []):
+            if quote.get('symbol') and quote.get('shortname'):
+                results.append({
+                    'symbol': quote['symbol'],
+                    'name': quote['shortname'],
+                    'type': quote.get('typeDisp', 'Stock'),
+                    'exchange': quote.get('exchange', 'Unknown'),
+                    'source': 'Yahoo'
+                })
+        return results[:limit]
+
+class YFinanceProvider(MarketDataProvider):
+    """Yahoo Finance: yfinance (session partagée gérée par la bibliothèque) et API Search via une session keep-alive"""
+
+    SEARCH_URL = "https://query2.finance.yahoo.com/v1/finance/search"
+    HOSTS = {
+        'quotes': 'query2.finance.yahoo.com/v8/finance/chart',
+        'history': 'query2.finance.yahoo.com/v8/finance/chart',
+        'last_price': 'query2.finance.yahoo.com/v8/finance/chart',
+        'metadata': 'query2.finance.yahoo.com/v10/finance/quoteSummary',
+        'search': 'query2.finance.yahoo.com/v1/finance/search'
+    }
+
+    def __init__(self, pool_size: int = 8):
+        super().__init__()
+        self.session = requests.Session()
+        self.session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=pool_size))
+
+    def host(self, method: str) -> str:
+        return self.HOSTS[method]
+
+    def quotes(self, symbols: List[str], timeout: int = 10) -> pd.DataFrame:
+        self._count('quotes')
+        data = yf.download(symbols, period="5d", interval="1d", progress=False, threads=True, timeout=timeout)
+        if data is None or data.empty:
+            return pd.DataFrame()
+        closes = data['Close']
+        if isinstance(closes, pd.Series):
+            closes = closes.to_frame(name=symbols[0])
+        return closes
+
+    def last_price(self, symbol: str) -> Optional[float]:
+        self._count('last_price')
+        ticker = yf.Ticker(symbol)
+        try:
+            price = ticker.fast_info['lastPrice']
+            if price and not pd.isna(price):
+                return float(price)
+        except Exception:
+            pass
+        hist = ticker.history(period="5d")
+        if not hist.empty:
+            return float(hist['Close'].iloc[-1])
+        return None
+
+    def metadata(self, symbol: str) -> Dict:
+        self._count('metadata')
+        return yf.Ticker(symbol).info
+
+    def history(self, symbols: List[str], start, end) -> Dict[str, pd.DataFrame]:
+        self._count('history')
+        data = yf.download(
+            symbols,
+            start=start.isoformat(),
+            end=end.isoformat(),
+            progress=False,
+            auto_adjust=True,
+            threads=True
+        )
+        return self._split_download(data, symbols)
+
+    def search(self, query: str, limit: int = 10, timeout: float = 5) -> List[Dict]:
+        self._count('search')
+        response = self.session.get(self.SEARCH_URL, params={'q': query, 'quotesCount': limit}, timeout=timeout)
+        if response.status_code != 200:
+            return []
+        return self._parse_search(response.json(), limit)
+
+class LocalFileProvider(MarketDataProvider):
+    """Données locales: prices.parquet / prices.csv(.gz) (clôtures dates x symboles), tickers.json, search.json.
+
+    Avec shift_to_today, les séances sont décalées d'un nombre de jours ouvrés tel que la dernière tombe
+    sur le dernier jour ouvré (doublure réutilisable quel que soit le jour).
+    """
+
+    PRICE_FILES = ['prices.parquet', 'prices.csv', 'prices.csv.gz']
+
+    def __init__(self, directory: str, shift_to_today: bool = False):
+        super().__init__()
+        self.directory = directory
+        path = next((os.path.join(directory, name) for name in self.PRICE_FILES
+                     if os.path.exists(os.path.join(directory, name))), None)
+        if path is None:
+            raise FileNotFoundError(f"Aucun fichier de prix ({', '.join(self.PRICE_FILES)}) dans {directory}")
+        if path.endswith('.parquet'):
+            prices = pd.read_parquet(path)
+        else:
+            prices = pd.read_csv(path, index_col=0)
+        prices.index = pd.to_datetime(prices.index)
+        prices = prices.sort_index()
+        if shift_to_today and len(prices):
+            days = prices.index.to_numpy().astype('datetime64[D]')
+            shift = max(0, int(np.busday_count(days[-1], np.datetime64(datetime.now().date(), 'D') + 1)) - 1)
+            prices.index = pd.DatetimeIndex(np.busday_offset(days, shift, roll='forward'), name=prices.index.name)
+        self.prices = prices.astype(float)
+        self.tickers = self._load_json('tickers.json')
+        self.search_responses = {k.lower(): v for k, v in self._load_json('search.json').items()}
+
+    def _load_json(self, name: str) -> Dict:
+        path = os.path.join(self.directory, name)
+        if not os.path.exists(path):
+            return {}
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _closes(self, symbols: List[str], start, end) -> pd.DataFrame:
+        present = [s for s in dict.fromkeys(symbols) if s in self.prices.columns]
+        index = self.prices.index
+        return self.prices.loc[(index >= pd.Timestamp(start)) & (index < pd.Timestamp(end)), present]
+
+    def quotes(self, symbols: List[str], timeout: int = 10) -> pd.DataFrame:
+        self._count('quotes')
+        end = pd.Timestamp(datetime.now().date()) + pd.Timedelta(days=1)
+        return self._closes(symbols, end - pd.Timedelta(days=7), end).dropna(how='all')
+
+    def last_price(self, symbol: str) -> Optional[float]:
+        self._count('last_price')
+        if symbol not in self.prices.columns:
+            return None
+        closes = self.prices[symbol].loc[:pd.Timestamp(datetime.now())].dropna()
+        return float(closes.iloc[-1]) if not closes.empty else None
+
+    def metadata(self, symbol: str) -> Dict:
+        self._count('metadata')
+        return dict(self.tickers.get(symbol, {}))
+
+    def history(self, symbols: List[str], start, end) -> Dict[str, pd.DataFrame]:
+        self._count('history')
+        closes = self._closes(symbols, start, end)
+        frames = {}
+        for symbol in closes.columns:
+            close = closes[symbol].dropna()
+            if not close.empty:
+                frames[symbol] = pd.DataFrame({'Open': close, 'High': close, 'Low': close, 'Close': close, 'Volume': np.nan})
+        return frames
+
+    def search(self, query: str, limit: int = 10, timeout: float = 5) -> List[Dict]:
+        self._count('search')
+        key = query.strip().lower()
+        if key in self.search_responses:
+            return self._parse_search(self.search_responses[key], limit)
         results = []
+        for symbol, info in self.tickers.items():
+            name = info.get('shortName') or symbol
+            if key in symbol.lower() or key in name.lower():
+                results.append({'symbol': symbol, 'name': name, 'type': info.get('quoteType', 'Stock'),
+                                'exchange': info.get('exchange', 'Unknown'), 'source': 'Yahoo'})
+        return results[:limit]
+
+class RecordReplayProvider(MarketDataProvider):
+    """Enregistre les réponses d'un autre fournisseur (mode 'record') ou les rejoue sans réseau (mode 'replay').
+
+    Une réponse par fichier JSON, clé = méthode + arguments: un rejeu ne couvre que les appels déjà
+    enregistrés à l'identique (mêmes dates comprises); un appel absent lève DataNotFound.
+    """
 
-        # Source 1: Yahoo Finance Search API
+    def __init__(self, directory: str, mode: str = 'replay', inner: Optional[MarketDataProvider] = None):
+        super().__init__()
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Mode inconnu: {mode}")
+        if mode == 'record' and inner is None:
+            raise ValueError("Le mode 'record' nécessite un fournisseur sous-jacent")
+        self.directory = directory
+        self.mode = mode
+        self.inner = inner
+        if inner is not None:
+            # En enregistrement, les appels réseau sont comptés par le fournisseur sous-jacent
+            self.calls = inner.calls
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, method: str, args: Tuple) -> str:
+        digest = hashlib.sha1(json.dumps([method, *args], default=str).encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.directory, f"{method}-{digest}.json")
+
+    @staticmethod
+    def _encode(value) -> Dict:
+        if isinstance(value, pd.DataFrame):
+            return {'type': 'frame', 'data': value.to_json(orient='split', date_format='iso')}
+        if isinstance(value, dict) and value and all(isinstance(v, pd.DataFrame) for v in value.values()):
+            return {'type': 'frames', 'data': {k: v.to_json(orient='split', date_format='iso') for k, v in value.items()}}
+        return {'type': 'json', 'data': value}
+
+    @staticmethod
+    def _decode(record: Dict):
+        if record['type'] == 'frame':
+            return pd.read_json(io.StringIO(record['data']), orient='split')
+        if record['type'] == 'frames':
+            return {k: pd.read_json(io.StringIO(v), orient='split') for k, v in record['data'].items()}
+        return record['data']
+
+    def _call(self, method: str, *args, **kwargs):
+        path = self._path(method, args)
+        if self.mode == 'replay':
+            self._count(method)
+            if not os.path.exists(path):
+                raise DataNotFound(f"Réponse non enregistrée: {method}{args}")
+            with open(path, 'r', encoding='utf-8') as f:
+                record = json.load(f)
+            if 'error' in record:
+                raise RuntimeError(record['error'])
+            return self._decode(record)
         try:
-            url = f"https://query2.finance.yahoo.com/v1/finance/search?q={query}&quotesCount={limit}"
-            response = requests.get(url, timeout=5)
-            if response.status_code == 200:
-                data = response.json()
-                quotes = data.get("quotes", [])
-
-                for quote in quotes:
-                    if quote.get('symbol') and quote.get('shortname'):
-                        results.append({
-                            'symbol': quote['symbol'],
-                            'name': quote['shortname'],
-                            'type': quote.get('typeDisp', 'Stock'),
-                            'exchange': quote.get('exchange', 'Unknown'),
-                            'source': 'Yahoo'
-                        })
+            value = getattr(self.inner, method)(*args, **kwargs)
         except Exception as e:
-            st.warning(f"Erreur lors de la recherche Yahoo: {e}")
+            record = {'error': str(e)}
+            raise
+        else:
+            record = self._encode(value)
+            return value
+        finally:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(record, f, default=str)
+
+    def host(self, method: str) -> str:
+        return self.inner.host(method) if self.inner is not None else super().host(method)
+
+    def quotes(self, symbols: List[str], timeout: int = 10) -> pd.DataFrame:
+        return self._call('quotes', list(symbols), timeout=timeout)
+
+    def last_price(self, symbol: str) -> Optional[float]:
+        return self._call('last_price', symbol)
+
+    def metadata(self, symbol: str) -> Dict:
+        return self._call('metadata', symbol)
+
+    def history(self, symbols: List[str], start, end) -> Dict[str, pd.DataFrame]:
+        return self._call('history', list(symbols), start, end)
+
+    def search(self, query: str, limit: int = 10, timeout: float = 5) -> List[Dict]:
+        return self._call('search', query, limit, timeout=timeout)
+
+FETCH_BUDGET_SECONDS = float(os.environ.get('PORTFOLIO_FETCH_BUDGET', '10'))
+
+class FetchUnavailable(Exception):
+    """Appel réseau non effectué ou abandonné (budget du rerun épuisé, disjoncteur ouvert, délai dépassé)"""
+
+class FetchTimeout(FetchUnavailable):
+    """Délai dépassé; future permet de récupérer la réponse si elle arrive plus tard"""
+
+    def __init__(self, message: str, future: Optional[Future] = None):
+        super().__init__(message)
+        self.future = future
+
+class FetchBudget:
+    """Temps réseau alloué à un rerun et données servies en mode dégradé pendant ce rerun"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.deadline = time.monotonic() + seconds
+        self.exhausted = False
+        self.degraded: Dict[str, set] = {}
+        self._lock = threading.Lock()
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - time.monotonic())
+
+    def mark_stale(self, kind: str, symbols):
+        with self._lock:
+            self.degraded.setdefault(kind, set()).update(symbols)
+
+def start_fetch_budget(seconds: float = FETCH_BUDGET_SECONDS) -> FetchBudget:
+    """Ouvre le budget réseau du rerun courant"""
+    budget = FetchBudget(seconds)
+    st.session_state.fetch_budget = budget
+    return budget
+
+def current_fetch_budget() -> Optional[FetchBudget]:
+    """Budget du rerun en cours (None hors session Streamlit: lot, jobs, benchmarks)"""
+    # Porté par le thread (comme le contexte Streamlit), stable quand le script est réexécuté à chaque rerun
+    budget = getattr(threading.current_thread(), 'fetch_budget', None)
+    if budget is not None or get_script_run_ctx(suppress_warning=True) is None:
+        return budget
+    return st.session_state.get('fetch_budget')
+
+def mark_stale(kind: str, symbols):
+    """Signale des données servies depuis le cache faute de réponse réseau"""
+    budget = current_fetch_budget()
+    if budget is not None:
+        budget.mark_stale(kind, symbols)
+
+TIMING_LOG_PATH = os.environ.get('PORTFOLIO_TIMING_LOG')
+
+class RerunTrace:
+    """Spans chronométrés, appels réseau et profil cProfile (à la demande) d'un rerun"""
+
+    MAX_SPANS = 10_000
+
+    def __init__(self, profile: bool = False, scope: str = 'app'):
+        self.scope = scope
+        self.started_at = datetime.now()
+        self.start = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.spans: List[Tuple[str, int, float, float, int]] = []
+        self.dropped = 0
+        self.network: Counter = Counter()
+        self.profile: Optional[Dict] = None
+        self._lock = threading.Lock()
+        self._profiler = cProfile.Profile() if profile else None
+        if self._profiler is not None:
+            self._profiler.enable()
+
+    def network_calls(self) -> int:
+        with self._lock:
+            return sum(self.network.values())
+
+    def count_network(self, kind: str, open_spans=()):
+        """Compte un appel pour le rerun et pour chaque span ouvert du thread qui l'a émis"""
+        with self._lock:
+            self.network[kind] += 1
+            for counter in open_spans:
+                counter[0] += 1
+
+    def add_span(self, name: str, depth: int, start: float, duration: float, network: int):
+        with self._lock:
+            if len(self.spans) < self.MAX_SPANS:
+                self.spans.append((name, depth, start - self.start, duration, network))
+            else:
+                self.dropped += 1
+
+    def stop_profiler(self):
+        profiler, self._profiler = self._profiler, None
+        if profiler is None:
+            return
+        profiler.disable()
+        stream = io.StringIO()
+        stats = pstats.Stats(profiler, stream=stream)
+        stats.sort_stats('cumulative').print_stats(40)
+        self.profile = {'timestamp': self.started_at, 'text': stream.getvalue(), 'data': marshal.dumps(stats.stats)}
+
+    def finish(self):
+        self.stop_profiler()
+        self.duration = time.perf_counter() - self.start
 
-        # Source 2: Recherche par pattern (pour les tickers connus)
-        pattern_results = TickerService._pattern_search(query)
-        results.extend(pattern_results)
+    def aggregate(self) -> List[Dict]:
+        """Appels, durée totale et maximale, appels réseau par span, les plus coûteux d'abord"""
+        totals: Dict[str, Dict] = {}
+        with self._lock:
+            spans = list(self.spans)
+        for name, _, _, duration, network in spans:
+            entry = totals.setdefault(name, {'name': name, 'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'network': 0})
+            entry['calls'] += 1
+            entry['total_ms'] += duration * 1000
+            entry['max_ms'] = max(entry['max_ms'], duration * 1000)
+            entry['network'] += network
+        return sorted(totals.values(), key=lambda entry: entry['total_ms'], reverse=True)
 
-        # Déduplication et tri
+    def to_record(self) -> Dict:
+        return {
+            'timestamp': self.started_at.isoformat(timespec='milliseconds'),
+            'scope': self.scope,
+            'duration_ms': round(self.duration * 1000, 2) if self.duration is not None else None,
+            'network_calls': self.network_calls(),
+            'network': dict(self.network),
+            'profiled': self.profile is not None,
+            'dropped_spans': self.dropped,
+            'spans': [{**entry, 'total_ms': round(entry['total_ms'], 2), 'max_ms': round(entry['max_ms'], 2)}
+                      for entry in self.aggregate()]
+        }
+
+def start_rerun_trace(scope: str = 'app') -> RerunTrace:
+    """Ouvre la trace du rerun courant (application ou fragment), profilée si la capture a été demandée"""
+    previous = st.session_state.get('rerun_trace')
+    if previous is not None and previous.duration is None:
+        # Rerun précédent interrompu avant sa clôture: son profileur est encore actif
+        previous.stop_profiler()
+        if previous.profile is not None:
+            st.session_state.last_profile = previous.profile
+    trace = RerunTrace(profile=st.session_state.pop('profile_next_rerun', False), scope=scope)
+    st.session_state.rerun_trace = trace
+    return trace
+
+def finish_rerun_trace(trace: RerunTrace):
+    """Clôt la trace du rerun: conserve le profil éventuel et l'ajoute au journal PORTFOLIO_TIMING_LOG"""
+    trace.finish()
+    if trace.profile is not None:
+        st.session_state.last_profile = trace.profile
+    if TIMING_LOG_PATH:
+        write_timing_log(trace)
+
+def write_timing_log(trace: RerunTrace, path: str = TIMING_LOG_PATH):
+    """Ajoute la trace d'un rerun au journal (une ligne JSON par rerun)"""
+    ctx = get_script_run_ctx(suppress_warning=True)
+    record = {'session': ctx.session_id if ctx is not None else None, **trace.to_record()}
+    try:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+    except OSError as e:
+        print(f"Erreur lors de l'écriture du journal de performances: {e}")
+
+def current_trace() -> Optional[RerunTrace]:
+    """Trace du rerun en cours (None hors session Streamlit: lot, jobs, benchmarks)"""
+    trace = getattr(threading.current_thread(), 'rerun_trace', None)
+    if trace is not None or get_script_run_ctx(suppress_warning=True) is None:
+        return trace
+    return st.session_state.get('rerun_trace')
+
+def with_rerun_context(func: Callable) -> Callable:
+    """func exécutée dans un autre thread sous le budget réseau et la trace du rerun appelant"""
+    context = {
+        'fetch_budget': current_fetch_budget(),
+        'rerun_trace': current_trace(),
+        # Les appels du thread exécutant sont imputés aux spans ouverts par l'appelant, pas aux spans voisins
+        'open_spans': getattr(threading.current_thread(), 'open_spans', None) or ()
+    }
+    def run(*args, **kwargs):
+        thread = threading.current_thread()
+        previous = {name: getattr(thread, name, None) for name in context}
+        for name, value in context.items():
+            setattr(thread, name, value)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            for name, value in previous.items():
+                setattr(thread, name, value)
+    return run
+
+@contextmanager
+def span(name: str):
+    """Chronomètre un bloc (durée, appels réseau) dans la trace du rerun; sans effet hors rerun"""
+    trace = current_trace()
+    if trace is None:
+        yield
+        return
+    thread = threading.current_thread()
+    parents = getattr(thread, 'open_spans', None) or ()
+    network = [0]
+    thread.open_spans = parents + (network,)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        thread.open_spans = parents
+        trace.add_span(name, len(parents), start, time.perf_counter() - start, network[0])
+
+def timed(name: Optional[str] = None) -> Callable:
+    """Décorateur: chaque appel de la fonction est un span (nom qualifié par défaut)"""
+    def decorator(func: Callable) -> Callable:
+        label = name or func.__qualname__
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+class CircuitBreaker:
+    """Disjoncteur d'un hôte: ouvert après failure_threshold échecs consécutifs, un appel d'essai après cooldown"""
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 30):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = 'half_open'
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+class ResilientProvider(MarketDataProvider):
+    """Enveloppe d'un fournisseur réseau: délai par appel, budget par rerun, disjoncteur par hôte, reprises exponentielles.
+
+    Les appels s'exécutent dans un pool de threads: au-delà du délai (ou du budget restant) le rerun
+    reprend la main avec FetchTimeout, l'appel en cours se termine en arrière-plan.
+    """
+
+    CALL_TIMEOUTS = {'quotes': 15, 'last_price': 8, 'metadata': 8, 'history': 30, 'search': 5}
+
+    def __init__(self, inner: MarketDataProvider, max_retries: int = 2, backoff: float = 0.25,
+                 failure_threshold: int = 5, cooldown: float = 30, max_workers: int = 8):
+        super().__init__()
+        self.inner = inner
+        self.calls = inner.calls
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self._breakers_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='market-data')
+
+    def host(self, method: str) -> str:
+        return self.inner.host(method)
+
+    def breaker(self, method: str) -> CircuitBreaker:
+        host = self.host(method)
+        with self._breakers_lock:
+            if host not in self.breakers:
+                self.breakers[host] = CircuitBreaker(self.failure_threshold, self.cooldown)
+            return self.breakers[host]
+
+    def open_circuits(self) -> List[str]:
+        with self._breakers_lock:
+            return [host for host, breaker in self.breakers.items() if breaker.state != 'closed']
+
+    def _call(self, method: str, *args, **kwargs):
+        budget = current_fetch_budget()
+        breaker = self.breaker(method)
+        attempt = 0
+        while True:
+            if attempt == 0 and not breaker.allow():
+                raise FetchUnavailable(f"Disjoncteur ouvert pour {self.host(method)}")
+            timeout = self.CALL_TIMEOUTS[method]
+            if budget is not None:
+                if budget.remaining() <= 0:
+                    budget.exhausted = True
+                    raise FetchUnavailable("Budget réseau du rerun épuisé")
+                timeout = min(timeout, budget.remaining())
+            future = self._executor.submit(with_rerun_context(getattr(self.inner, method)), *args, **kwargs)
+            try:
+                result = future.result(timeout=timeout)
+            except FuturesTimeoutError:
+                breaker.record_failure()
+                if budget is not None and budget.remaining() <= 0:
+                    budget.exhausted = True
+                raise FetchTimeout(f"{method}: pas de réponse en {timeout:.1f}s", future)
+            except DataNotFound:
+                breaker.record_success()
+                raise
+            except Exception:
+                attempt += 1
+                delay = self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+                if attempt > self.max_retries or (budget is not None and budget.remaining() <= delay):
+                    # Un échec par appel logique, reprises comprises
+                    breaker.record_failure()
+                    raise
+                time.sleep(delay)
+                continue
+            breaker.record_success()
+            return result
+
+    def quotes(self, symbols: List[str], timeout: int = 10) -> pd.DataFrame:
+        return self._call('quotes', symbols, timeout=timeout)
+
+    def last_price(self, symbol: str) -> Optional[float]:
+        return self._call('last_price', symbol)
+
+    def metadata(self, symbol: str) -> Dict:
+        return self._call('metadata', symbol)
+
+    def history(self, symbols: List[str], start, end) -> Dict[str, pd.DataFrame]:
+        return self._call('history', symbols, start, end)
+
+    def search(self, query: str, limit: int = 10, timeout: float = 5) -> List[Dict]:
+        return self._call('search', query, limit, timeout=timeout)
+
+def create_market_data_provider(spec: str) -> MarketDataProvider:
+    """Fournisseur décrit par 'yfinance', 'local:<répertoire>', 'record:<répertoire>' ou 'replay:<répertoire>'"""
+    kind, _, location = spec.partition(':')
+    if kind == 'yfinance':
+        return ResilientProvider(YFinanceProvider())
+    if kind == 'local':
+        return LocalFileProvider(location, shift_to_today=MARKET_DATA_SHIFT_TO_TODAY)
+    if kind == 'record':
+        return ResilientProvider(RecordReplayProvider(location, 'record', YFinanceProvider()))
+    if kind == 'replay':
+        return RecordReplayProvider(location, 'replay')
+    raise ValueError(f"Fournisseur de données inconnu: {spec}")
+
+@st.cache_resource
+def get_market_data() -> MarketDataProvider:
+    """Fournisseur de données de marché partagé, choisi par PORTFOLIO_DATA_PROVIDER"""
+    return create_market_data_provider(MARKET_DATA_PROVIDER)
+
+PRICE_STORE_PATH = os.environ.get('PORTFOLIO_PRICE_STORE', os.path.join('.cache', 'prices.sqlite'))
+
+class PriceStore:
+    """Stockage local incrémental des historiques OHLCV (SQLite, clé symbole/date)"""
+
+    FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+    def __init__(self, path: str = PRICE_STORE_PATH, refresh_ttl: int = 3600, tail_overlap_days: int = 5):
+        self.path = path
+        self.refresh_ttl = refresh_ttl
+        self.tail_overlap_days = tail_overlap_days
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS prices (
+                    symbol TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    open REAL, high REAL, low REAL, close REAL, volume REAL,
+                    PRIMARY KEY (symbol, date)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS coverage (
+                    symbol TEXT PRIMARY KEY,
+                    start TEXT NOT NULL,
+                    end TEXT NOT NULL,
+                    fetched_at REAL NOT NULL
+                );
+            """)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _to_date(value):
+        return pd.Timestamp(value).date()
+
+    @timed()
+    def get_history(self, symbols: List[str], start_date, end_date, field: str = 'Close') -> pd.DataFrame:
+        """Retourne un champ OHLCV (dates x symboles) sur [start_date, end_date[, en ne téléchargeant que les plages manquantes"""
+        symbols = list(dict.fromkeys(s for s in symbols if s))
+        if not symbols:
+            return pd.DataFrame()
+        start = self._to_date(start_date)
+        end = self._to_date(end_date)
+        self._fetch_missing(symbols, start, end)
+        column = field.lower()
+        if column not in [f.lower() for f in self.FIELDS]:
+            raise ValueError(f"Champ inconnu: {field}")
+        placeholders = ','.join('?' * len(symbols))
+        with self._connect() as conn:
+            rows = pd.read_sql_query(
+                f"SELECT symbol, date, {column} AS value FROM prices "
+                f"WHERE symbol IN ({placeholders}) AND date >= ? AND date < ?",
+                conn,
+                params=[*symbols, start.isoformat(), end.isoformat()]
+            )
+        if rows.empty:
+            return pd.DataFrame()
+        data = rows.pivot(index='date', columns='symbol', values='value')
+        data.index = pd.to_datetime(data.index)
+        data.columns.name = None
+        return data[[s for s in symbols if s in data.columns]].sort_index()
+
+    def _missing_ranges(self, symbols: List[str], start, end) -> Dict[Tuple, List[str]]:
+        """Regroupe les symboles par plage de dates à télécharger"""
+        today = datetime.now().date()
+        end = min(end, today + timedelta(days=1))
+        if start >= end:
+            return {}
+        placeholders = ','.join('?' * len(symbols))
+        with self._connect() as conn:
+            coverage = {
+                row[0]: (self._to_date(row[1]), self._to_date(row[2]), row[3])
+                for row in conn.execute(
+                    f"SELECT symbol, start, end, fetched_at FROM coverage WHERE symbol IN ({placeholders})",
+                    symbols
+                )
+            }
+        groups: Dict[Tuple, List[str]] = {}
+        for symbol in symbols:
+            if symbol not in coverage:
+                groups.setdefault((start, end), []).append(symbol)
+                continue
+            cov_start, cov_end, fetched_at = coverage[symbol]
+            if start < cov_start:
+                groups.setdefault((start, cov_start), []).append(symbol)
+            stale_tail = cov_end > today and time.time() - fetched_at > self.refresh_ttl
+            if end > cov_end or (stale_tail and end > today - timedelta(days=self.tail_overlap_days)):
+                # Reprise à la fin de la couverture pour garder une plage contiguë
+                tail_start = max(cov_start, cov_end - timedelta(days=self.tail_overlap_days))
+                groups.setdefault((tail_start, end), []).append(symbol)
+        return groups
+
+    def _fetch_missing(self, symbols: List[str], start, end):
+        with self._lock:
+            for (fetch_start, fetch_end), group in self._missing_ranges(symbols, start, end).items():
+                frames = self._download(group, fetch_start, fetch_end)
+                if frames is None:
+                    mark_stale('historiques', group)
+                    continue
+                self._record(frames, group, fetch_start, fetch_end)
+
+    def _record(self, frames: Dict[str, pd.DataFrame], group: List[str], start, end):
+        # Une plage vide n'est marquée couverte que si Yahoo a répondu pour le lot,
+        # si elle est courte (week-end, jours fériés) ou si elle précède un historique déjà
+        # stocké (antérieure à la cotation: un nouvel essai ne renverrait rien de plus)
+        if frames or (end - start).days <= 7:
+            covered = group
+        else:
+            covered = self._covered_from(group, end)
+        self._store(frames, covered, start, end)
+
+    def _covered_from(self, symbols: List[str], date) -> List[str]:
+        """Symboles dont la couverture commence à date ou après"""
+        placeholders = ','.join('?' * len(symbols))
+        with self._connect() as conn:
+            return [
+                row[0] for row in conn.execute(
+                    f"SELECT symbol FROM coverage WHERE symbol IN ({placeholders}) AND start >= ?",
+                    [*symbols, date.isoformat()]
+                )
+            ]
+
+    def _record_late(self, future: Future, group: List[str], start, end):
+        """Stocke une réponse arrivée après l'expiration du délai, pour les reruns suivants"""
+        # Sans self._lock: le callback s'exécute dans le thread appelant si la réponse est déjà là
+        if future.cancelled() or future.exception() is not None:
+            return
+        self._record(future.result(), group, start, end)
+
+    def _download(self, symbols: List[str], start, end) -> Optional[Dict[str, pd.DataFrame]]:
+        """Téléchargement groupé via le fournisseur de données; None en cas d'échec réseau"""
+        try:
+            return get_market_data().history(symbols, start, end)
+        except Exception as e:
+            # FetchTimeout, testé par attribut: le store et le fournisseur en cache peuvent dater d'un autre rerun
+            future = getattr(e, 'future', None)
+            if future is not None:
+                future.add_done_callback(lambda f: self._record_late(f, symbols, start, end))
+                print(f"Téléchargement des données en attente: {e}")
+            else:
+                print(f"Erreur lors du téléchargement des données: {e}")
+            return None
+
+    def _store(self, frames: Dict[str, pd.DataFrame], covered: List[str], start, end):
+        rows = []
+        for symbol, frame in frames.items():
+            values = frame.reindex(columns=self.FIELDS)
+            dates = pd.DatetimeIndex(values.index).strftime('%Y-%m-%d')
+            for date, record in zip(dates, values.itertuples(index=False, name=None)):
+                rows.append((symbol, date, *[None if pd.isna(v) else float(v) for v in record]))
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO prices VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            for symbol in covered:
+                row = conn.execute("SELECT start, end FROM coverage WHERE symbol = ?", (symbol,)).fetchone()
+                new_start, new_end = start, end
+                if row:
+                    new_start = min(start, self._to_date(row[0]))
+                    new_end = max(end, self._to_date(row[1]))
+                conn.execute(
+                    "INSERT OR REPLACE INTO coverage VALUES (?, ?, ?, ?)",
+                    (symbol, new_start.isoformat(), new_end.isoformat(), now)
+                )
+
+@st.cache_resource
+def get_price_store() -> PriceStore:
+    """Instance partagée (entre sessions et reruns) du stockage des prix"""
+    return PriceStore()
+
+COMMON_TICKERS = {
+        "Microsoft": "MSFT",
+        "Nvidia": "NVDA",
+        "Apple Inc.": "AAPL",
+        "Amazon": "AMZN",
+        "Alphabet Inc. (Class C)": "GOOG",
+        "Alphabet Inc. (Class A)": "GOOGL",
+        "Meta Platforms": "META",
+        "Broadcom": "AVGO",
+        "Tesla, Inc.": "TSLA",
+        "Berkshire Hathaway": "BRK.B",
+        "Walmart": "WMT",
+        "JPMorgan Chase": "JPM",
+        "Visa Inc.": "V",
+        "Lilly (Eli)": "LLY",
+        "Mastercard": "MA",
+        "Netflix": "NFLX",
+        "Oracle Corporation": "ORCL",
+        "Costco": "COST",
+        "ExxonMobil": "XOM",
+        "Procter & Gamble": "PG",
+        "Johnson & Johnson": "JNJ",
+        "Home Depot (The)": "HD",
+        "Bank of America": "BAC",
+        "AbbVie": "ABBV",
+        "Palantir Technologies": "PLTR",
+        "Coca-Cola Company (The)": "KO",
+        "Philip Morris International": "PM",
+        "T-Mobile US": "TMUS",
+        "UnitedHealth Group": "UNH",
+        "GE Aerospace": "GE",
+        "Salesforce": "CRM",
+        "Cisco": "CSCO",
+        "Wells Fargo": "WFC",
+        "IBM": "IBM",
+        "Chevron Corporation": "CVX",
+        "Abbott Laboratories": "ABT",
+        "McDonald's": "MCD",
+        "Linde plc": "LIN",
+        "Intuit": "INTU",
+        "ServiceNow": "NOW",
+        "American Express": "AXP",
+        "Morgan Stanley": "MS",
+        "Walt Disney Company (The)": "DIS",
+        "AT&T": "T",
+        "Accenture": "ACN",
+        "Intuitive Surgical": "ISRG",
+        "Merck & Co.": "MRK",
+        "Verizon": "VZ",
+        "Goldman Sachs": "GS",
+        "RTX Corporation": "RTX",
+        "PepsiCo": "PEP",
+        "Booking Holdings": "BKNG",
+        "Advanced Micro Devices": "AMD",
+        "Adobe Inc.": "ADBE",
+        "Uber": "UBER",
+        "Progressive Corporation": "PGR",
+        "Texas Instruments": "TXN",
+        "Caterpillar Inc.": "CAT",
+        "Charles Schwab Corporation": "SCHW",
+        "Qualcomm": "QCOM",
+        "S&P Global": "SPGI",
+        "Boeing": "BA",
+        "Boston Scientific": "BSX",
+        "Amgen": "AMGN",
+        "Thermo Fisher Scientific": "TMO",
+        "BlackRock": "BLK",
+        "Stryker Corporation": "SYK",
+        "Honeywell": "HON",
+        "NextEra Energy": "NEE",
+        "TJX Companies": "TJX",
+        "Citigroup": "C",
+        "Deere & Company": "DE",
+        "Gilead Sciences": "GILD",
+        "Danaher Corporation": "DHR",
+        "Pfizer": "PFE",
+        "Union Pacific Corporation": "UNP",
+        "Automatic Data Processing": "ADP",
+        "GE Vernova": "GEV",
+        "Comcast": "CMCSA",
+        "Palo Alto Networks": "PANW",
+        "Best Buy": "BBY",
+        "Avery Dennison": "AVY",
+        "Hologic": "HOLX",
+        "J.B. Hunt": "JBHT",
+        "UDR, Inc.": "UDR",
+        "IDEX Corporation": "IEX",
+        "Cooper Companies (The)": "COO",
+        "Textron": "TXT",
+        "Jack Henry & Associates": "JKHY",
+        "Masco": "MAS",
+        "Align Technology": "ALGN",
+        "Regency Centers": "REG",
+        "TKO Group Holdings": "TKO",
+        "Solventum": "SOLV",
+        "Teradyne": "TER",
+        "Incyte": "INCY",
+        "Camden Property Trust": "CPT",
+        "Allegion": "ALLE",
+        "Universal Health Services": "UHS",
+        "Alexandria Real Estate Equities": "ARE",
+        "Healthpeak Properties": "DOC",
+        "Nordson Corporation": "NDSN",
+        "Juniper Networks": "JNPR",
+        "J.M. Smucker Company (The)": "SJM",
+        "Builders FirstSource": "BLDR",
+        "Mosaic Company (The)": "MOS",
+        "C.H. Robinson": "CHRW",
+        "Franklin Resources": "BEN",
+        "Pool Corporation": "POOL",
+        "Conagra Brands": "CAG",
+        "Pinnacle West": "PNW",
+        "Molson Coors Beverage Company": "TAP",
+        "Akamai Technologies": "AKAM",
+        "Host Hotels & Resorts": "HST",
+        "BXP, Inc.": "BXP",
+        "Revvity": "RVTY",
+        "Bunge Global": "BG",
+        "LKQ Corporation": "LKQ",
+        "Skyworks Solutions": "SWKS",
+        "Viatris": "VTRS",
+        "DaVita": "DVA",
+        "Assurant": "AIZ",
+        "Moderna": "MRNA",
+        "Campbell Soup Company": "CPB",
+        "Stanley Black & Decker": "SWK",
+        "Globe Life": "GL",
+        "EPAM Systems": "EPAM",
+        "CarMax": "KMX",
+        "Walgreens Boots Alliance": "WBA",
+        "Wynn Resorts": "WYNN",
+        "Dayforce": "DAY",
+        "Hasbro": "HAS",
+        "A. O. Smith": "AOS",
+        "Eastman Chemical Company": "EMN",
+        "Interpublic Group of Companies (The)": "IPG",
+        "Huntington Ingalls Industries": "HII",
+        "Henry Schein": "HSIC",
+        "MGM Resorts": "MGM",
+        "Federal Realty Investment Trust": "FRT",
+        "Paramount Global": "PARA",
+        "MarketAxess": "MKTX",
+        "Norwegian Cruise Line Holdings": "NCLH",
+        "Lamb Weston": "LW",
+        "Bio-Techne": "TECH",
+        "Match Group": "MTCH",
+        "Generac": "GNRC",
+        "AES Corporation": "AES",
+        "Charles River Laboratories": "CRL",
+        "Albemarle Corporation": "ALB",
+        "Invesco": "IVZ",
+        "Mohawk Industries": "MHK",
+        "APA Corporation": "APA",
+        "Caesars Entertainment": "CZR",
+        "Enphase Energy": "ENPH",
+        "Adidas AG": "ADS.DE",
+        "Allianz SE": "ALV.DE",
+        "BASF SE": "BAS.DE",
+        "Bayer AG": "BAYN.DE",
+        "Beiersdorf AG": "BEI.DE",
+        "BMW AG": "BMW.DE",
+        "Continental AG": "CON.DE",
+        "Covestro AG": "1COV.DE",
+        "Daimler AG": "DAI.DE",
+        "Deutsche Bank AG": "DBK.DE",
+        "Deutsche Boerse AG": "DB1.DE",
+        "Deutsche Post AG": "DPW.DE",
+        "Deutsche Telekom AG": "DTE.DE",
+        "Deutsche Wohnen SE": "DWNI.DE",
+        "E.ON SE": "EOAN.DE",
+        "Fresenius Medical Care AG & Co. KGaA": "FME.DE",
+        "Fresenius SE & Co. KGaA": "FRE.DE",
+        "HeidelbergCement AG": "HEI.DE",
+        "Henkel AG & Co. KGaA": "HEN3.DE",
+        "Infineon Technologies AG": "IFX.DE",
+        "Linde plc": "LIN.DE",
+        "Merck KGaA": "MRK.DE",
+        "MTU Aero Engines AG": "MTX.DE",
+        "Muenchener Rueckversicherungs-Gesellschaft AG": "MUV2.DE",
+        "Puma SE": "PUM.DE",
+        "Qiagen N.V.": "QIA.DE",
+        "RWE AG": "RWE.DE",
+        "SAP SE": "SAP.DE",
+        "Siemens AG": "SIE.DE",
+        "Siemens Healthineers AG": "SHL.DE",
+        "Symrise AG": "SY1.DE",
+        "Vonovia SE": "VNA.DE",
+        "Volkswagen AG": "VOW3.DE",
+        "Wirecard AG": "WDI.DE",
+        "Zalando SE": "ZAL.DE",
+        "3i Group PLC": "III.L",
+        "Admiral Group PLC": "ADM.L",
+        "Anglo American PLC": "AAL.L",
+        "Antofagasta PLC": "ANTO.L",
+        "Ashtead Group PLC": "AHT.L",
+        "Associated British Foods PLC": "ABF.L",
+        "AstraZeneca PLC": "AZN.L",
+        "Auto Trader Group PLC": "AUTO.L",
+        "Aviva PLC": "AV/.L",
+        "B&M European Value Retail S.A.": "BME.L",
+        "BAE Systems PLC": "BA/.L",
+        "Barratt Developments PLC": "BDEV.L",
+        "Berkeley Group Holdings PLC": "BKG.L",
+        "BHP Group PLC": "BHP.L",
+        "BP PLC": "BP/.L",
+        "British American Tobacco PLC": "BATS.L",
+        "British Land Company PLC": "BLND.L",
+        "Bunzl PLC": "BNZL.L",
+        "Burberry Group PLC": "BRBY.L",
+        "Coca-Cola Europacific Partners PLC": "CCEP.L",
+        "Croda International PLC": "CRDA.L",
+        "CRH PLC": "CRH.L",
+        "DCC PLC": "DCC.L",
+        "Diageo PLC": "DGE.L",
+        "Entain PLC": "ENT.L",
+        "Experian PLC": "EXPN.L",
+        "Ferguson PLC": "FERG.L",
+        "Fresnillo PLC": "FRES.L",
+        "GlaxoSmithKline PLC": "GSK.L",
+        "Glencore PLC": "GLEN.L",
+        "Halma PLC": "HLMA.L",
+        "Haleon PLC": "HLN.L",
+        "HSBC Holdings PLC": "HSBA.L",
+        "Hiscox Ltd": "HSX.L",
+        "Howden Joinery Group PLC": "HWDN.L",
+        "International Consolidated Airlines Group SA": "IAG.L",
+        "Intermediate Capital Group PLC": "ICG.L",
+        "InterContinental Hotels Group PLC": "IHG.L",
+        "3i Group PLC": "III.L",
+        "Imperial Brands PLC": "IMB.L",
+        "IMI PLC": "IMI.L",
+        "Informa PLC": "INF.L",
+        "Intertek Group PLC": "ITRK.L",
+        "JD Sports Fashion PLC": "JD/.L",
+        "Kingfisher PLC": "KGF.L",
+        "Land Securities Group PLC": "LAND.L",
+        "Legal & General Group PLC": "LGEN.L",
+        "Lloyds Banking Group PLC": "LLOY.L",
+        "LondonMetric Property PLC": "LMP.L",
+        "London Stock Exchange Group PLC": "LSEG.L",
+        "Marks & Spencer Group PLC": "MKS.L",
+        "Mondi PLC": "MNDI.L",
+        "M&G PLC": "MNG.L",
+        "Melrose Industries PLC": "MRO.L",
+        "National Grid PLC": "NG/.L",
+        "NatWest Group PLC": "NWG.L",
+        "Next PLC": "NXT.L",
+        "Polar Capital Technology Trust PLC": "PCT.L",
+        "Phoenix Group Holdings PLC": "PHNX.L",
+        "Prudential PLC": "PRU.L",
+        "Pershing Square Holdings Ltd/Fund": "PSH.L",
+        "Persimmon PLC": "PSN.L",
+        "Pearson PLC": "PSON.L",
+        "RELX PLC": "REL.L",
+        "Rio Tinto PLC": "RIO.L",
+        "Reckitt Benckiser Group PLC": "RKT.L",
+        "Rightmove PLC": "RMV.L",
+        "Rolls-Royce Holdings PLC": "RR/.L",
+        "Rentokil Initial PLC": "RTO.L",
+        "J Sainsbury PLC": "SBRY.L",
+        "Schroders PLC": "SDR.L",
+        "Sage Group PLC/The": "SGE.L",
+        "Segro PLC": "SGRO.L",
+        "Shell PLC": "SHEL.L",
+        "Smiths Group PLC": "SMIN.L",
+        "Scottish Mortgage Investment Trust PLC": "SMT.L",
+        "Smith & Nephew PLC": "SN/.L",
+        "Spirax Group PLC": "SPX.L",
+        "SSE PLC": "SSE.L",
+        "Standard Chartered PLC": "STAN.L",
+        "St James's Place PLC": "STJ.L",
+        "Severn Trent PLC": "SVT.L",
+        "Tesco PLC": "TSCO.L",
+        "Taylor Wimpey PLC": "TW/.L",
+        "Unilever PLC": "ULVR.L",
+        "UNITE Group PLC/The": "UTG.L",
+        "United Utilities Group PLC": "UU/.L",
+        "Vodafone Group PLC": "VOD.L",
+        "Weir Group PLC/The": "WEIR.L",
+        "WPP PLC": "WPP.L",
+        "Whitbread PLC": "WTB.L",
+        "Microsoft": "MSFT",
+        "Nvidia": "NVDA",
+        "Apple Inc.": "AAPL",
+        "Amazon": "AMZN",
+        "Alphabet Inc. (Class C)": "GOOG",
+        "Alphabet Inc. (Class A)": "GOOGL",
+        "Meta Platforms": "META",
+        "Broadcom Inc.": "AVGO",
+        "Tesla, Inc.": "TSLA",
+        "Netflix": "NFLX",
+        "Costco": "COST",
+        "Palantir Technologies": "PLTR",
+        "ASML Holding": "ASML",
+        "T-Mobile US": "TMUS",
+        "Cisco": "CSCO",
+        "AstraZeneca": "AZN",
+        "Linde plc": "LIN",
+        "Intuit": "INTU",
+        "Intuitive Surgical": "ISRG",
+        "PepsiCo": "PEP",
+        "Booking Holdings": "BKNG",
+        "Advanced Micro Devices Inc.": "AMD",
+        "Adobe Inc.": "ADBE",
+        "Texas Instruments": "TXN",
+        "Qualcomm": "QCOM",
+        "Amgen": "AMGN",
+        "Honeywell": "HON",
+        "PDD Holdings": "PDD",
+        "Gilead Sciences": "GILD",
+        "Applovin Corp": "APP",
+        "ADP": "ADP",
+        "Arm Holdings": "ARM",
+        "MercadoLibre": "MELI",
+        "Comcast": "CMCSA",
+        "Palo Alto Networks": "PANW",
+        "Applied Materials": "AMAT",
+        "CrowdStrike": "CRWD",
+        "Vertex Pharmaceuticals": "VRTX",
+        "Analog Devices": "ADI",
+        "Micron Technology": "MU",
+        "Lam Research": "LRCX",
+        "MicroStrategy Inc.": "MSTR",
+        "KLA Corporation": "KLAC",
+        "Constellation Energy": "CEG",
+        "Starbucks": "SBUX",
+        "Cintas": "CTAS",
+        "DoorDash": "DASH",
+        "Mondelez International": "MDLZ",
+        "Intel": "INTC",
+        "Airbnb": "ABNB",
+        "Cadence Design Systems": "CDNS",
+        "O'Reilly Automotive": "ORLY",
+        "Fortinet": "FTNT",
+        "Marriott International": "MAR",
+        "Synopsys": "SNPS",
+        "PayPal": "PYPL",
+        "Workday, Inc.": "WDAY",
+        "Autodesk": "ADSK",
+        "Monster Beverage": "MNST",
+        "Roper Technologies": "ROP",
+        "CSX Corporation": "CSX",
+        "Axon Enterprise Inc.": "AXON",
+        "Paychex": "PAYX",
+        "American Electric Power": "AEP",
+        "Charter Communications": "CHTR",
+        "Atlassian": "TEAM",
+        "Regeneron Pharmaceuticals": "REGN",
+        "Marvell Technology": "MRVL",
+        "Copart": "CPRT",
+        "Paccar": "PCAR",
+        "NXP Semiconductors": "NXPI",
+        "Fastenal": "FAST",
+        "Ross Stores": "ROST",
+        "Keurig Dr Pepper": "KDP",
+        "Exelon": "EXC",
+        "Verisk": "VRSK",
+        "Zscaler": "ZS",
+        "Coca-Cola Europacific Partners": "CCEP",
+        "Cerner": "CERN",
+        "J.B. Hunt": "JBHT",
+        "UDR, Inc.": "UDR",
+        "IDEX Corporation": "IEX",
+        "Cooper Companies (The)": "COO",
+        "Textron": "TXT",
+        "Jack Henry & Associates": "JKHY",
+        "Masco": "MAS",
+        "Align Technology": "ALGN",
+        "Regency Centers": "REG",
+        "TKO Group Holdings": "TKO",
+        "Solventum": "SOLV",
+        "Teradyne": "TER",
+        "Incyte": "INCY",
+        "Camden Property Trust": "CPT",
+        "Allegion": "ALLE",
+        "Universal Health Services": "UHS",
+        "Alexandria Real Estate Equities": "ARE",
+        "Healthpeak Properties": "DOC",
+        "Nordson Corporation": "NDSN",
+        "Juniper Networks": "JNPR",
+        "J.M. Smucker Company (The)": "SJM",
+        "Builders FirstSource": "BLDR",
+        "Mosaic Company (The)": "MOS",
+        "C.H. Robinson": "CHRW",
+        "Franklin Resources": "BEN",
+        "Pool Corporation": "POOL",
+        "Conagra Brands": "CAG",
+        "Pinnacle West": "PNW",
+        "Molson Coors Beverage Company": "TAP",
+        "Akamai Technologies": "AKAM",
+        "Host Hotels & Resorts": "HST",
+        "BXP, Inc.": "BXP",
+        "Revvity": "RVTY",
+        "Bunge Global": "BG",
+        "LKQ Corporation": "LKQ",
+        "Skyworks Solutions": "SWKS",
+        "Viatris": "VTRS",
+        "DaVita": "DVA",
+        "Assurant": "AIZ",
+        "Moderna": "MRNA",
+        "Campbell Soup Company": "CPB",
+        "Stanley Black & Decker": "SWK",
+        "Globe Life": "GL",
+        "EPAM Systems": "EPAM",
+        "CarMax": "KMX",
+        "Walgreens Boots Alliance": "WBA",
+        "Wynn Resorts": "WYNN",
+        "Dayforce": "DAY",
+        "Hasbro": "HAS",
+        "A. O. Smith": "AOS",
+        "Eastman Chemical Company": "EMN",
+        "Interpublic Group of Companies (The)": "IPG",
+        "Huntington Ingalls Industries": "HII",
+        "Henry Schein": "HSIC",
+        "MGM Resorts": "MGM",
+        "Federal Realty Investment Trust": "FRT",
+        "Paramount Global": "PARA",
+        "MarketAxess": "MKTX",
+        "Norwegian Cruise Line Holdings": "NCLH",
+        "Lamb Weston": "LW",
+        "Bio-Techne": "TECH",
+        "Match Group": "MTCH",
+        "Generac": "GNRC",
+        "AES Corporation": "AES",
+        "Charles River Laboratories": "CRL",
+        "Albemarle Corporation": "ALB",
+        "Invesco": "IVZ",
+        "Mohawk Industries": "MHK",
+        "APA Corporation": "APA",
+        "Caesars Entertainment": "CZR",
+        "Enphase Energy": "ENPH",
+        "Air France KLM": "AF.PA",
+        "Accor": "AC.PA",
+        "Air Liquide": "AI.PA",
+        "Capgemini": "CAP.PA",
+        "AXA": "CS.PA",
+        "Danone": "BN.PA",
+        "Engie": "ENGI.PA",
+        "BNP Paribas": "BNP.PA",
+        "Bouygues": "EN.PA",
+        "LVMH": "MC.PA",
+        "L'Oréal": "OR.PA",
+        "Schneider Electric": "SU.PA",
+        "Saint-Gobain": "SGO.PA",
+        "Carrefour": "CA.PA",
+        "EssilorLuxottica": "EL.PA",
+        "Pernod Ricard": "RI.PA",
+        "Crédit Agricole": "ACA.PA",
+        "Vallourec": "VK.PA",
+        "Orange": "ORA.PA",
+        "Société Générale": "GLE.PA",
+        "Michelin": "ML.PA",
+        "Airbus Group": "AIR.PA",
+        "Alstom": "ALO.PA",
+        "Sanofi": "SAN.PA",
+        "Vivendi": "VIV.PA",
+        "TotalEnergies SE": "TTE.PA",
+        "STMicroelectronics": "STM",
+        "Vinci": "DG.PA",
+        "Renault": "RNO.PA",
+        "Veolia Environnement": "VIE.PA",
+        "Solvay": "SOLB.PA",
+        "Kering": "KER.PA",
+        "Unibail-Rodamco-Westfield": "URW.PA",
+        "ArcelorMittal": "MT.PA",
+        "Métropole Télévision": "MMT.PA",
+        "Eramet": "ERA.PA",
+        "Thales": "HO.PA",
+        "Gecina": "GFC.PA",
+        "Dassault Systèmes": "DSY.PA",
+        "Forvia": "FVIA.PA",
+        "Aéroports de Paris": "ADP.PA",
+        "Eurofins Scientific": "ERF.PA",
+        "Imerys": "NK.PA",
+        "Rexel": "RXL.PA",
+        "Rémy Cointreau": "RCO.PA",
+        "SES": "SESL.PA",
+        "Virbac": "VIRP.PA",
+        "Publicis Groupe": "PUB.PA",
+        "Arkema": "AKE.PA",
+        "Sodexo": "SW.PA",
+        "Ubisoft Entertainment": "UBI.PA",
+        "Hermès International": "RMS.PA",
+        "Soitec": "SOI.PA",
+        "Safran": "SAF.PA",
+        "Wendel": "MF.PA",
+        "Mercialys": "MERY.PA",
+        "Eiffage": "FGR.PA",
+        "Groupe SEB": "SK.PA",
+        "Trigano": "TRI.PA",
+        "SCOR": "SCR.PA",
+        "Sartorius Stedim Biotech": "DIM.PA",
+        "Covivio": "COV.PA",
+        "Eutelsat Communications": "ETL.PA",
+        "Atos": "ATO.PA",
+        "Valeo": "FR.PA",
+        "Plastic Omnium": "POXY.PA",
+        "Nexans": "NEX.PA",
+        "BIC": "BB.PA",
+        "Ipsos": "IPS.PA",
+        "Alten": "ATE.PA",
+        "CGG": "CGG.PA",
+        "Nexity": "NXI.PA",
+        "Beneteau": "BEN.PA",
+        "Legrand": "LR.PA",
+        "Klepierre": "LI.PA",
+        "Mersen": "MRN.PA",
+        "Ipsen": "IPN.PA",
+        "Orpea": "ORP.PA",
+        "JCDecaux": "DEC.PA",
+        "BioMérieux": "BIM.PA",
+        "TF1 Group": "TFI.PA",
+        "Teleperformance": "TEF.PA",
+        "Sopra Steria Group": "SOP.PA",
+        "Rubis": "RUI.PA",
+        "Inter Parfums": "IP.PA",
+        "Lectra": "LSS.PA",
+        "Bureau Veritas": "BVI.PA",
+        "Derichebourg": "DBG.PA",
+        "Icade": "ICAD.PA",
+        "Getlink": "GET.PA",
+        "Edenred": "EDEN.PA",
+        "Bolloré": "BOL.PA",
+        "Aperam": "APAM.PA",
+        "Argan": "ARGS.PA",
+        "Carmila": "CARM.PA",
+        "Dassault Aviation": "AM.PA",
+        "VusionGroup": "VUSN.PA",
+        "Valneva": "VLA.PA",
+        "Clariane": "CLAR.PA",
+        "Eurazeo": "RF.PA",
+        "ID Logistics": "IDL.PA",
+        "Fnac Darty": "FNAC.PA",
+        "Spie": "SPIE.PA",
+        "Solutions 30": "S30.PA",
+        "Coface": "COFA.PA",
+        "Gaztransport & Technigaz": "GTT.PA",
+        "Elior Group": "ELOR.PA",
+        "Euronext": "ENX.PA",
+        "Elis": "ELIS.PA",
+        "Voltalia": "VLTSA.PA",
+        "Worldline": "WLN.PA",
+        "Amundi": "AMUN.PA",
+        "X-Fab Silicon Foundries": "XFAB.PA",
+        "Ayvens": "ALD.PA",
+        "Verallia": "VRLA.PA",
+        "FDJ": "FDJ.PA",
+        "Stellantis": "STLA",
+        "Technip Energies": "TE.PA",
+        "Euroapi": "EAPI.PA",
+        "Bitcoin": "BTC",
+        "Ethereum": "ETH",
+        "Tether": "USDT",
+        "XRP": "XRP",
+        "BNB": "BNB",
+        "Solana": "SOL",
+        "USD Coin": "USDC",
+        "TRON": "TRX",
+        "Dogecoin": "DOGE",
+        "Cardano": "ADA",
+        "Wrapped Bitcoin": "WBTC",
+        "Bitcoin Cash": "BCH",
+        "Sui": "SUI",
+        "Chainlink": "LINK",
+        "UNUS SED LEO": "LEO",
+        "Avalanche": "AVAX",
+        "Stellar": "XLM",
+        "Toncoin": "TON",
+        "Shiba Inu": "SHIB",
+        "Litecoin": "LTC",
+        "WhiteBIT Token": "WBT",
+        "Hedera": "HBAR",
+        "Monero": "XMR",
+        "Dai": "DAI",
+        "Bitget Token": "BGB",
+        "Polkadot": "DOT",
+        "Uniswap": "UNI",
+        "Aave": "AAVE",
+        "Pepe": "PEPE",
+        "OKB": "OKB",
+        "Aptos": "APT",
+        "Bittensor": "TAO",
+        "NEAR Protocol": "NEAR",
+        "Internet Computer": "ICP",
+        "Cronos": "CRO",
+        "Ethereum Classic": "ETC",
+        "Ondo": "ONDO",
+        "Kaspa": "KAS",
+        "Mantle": "MNT",
+        "Fasttoken": "FTN",
+        "GateToken": "GT",
+        "Polygon Ecosystem Token": "POL",
+        "VeChain": "VET",
+        "OFFICIAL TRUMP": "TRUMP",
+        "Tokenize Xchange": "TKX",
+        "Arbitrum": "ARB",
+        "Artificial Superintelligence Alliance": "FET",
+        "Render Token": "RENDER",
+        "Ethena": "ENA",
+        "Cosmos": "ATOM",
+        'Zalando': 'ZAL'
+}
+
+EXCHANGE_BY_SUFFIX = {
+    '.PA': 'PAR',
+    '.L': 'LSE',
+    '.DE': 'GER',
+    '.AS': 'AMS',
+    '.MI': 'MIL',
+    '.SW': 'EBS',
+    '.MC': 'MCE',
+    '.TO': 'TOR',
+    '.HK': 'HKG',
+    '.T': 'JPX'
+}
+
+class TickerSearchIndex:
+    """Index de recherche en mémoire (préfixes et n-grammes) sur les noms et symboles connus"""
+
+    MAX_GRAM = 3
+
+    def __init__(self, tickers: Dict[str, str]):
+        self.entries: List[Tuple[str, str]] = []
         seen = set()
-        unique_results = []
-        for item in results:
-            if item['symbol'] not in seen:
-                seen.add(item['symbol'])
-                unique_results.append(item)
+        for name, symbol in tickers.items():
+            if symbol not in seen:
+                seen.add(symbol)
+                self.entries.append((name, symbol))
+        self._norm_names = [self.normalize(name) for name, _ in self.entries]
+        self._norm_symbols = [self.normalize(symbol) for _, symbol in self.entries]
+        self._symbol_keys = sorted((key, i) for i, key in enumerate(self._norm_symbols))
+        self._name_keys = sorted((key, i) for i, key in enumerate(self._norm_names))
+        self._word_keys = sorted(
+            (word, i) for i, key in enumerate(self._norm_names) for word in set(key.split())
+        )
+        self._grams: Dict[str, set] = {}
+        for i, (name, symbol) in enumerate(zip(self._norm_names, self._norm_symbols)):
+            for text in (name, symbol):
+                for n in range(1, self.MAX_GRAM + 1):
+                    for k in range(len(text) - n + 1):
+                        self._grams.setdefault(text[k:k + n], set()).add(i)
 
-        return unique_results[:limit]
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Minuscules, sans accents ni espaces superflus"""
+        text = unicodedata.normalize('NFKD', str(text))
+        text = ''.join(c for c in text if not unicodedata.combining(c))
+        return ' '.join(text.casefold().split())
 
     @staticmethod
-    def _pattern_search(query: str) -> List[Dict]:
-        """Recherche par patterns pour les tickers populaires"""
-        common_tickers = {
-            "Microsoft": "MSFT",
-            "Nvidia": "NVDA",
-            "Apple Inc.": "AAPL",
-            "Amazon": "AMZN",
-            "Alphabet Inc. (Class C)": "GOOG",
-            "Alphabet Inc. (Class A)": "GOOGL",
-            "Meta Platforms": "META",
-            "Broadcom": "AVGO",
-            "Tesla, Inc.": "TSLA",
-            "Berkshire Hathaway": "BRK.B",
-            "Walmart": "WMT",
-            "JPMorgan Chase": "JPM",
-            "Visa Inc.": "V",
-            "Lilly (Eli)": "LLY",
-            "Mastercard": "MA",
-            "Netflix": "NFLX",
-            "Oracle Corporation": "ORCL",
-            "Costco": "COST",
-            "ExxonMobil": "XOM",
-            "Procter & Gamble": "PG",
-            "Johnson & Johnson": "JNJ",
-            "Home Depot (The)": "HD",
-            "Bank of America": "BAC",
-            "AbbVie": "ABBV",
-            "Palantir Technologies": "PLTR",
-            "Coca-Cola Company (The)": "KO",
-            "Philip Morris International": "PM",
-            "T-Mobile US": "TMUS",
-            "UnitedHealth Group": "UNH",
-            "GE Aerospace": "GE",
-            "Salesforce": "CRM",
-            "Cisco": "CSCO",
-            "Wells Fargo": "WFC",
-            "IBM": "IBM",
-            "Chevron Corporation": "CVX",
-            "Abbott Laboratories": "ABT",
-            "McDonald's": "MCD",
-            "Linde plc": "LIN",
-            "Intuit": "INTU",
-            "ServiceNow": "NOW",
-            "American Express": "AXP",
-            "Morgan Stanley": "MS",
-            "Walt Disney Company (The)": "DIS",
-            "AT&T": "T",
-            "Accenture": "ACN",
-            "Intuitive Surgical": "ISRG",
-            "Merck & Co.": "MRK",
-            "Verizon": "VZ",
-            "Goldman Sachs": "GS",
-            "RTX Corporation": "RTX",
-            "PepsiCo": "PEP",
-            "Booking Holdings": "BKNG",
-            "Advanced Micro Devices": "AMD",
-            "Adobe Inc.": "ADBE",
-            "Uber": "UBER",
-            "Progressive Corporation": "PGR",
-            "Texas Instruments": "TXN",
-            "Caterpillar Inc.": "CAT",
-            "Charles Schwab Corporation": "SCHW",
-            "Qualcomm": "QCOM",
-            "S&P Global": "SPGI",
-            "Boeing": "BA",
-            "Boston Scientific": "BSX",
-            "Amgen": "AMGN",
-            "Thermo Fisher Scientific": "TMO",
-            "BlackRock": "BLK",
-            "Stryker Corporation": "SYK",
-            "Honeywell": "HON",
-            "NextEra Energy": "NEE",
-            "TJX Companies": "TJX",
-            "Citigroup": "C",
-            "Deere & Company": "DE",
-            "Gilead Sciences": "GILD",
-            "Danaher Corporation": "DHR",
-            "Pfizer": "PFE",
-            "Union Pacific Corporation": "UNP",
-            "Automatic Data Processing": "ADP",
-            "GE Vernova": "GEV",
-            "Comcast": "CMCSA",
-            "Palo Alto Networks": "PANW",
-            "Best Buy": "BBY",
-            "Avery Dennison": "AVY",
-            "Hologic": "HOLX",
-            "J.B. Hunt": "JBHT",
-            "UDR, Inc.": "UDR",
-            "IDEX Corporation": "IEX",
-            "Cooper Companies (The)": "COO",
-            "Textron": "TXT",
-            "Jack Henry & Associates": "JKHY",
-            "Masco": "MAS",
-            "Align Technology": "ALGN",
-            "Regency Centers": "REG",
-            "TKO Group Holdings": "TKO",
-            "Solventum": "SOLV",
-            "Teradyne": "TER",
-            "Incyte": "INCY",
-            "Camden Property Trust": "CPT",
-            "Allegion": "ALLE",
-            "Universal Health Services": "UHS",
-            "Alexandria Real Estate Equities": "ARE",
-            "Healthpeak Properties": "DOC",
-            "Nordson Corporation": "NDSN",
-            "Juniper Networks": "JNPR",
-            "J.M. Smucker Company (The)": "SJM",
-            "Builders FirstSource": "BLDR",
-            "Mosaic Company (The)": "MOS",
-            "C.H. Robinson": "CHRW",
-            "Franklin Resources": "BEN",
-            "Pool Corporation": "POOL",
-            "Conagra Brands": "CAG",
-            "Pinnacle West": "PNW",
-            "Molson Coors Beverage Company": "TAP",
-            "Akamai Technologies": "AKAM",
-            "Host Hotels & Resorts": "HST",
-            "BXP, Inc.": "BXP",
-            "Revvity": "RVTY",
-            "Bunge Global": "BG",
-            "LKQ Corporation": "LKQ",
-            "Skyworks Solutions": "SWKS",
-            "Viatris": "VTRS",
-            "DaVita": "DVA",
-            "Assurant": "AIZ",
-            "Moderna": "MRNA",
-            "Campbell Soup Company": "CPB",
-            "Stanley Black & Decker": "SWK",
-            "Globe Life": "GL",
-            "EPAM Systems": "EPAM",
-            "CarMax": "KMX",
-            "Walgreens Boots Alliance": "WBA",
-            "Wynn Resorts": "WYNN",
-            "Dayforce": "DAY",
-            "Hasbro": "HAS",
-            "A. O. Smith": "AOS",
-            "Eastman Chemical Company": "EMN",
-            "Interpublic Group of Companies (The)": "IPG",
-            "Huntington Ingalls Industries": "HII",
-            "Henry Schein": "HSIC",
-            "MGM Resorts": "MGM",
-            "Federal Realty Investment Trust": "FRT",
-            "Paramount Global": "PARA",
-            "MarketAxess": "MKTX",
-            "Norwegian Cruise Line Holdings": "NCLH",
-            "Lamb Weston": "LW",
-            "Bio-Techne": "TECH",
-            "Match Group": "MTCH",
-            "Generac": "GNRC",
-            "AES Corporation": "AES",
-            "Charles River Laboratories": "CRL",
-            "Albemarle Corporation": "ALB",
-            "Invesco": "IVZ",
-            "Mohawk Industries": "MHK",
-            "APA Corporation": "APA",
-            "Caesars Entertainment": "CZR",
-            "Enphase Energy": "ENPH",
-            "Adidas AG": "ADS.DE",
-            "Allianz SE": "ALV.DE",
-            "BASF SE": "BAS.DE",
-            "Bayer AG": "BAYN.DE",
-            "Beiersdorf AG": "BEI.DE",
-            "BMW AG": "BMW.DE",
-            "Continental AG": "CON.DE",
-            "Covestro AG": "1COV.DE",
-            "Daimler AG": "DAI.DE",
-            "Deutsche Bank AG": "DBK.DE",
-            "Deutsche Boerse AG": "DB1.DE",
-            "Deutsche Post AG": "DPW.DE",
-            "Deutsche Telekom AG": "DTE.DE",
-            "Deutsche Wohnen SE": "DWNI.DE",
-            "E.ON SE": "EOAN.DE",
-            "Fresenius Medical Care AG & Co. KGaA": "FME.DE",
-            "Fresenius SE & Co. KGaA": "FRE.DE",
-            "HeidelbergCement AG": "HEI.DE",
-            "Henkel AG & Co. KGaA": "HEN3.DE",
-            "Infineon Technologies AG": "IFX.DE",
-            "Linde plc": "LIN.DE",
-            "Merck KGaA": "MRK.DE",
-            "MTU Aero Engines AG": "MTX.DE",
-            "Muenchener Rueckversicherungs-Gesellschaft AG": "MUV2.DE",
-            "Puma SE": "PUM.DE",
-            "Qiagen N.V.": "QIA.DE",
-            "RWE AG": "RWE.DE",
-            "SAP SE": "SAP.DE",
-            "Siemens AG": "SIE.DE",
-            "Siemens Healthineers AG": "SHL.DE",
-            "Symrise AG": "SY1.DE",
-            "Vonovia SE": "VNA.DE",
-            "Volkswagen AG": "VOW3.DE",
-            "Wirecard AG": "WDI.DE",
-            "Zalando SE": "ZAL.DE",
-            "3i Group PLC": "III.L",
-            "Admiral Group PLC": "ADM.L",
-            "Anglo American PLC": "AAL.L",
-            "Antofagasta PLC": "ANTO.L",
-            "Ashtead Group PLC": "AHT.L",
-            "Associated British Foods PLC": "ABF.L",
-            "AstraZeneca PLC": "AZN.L",
-            "Auto Trader Group PLC": "AUTO.L",
-            "Aviva PLC": "AV/.L",
-            "B&M European Value Retail S.A.": "BME.L",
-            "BAE Systems PLC": "BA/.L",
-            "Barratt Developments PLC": "BDEV.L",
-            "Berkeley Group Holdings PLC": "BKG.L",
-            "BHP Group PLC": "BHP.L",
-            "BP PLC": "BP/.L",
-            "British American Tobacco PLC": "BATS.L",
-            "British Land Company PLC": "BLND.L",
-            "Bunzl PLC": "BNZL.L",
-            "Burberry Group PLC": "BRBY.L",
-            "Coca-Cola Europacific Partners PLC": "CCEP.L",
-            "Croda International PLC": "CRDA.L",
-            "CRH PLC": "CRH.L",
-            "DCC PLC": "DCC.L",
-            "Diageo PLC": "DGE.L",
-            "Entain PLC": "ENT.L",
-            "Experian PLC": "EXPN.L",
-            "Ferguson PLC": "FERG.L",
-            "Fresnillo PLC": "FRES.L",
-            "GlaxoSmithKline PLC": "GSK.L",
-            "Glencore PLC": "GLEN.L",
-            "Halma PLC": "HLMA.L",
-            "Haleon PLC": "HLN.L",
-            "HSBC Holdings PLC": "HSBA.L",
-            "Hiscox Ltd": "HSX.L",
-            "Howden Joinery Group PLC": "HWDN.L",
-            "International Consolidated Airlines Group SA": "IAG.L",
-            "Intermediate Capital Group PLC": "ICG.L",
-            "InterContinental Hotels Group PLC": "IHG.L",
-            "3i Group PLC": "III.L",
-            "Imperial Brands PLC": "IMB.L",
-            "IMI PLC": "IMI.L",
-            "Informa PLC": "INF.L",
-            "Intertek Group PLC": "ITRK.L",
-            "JD Sports Fashion PLC": "JD/.L",
-            "Kingfisher PLC": "KGF.L",
-            "Land Securities Group PLC": "LAND.L",
-            "Legal & General Group PLC": "LGEN.L",
-            "Lloyds Banking Group PLC": "LLOY.L",
-            "LondonMetric Property PLC": "LMP.L",
-            "London Stock Exchange Group PLC": "LSEG.L",
-            "Marks & Spencer Group PLC": "MKS.L",
-            "Mondi PLC": "MNDI.L",
-            "M&G PLC": "MNG.L",
-            "Melrose Industries PLC": "MRO.L",
-            "National Grid PLC": "NG/.L",
-            "NatWest Group PLC": "NWG.L",
-            "Next PLC": "NXT.L",
-            "Polar Capital Technology Trust PLC": "PCT.L",
-            "Phoenix Group Holdings PLC": "PHNX.L",
-            "Prudential PLC": "PRU.L",
-            "Pershing Square Holdings Ltd/Fund": "PSH.L",
-            "Persimmon PLC": "PSN.L",
-            "Pearson PLC": "PSON.L",
-            "RELX PLC": "REL.L",
-            "Rio Tinto PLC": "RIO.L",
-            "Reckitt Benckiser Group PLC": "RKT.L",
-            "Rightmove PLC": "RMV.L",
-            "Rolls-Royce Holdings PLC": "RR/.L",
-            "Rentokil Initial PLC": "RTO.L",
-            "J Sainsbury PLC": "SBRY.L",
-            "Schroders PLC": "SDR.L",
-            "Sage Group PLC/The": "SGE.L",
-            "Segro PLC": "SGRO.L",
-            "Shell PLC": "SHEL.L",
-            "Smiths Group PLC": "SMIN.L",
-            "Scottish Mortgage Investment Trust PLC": "SMT.L",
-            "Smith & Nephew PLC": "SN/.L",
-            "Spirax Group PLC": "SPX.L",
-            "SSE PLC": "SSE.L",
-            "Standard Chartered PLC": "STAN.L",
-            "St James's Place PLC": "STJ.L",
-            "Severn Trent PLC": "SVT.L",
-            "Tesco PLC": "TSCO.L",
-            "Taylor Wimpey PLC": "TW/.L",
-            "Unilever PLC": "ULVR.L",
-            "UNITE Group PLC/The": "UTG.L",
-            "United Utilities Group PLC": "UU/.L",
-            "Vodafone Group PLC": "VOD.L",
-            "Weir Group PLC/The": "WEIR.L",
-            "WPP PLC": "WPP.L",
-            "Whitbread PLC": "WTB.L",
-            "Microsoft": "MSFT",
-            "Nvidia": "NVDA",
-            "Apple Inc.": "AAPL",
-            "Amazon": "AMZN",
-            "Alphabet Inc. (Class C)": "GOOG",
-            "Alphabet Inc. (Class A)": "GOOGL",
-            "Meta Platforms": "META",
-            "Broadcom Inc.": "AVGO",
-            "Tesla, Inc.": "TSLA",
-            "Netflix": "NFLX",
-            "Costco": "COST",
-            "Palantir Technologies": "PLTR",
-            "ASML Holding": "ASML",
-            "T-Mobile US": "TMUS",
-            "Cisco": "CSCO",
-            "AstraZeneca": "AZN",
-            "Linde plc": "LIN",
-            "Intuit": "INTU",
-            "Intuitive Surgical": "ISRG",
-            "PepsiCo": "PEP",
-            "Booking Holdings": "BKNG",
-            "Advanced Micro Devices Inc.": "AMD",
-            "Adobe Inc.": "ADBE",
-            "Texas Instruments": "TXN",
-            "Qualcomm": "QCOM",
-            "Amgen": "AMGN",
-            "Honeywell": "HON",
-            "PDD Holdings": "PDD",
-            "Gilead Sciences": "GILD",
-            "Applovin Corp": "APP",
-            "ADP": "ADP",
-            "Arm Holdings": "ARM",
-            "MercadoLibre": "MELI",
-            "Comcast": "CMCSA",
-            "Palo Alto Networks": "PANW",
-            "Applied Materials": "AMAT",
-            "CrowdStrike": "CRWD",
-            "Vertex Pharmaceuticals": "VRTX",
-            "Analog Devices": "ADI",
-            "Micron Technology": "MU",
-            "Lam Research": "LRCX",
-            "MicroStrategy Inc.": "MSTR",
-            "KLA Corporation": "KLAC",
-            "Constellation Energy": "CEG",
-            "Starbucks": "SBUX",
-            "Cintas": "CTAS",
-            "DoorDash": "DASH",
-            "Mondelez International": "MDLZ",
-            "Intel": "INTC",
-            "Airbnb": "ABNB",
-            "Cadence Design Systems": "CDNS",
-            "O'Reilly Automotive": "ORLY",
-            "Fortinet": "FTNT",
-            "Marriott International": "MAR",
-            "Synopsys": "SNPS",
-            "PayPal": "PYPL",
-            "Workday, Inc.": "WDAY",
-            "Autodesk": "ADSK",
-            "Monster Beverage": "MNST",
-            "Roper Technologies": "ROP",
-            "CSX Corporation": "CSX",
-            "Axon Enterprise Inc.": "AXON",
-            "Paychex": "PAYX",
-            "American Electric Power": "AEP",
-            "Charter Communications": "CHTR",
-            "Atlassian": "TEAM",
-            "Regeneron Pharmaceuticals": "REGN",
-            "Marvell Technology": "MRVL",
-            "Copart": "CPRT",
-            "Paccar": "PCAR",
-            "NXP Semiconductors": "NXPI",
-            "Fastenal": "FAST",
-            "Ross Stores": "ROST",
-            "Keurig Dr Pepper": "KDP",
-            "Exelon": "EXC",
-            "Verisk": "VRSK",
-            "Zscaler": "ZS",
-            "Coca-Cola Europacific Partners": "CCEP",
-            "Cerner": "CERN",
-            "J.B. Hunt": "JBHT",
-            "UDR, Inc.": "UDR",
-            "IDEX Corporation": "IEX",
-            "Cooper Companies (The)": "COO",
-            "Textron": "TXT",
-            "Jack Henry & Associates": "JKHY",
-            "Masco": "MAS",
-            "Align Technology": "ALGN",
-            "Regency Centers": "REG",
-            "TKO Group Holdings": "TKO",
-            "Solventum": "SOLV",
-            "Teradyne": "TER",
-            "Incyte": "INCY",
-            "Camden Property Trust": "CPT",
-            "Allegion": "ALLE",
-            "Universal Health Services": "UHS",
-            "Alexandria Real Estate Equities": "ARE",
-            "Healthpeak Properties": "DOC",
-            "Nordson Corporation": "NDSN",
-            "Juniper Networks": "JNPR",
-            "J.M. Smucker Company (The)": "SJM",
-            "Builders FirstSource": "BLDR",
-            "Mosaic Company (The)": "MOS",
-            "C.H. Robinson": "CHRW",
-            "Franklin Resources": "BEN",
-            "Pool Corporation": "POOL",
-            "Conagra Brands": "CAG",
-            "Pinnacle West": "PNW",
-            "Molson Coors Beverage Company": "TAP",
-            "Akamai Technologies": "AKAM",
-            "Host Hotels & Resorts": "HST",
-            "BXP, Inc.": "BXP",
-            "Revvity": "RVTY",
-            "Bunge Global": "BG",
-            "LKQ Corporation": "LKQ",
-            "Skyworks Solutions": "SWKS",
-            "Viatris": "VTRS",
-            "DaVita": "DVA",
-            "Assurant": "AIZ",
-            "Moderna": "MRNA",
-            "Campbell Soup Company": "CPB",
-            "Stanley Black & Decker": "SWK",
-            "Globe Life": "GL",
-            "EPAM Systems": "EPAM",
-            "CarMax": "KMX",
-            "Walgreens Boots Alliance": "WBA",
-            "Wynn Resorts": "WYNN",
-            "Dayforce": "DAY",
-            "Hasbro": "HAS",
-            "A. O. Smith": "AOS",
-            "Eastman Chemical Company": "EMN",
-            "Interpublic Group of Companies (The)": "IPG",
-            "Huntington Ingalls Industries": "HII",
-            "Henry Schein": "HSIC",
-            "MGM Resorts": "MGM",
-            "Federal Realty Investment Trust": "FRT",
-            "Paramount Global": "PARA",
-            "MarketAxess": "MKTX",
-            "Norwegian Cruise Line Holdings": "NCLH",
-            "Lamb Weston": "LW",
-            "Bio-Techne": "TECH",
-            "Match Group": "MTCH",
-            "Generac": "GNRC",
-            "AES Corporation": "AES",
-            "Charles River Laboratories": "CRL",
-            "Albemarle Corporation": "ALB",
-            "Invesco": "IVZ",
-            "Mohawk Industries": "MHK",
-            "APA Corporation": "APA",
-            "Caesars Entertainment": "CZR",
-            "Enphase Energy": "ENPH",
-            "Air France KLM": "AF.PA",
-            "Accor": "AC.PA",
-            "Air Liquide": "AI.PA",
-            "Capgemini": "CAP.PA",
-            "AXA": "CS.PA",
-            "Danone": "BN.PA",
-            "Engie": "ENGI.PA",
-            "BNP Paribas": "BNP.PA",
-            "Bouygues": "EN.PA",
-            "LVMH": "MC.PA",
-            "L'Oréal": "OR.PA",
-            "Schneider Electric": "SU.PA",
-            "Saint-Gobain": "SGO.PA",
-            "Carrefour": "CA.PA",
-            "EssilorLuxottica": "EL.PA",
-            "Pernod Ricard": "RI.PA",
-            "Crédit Agricole": "ACA.PA",
-            "Vallourec": "VK.PA",
-            "Orange": "ORA.PA",
-            "Société Générale": "GLE.PA",
-            "Michelin": "ML.PA",
-            "Airbus Group": "AIR.PA",
-            "Alstom": "ALO.PA",
-            "Sanofi": "SAN.PA",
-            "Vivendi": "VIV.PA",
-            "TotalEnergies SE": "TTE.PA",
-            "STMicroelectronics": "STM",
-            "Vinci": "DG.PA",
-            "Renault": "RNO.PA",
-            "Veolia Environnement": "VIE.PA",
-            "Solvay": "SOLB.PA",
-            "Kering": "KER.PA",
-            "Unibail-Rodamco-Westfield": "URW.PA",
-            "ArcelorMittal": "MT.PA",
-            "Métropole Télévision": "MMT.PA",
-            "Eramet": "ERA.PA",
-            "Thales": "HO.PA",
-            "Gecina": "GFC.PA",
-            "Dassault Systèmes": "DSY.PA",
-            "Forvia": "FVIA.PA",
-            "Aéroports de Paris": "ADP.PA",
-            "Eurofins Scientific": "ERF.PA",
-            "Imerys": "NK.PA",
-            "Rexel": "RXL.PA",
-            "Rémy Cointreau": "RCO.PA",
-            "SES": "SESL.PA",
-            "Virbac": "VIRP.PA",
-            "Publicis Groupe": "PUB.PA",
-            "Arkema": "AKE.PA",
-            "Sodexo": "SW.PA",
-            "Ubisoft Entertainment": "UBI.PA",
-            "Hermès International": "RMS.PA",
-            "Soitec": "SOI.PA",
-            "Safran": "SAF.PA",
-            "Wendel": "MF.PA",
-            "Mercialys": "MERY.PA",
-            "Eiffage": "FGR.PA",
-            "Groupe SEB": "SK.PA",
-            "Trigano": "TRI.PA",
-            "SCOR": "SCR.PA",
-            "Sartorius Stedim Biotech": "DIM.PA",
-            "Covivio": "COV.PA",
-            "Eutelsat Communications": "ETL.PA",
-            "Atos": "ATO.PA",
-            "Valeo": "FR.PA",
-            "Plastic Omnium": "POXY.PA",
-            "Nexans": "NEX.PA",
-            "BIC": "BB.PA",
-            "Ipsos": "IPS.PA",
-            "Alten": "ATE.PA",
-            "CGG": "CGG.PA",
-            "Nexity": "NXI.PA",
-            "Beneteau": "BEN.PA",
-            "Legrand": "LR.PA",
-            "Klepierre": "LI.PA",
-            "Mersen": "MRN.PA",
-            "Ipsen": "IPN.PA",
-            "Orpea": "ORP.PA",
-            "JCDecaux": "DEC.PA",
-            "BioMérieux": "BIM.PA",
-            "TF1 Group": "TFI.PA",
-            "Teleperformance": "TEF.PA",
-            "Sopra Steria Group": "SOP.PA",
-            "Rubis": "RUI.PA",
-            "Inter Parfums": "IP.PA",
-            "Lectra": "LSS.PA",
-            "Bureau Veritas": "BVI.PA",
-            "Derichebourg": "DBG.PA",
-            "Icade": "ICAD.PA",
-            "Getlink": "GET.PA",
-            "Edenred": "EDEN.PA",
-            "Bolloré": "BOL.PA",
-            "Aperam": "APAM.PA",
-            "Argan": "ARGS.PA",
-            "Carmila": "CARM.PA",
-            "Dassault Aviation": "AM.PA",
-            "VusionGroup": "VUSN.PA",
-            "Valneva": "VLA.PA",
-            "Clariane": "CLAR.PA",
-            "Eurazeo": "RF.PA",
-            "ID Logistics": "IDL.PA",
-            "Fnac Darty": "FNAC.PA",
-            "Spie": "SPIE.PA",
-            "Solutions 30": "S30.PA",
-            "Coface": "COFA.PA",
-            "Gaztransport & Technigaz": "GTT.PA",
-            "Elior Group": "ELOR.PA",
-            "Euronext": "ENX.PA",
-            "Elis": "ELIS.PA",
-            "Voltalia": "VLTSA.PA",
-            "Worldline": "WLN.PA",
-            "Amundi": "AMUN.PA",
-            "X-Fab Silicon Foundries": "XFAB.PA",
-            "Ayvens": "ALD.PA",
-            "Verallia": "VRLA.PA",
-            "FDJ": "FDJ.PA",
-            "Stellantis": "STLA",
-            "Technip Energies": "TE.PA",
-            "Euroapi": "EAPI.PA",
-            "Bitcoin": "BTC",
-            "Ethereum": "ETH",
-            "Tether": "USDT",
-            "XRP": "XRP",
-            "BNB": "BNB",
-            "Solana": "SOL",
-            "USD Coin": "USDC",
-            "TRON": "TRX",
-            "Dogecoin": "DOGE",
-            "Cardano": "ADA",
-            "Wrapped Bitcoin": "WBTC",
-            "Bitcoin Cash": "BCH",
-            "Sui": "SUI",
-            "Chainlink": "LINK",
-            "UNUS SED LEO": "LEO",
-            "Avalanche": "AVAX",
-            "Stellar": "XLM",
-            "Toncoin": "TON",
-            "Shiba Inu": "SHIB",
-            "Litecoin": "LTC",
-            "WhiteBIT Token": "WBT",
-            "Hedera": "HBAR",
-            "Monero": "XMR",
-            "Dai": "DAI",
-            "Bitget Token": "BGB",
-            "Polkadot": "DOT",
-            "Uniswap": "UNI",
-            "Aave": "AAVE",
-            "Pepe": "PEPE",
-            "OKB": "OKB",
-            "Aptos": "APT",
-            "Bittensor": "TAO",
-            "NEAR Protocol": "NEAR",
-            "Internet Computer": "ICP",
-            "Cronos": "CRO",
-            "Ethereum Classic": "ETC",
-            "Ondo": "ONDO",
-            "Kaspa": "KAS",
-            "Mantle": "MNT",
-            "Fasttoken": "FTN",
-            "GateToken": "GT",
-            "Polygon Ecosystem Token": "POL",
-            "VeChain": "VET",
-            "OFFICIAL TRUMP": "TRUMP",
-            "Tokenize Xchange": "TKX",
-            "Arbitrum": "ARB",
-            "Artificial Superintelligence Alliance": "FET",
-            "Render Token": "RENDER",
-            "Ethena": "ENA",
-            "Cosmos": "ATOM",
-            'Zalando': 'ZAL'
+    def _prefix_ids(keys: List[Tuple[str, int]], prefix: str):
+        position = bisect.bisect_left(keys, (prefix, -1))
+        while position < len(keys) and keys[position][0].startswith(prefix):
+            yield keys[position][1]
+            position += 1
+
+    def _substring_ids(self, query: str) -> set:
+        n = min(len(query), self.MAX_GRAM)
+        candidates = None
+        for k in range(len(query) - n + 1):
+            ids = self._grams.get(query[k:k + n], set())
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                return set()
+        return {
+            i for i in candidates
+            if query in self._norm_names[i] or query in self._norm_symbols[i]
         }
-        query_upper = query.upper()
-        results = []
 
-        for name, symbol in common_tickers.items():
-            if query_upper in name or query_upper in symbol:
-                try:
-                    ticker = yf.Ticker(symbol)
-                    info = ticker.info
-                    results.append({
-                        'symbol': symbol,
-                        'name': info.get('shortName', name),
-                        'type': 'Stock',
-                        'exchange': info.get('exchange', 'Unknown'),
-                        'source': 'Pattern'
-                    })
-                except:
-                    continue
+    def search(self, query: str, limit: Optional[int] = None) -> List[Dict]:
+        """Recherche classée: symbole exact, préfixe de symbole, de nom, de mot, puis sous-chaîne"""
+        query = self.normalize(query)
+        if not query:
+            return []
+        scores: Dict[int, int] = {}
+        for i in self._prefix_ids(self._symbol_keys, query):
+            scores[i] = 100 if self._norm_symbols[i] == query else 80
+        for i in self._prefix_ids(self._name_keys, query):
+            scores.setdefault(i, 60)
+        for i in self._prefix_ids(self._word_keys, query):
+            scores.setdefault(i, 40)
+        if limit is None or len(scores) < limit:
+            for i in self._substring_ids(query):
+                scores.setdefault(i, 20)
+        ranked = sorted(scores, key=lambda i: (-scores[i], len(self._norm_symbols[i]), i))
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [self._result(i) for i in ranked]
 
-        return results
+    def _result(self, i: int) -> Dict:
+        name, symbol = self.entries[i]
+        suffix = symbol[symbol.rfind('.'):] if '.' in symbol else ''
+        return {
+            'symbol': symbol,
+            'name': name,
+            'type': 'Stock',
+            'exchange': EXCHANGE_BY_SUFFIX.get(suffix, 'Unknown'),
+            'source': 'Pattern'
+        }
+
+@st.cache_resource
+def get_ticker_index() -> TickerSearchIndex:
+    """Index de recherche construit une seule fois par processus"""
+    return TickerSearchIndex(COMMON_TICKERS)
+
+class TTLCache:
+    """Cache LRU borné avec durée de vie des entrées et compteurs de succès"""
+
+    def __init__(self, maxsize: int = 256, ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[object, Tuple[float, object]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Valeur associée à la clé si elle n'a pas expiré"""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None or time.time() - item[0] > self.ttl:
+                if item is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def __contains__(self, key) -> bool:
+        """Présence d'une entrée non expirée, sans toucher aux compteurs ni à l'ordre LRU"""
+        with self._lock:
+            item = self._entries.get(key)
+            return item is not None and time.time() - item[0] <= self.ttl
+
+    def set(self, key, value):
+        """Enregistre une valeur et évince les entrées les plus anciennes"""
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """Compteurs de succès/échecs du cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'size': len(self._entries)
+            }
+
+METADATA_CACHE_PATH = os.environ.get('PORTFOLIO_METADATA_CACHE', os.path.join('.cache', 'metadata.json'))
+
+class MetadataCache:
+    """Cache LRU des métadonnées de tickers avec durée de vie par champ et persistance optionnelle"""
+
+    STATIC_FIELDS = ['name', 'currency', 'exchange', 'sector', 'industry', 'isin', 'type']
+    DEFAULT_TTLS = {
+        'price': 60,
+        'market_cap': 24 * 3600,
+        'beta': 24 * 3600,
+        **{field: 7 * 24 * 3600 for field in STATIC_FIELDS}
+    }
+
+    def __init__(self, maxsize: int = 2048, ttls: Optional[Dict[str, float]] = None,
+                 path: Optional[str] = METADATA_CACHE_PATH, save_delay: float = 2.0):
+        self.maxsize = maxsize
+        self.ttls = {**self.DEFAULT_TTLS, **(ttls or {})}
+        self.path = path
+        self.save_delay = save_delay
+        self.hits = 0
+        self.misses = 0
+        self.partial_hits = 0
+        self._entries: 'OrderedDict[str, Dict]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self._timer: Optional[threading.Timer] = None
+        self._entries.update(list(self._read().items())[-self.maxsize:])
+        if self.path:
+            atexit.register(self.flush)
+
+    def _read(self) -> Dict[str, Dict]:
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Cache de métadonnées illisible, ignoré: {e}")
+            return {}
+
+    @staticmethod
+    def _merge_entry(ours: Dict, theirs: Dict) -> Dict:
+        """Entrée combinée: pour chaque champ, la valeur la plus récente des deux"""
+        merged = {'values': dict(theirs['values']), 'fetched_at': dict(theirs['fetched_at'])}
+        for field, fetched_at in ours['fetched_at'].items():
+            if fetched_at >= merged['fetched_at'].get(field, float('-inf')):
+                merged['values'][field] = ours['values'].get(field)
+                merged['fetched_at'][field] = fetched_at
+        return merged
+
+    def flush(self):
+        """Écrit les modifications en attente, fusionnées avec celles des autres processus (lot, jobs)"""
+        if not self.path:
+            return
+        with self._save_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                if not self._dirty:
+                    return
+                self._dirty = False
+                entries = {symbol: {'values': dict(entry['values']), 'fetched_at': dict(entry['fetched_at'])}
+                           for symbol, entry in self._entries.items()}
+            on_disk = self._read()
+            merged = OrderedDict((symbol, entry) for symbol, entry in on_disk.items() if symbol not in entries)
+            for symbol, entry in entries.items():
+                merged[symbol] = self._merge_entry(entry, on_disk[symbol]) if symbol in on_disk else entry
+            while len(merged) > self.maxsize:
+                merged.popitem(last=False)
+            tmp_path = None
+            try:
+                directory = os.path.dirname(os.path.abspath(self.path))
+                os.makedirs(directory, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f"{os.path.basename(self.path)}.", suffix='.tmp')
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(merged, f, default=str)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"Impossible d'écrire le cache de métadonnées: {e}")
+                if tmp_path and os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def stale_fields(self, symbol: str, fields: Optional[List[str]] = None) -> List[str]:
+        """Liste des champs absents ou expirés pour un symbole"""
+        fields = fields or list(self.ttls)
+        with self._lock:
+            entry = self._entries.get(symbol)
+            if entry is None:
+                return list(fields)
+            now = time.time()
+            return [
+                field for field in fields
+                if field not in entry['fetched_at'] or now - entry['fetched_at'][field] > self.ttls.get(field, 0)
+            ]
+
+    def get(self, symbol: str) -> Optional[Dict]:
+        """Retourne les valeurs en cache (fraîches ou non) d'un symbole"""
+        with self._lock:
+            entry = self._entries.get(symbol)
+            if entry is None:
+                return None
+            self._entries.move_to_end(symbol)
+            return dict(entry['values'])
+
+    def fetched_at(self, symbol: str, field: str) -> Optional[float]:
+        """Horodatage (epoch) de la dernière récupération d'un champ"""
+        with self._lock:
+            entry = self._entries.get(symbol)
+            return entry['fetched_at'].get(field) if entry is not None else None
+
+    def record(self, outcome: str):
+        """Comptabilise une consultation: 'hit', 'partial' ou 'miss'"""
+        with self._lock:
+            if outcome == 'hit':
+                self.hits += 1
+            elif outcome == 'partial':
+                self.partial_hits += 1
+            else:
+                self.misses += 1
+
+    def update(self, symbol: str, values: Dict):
+        """Enregistre de nouvelles valeurs de champs pour un symbole"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.setdefault(symbol, {'values': {}, 'fetched_at': {}})
+            entry['values'].update(values)
+            entry['fetched_at'].update({field: now for field in values})
+            self._entries.move_to_end(symbol)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            # Écriture différée et groupée, hors du chemin des appels (validation, résolution, actualisation)
+            self._dirty = True
+            if self.path and self._timer is None:
+                self._timer = threading.Timer(self.save_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def stats(self) -> Dict:
+        """Compteurs de succès/échecs du cache"""
+        with self._lock:
+            lookups = self.hits + self.partial_hits + self.misses
+            return {
+                'hits': self.hits,
+                'partial_hits': self.partial_hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'size': len(self._entries)
+            }
+
+@st.cache_resource
+def get_metadata_cache() -> MetadataCache:
+    """Instance partagée du cache de métadonnées"""
+    return MetadataCache()
+
+class TickerService:
+    """Service pour la recherche et validation des tickers"""
+
+    @staticmethod
+    @timed()
+    def search_tickers(query: str, limit: int = 10, wait: Optional[float] = None) -> List[Dict]:
+        """Recherche de tickers avec Yahoo Finance"""
+        return get_ticker_search_service().search(query, limit=limit, wait=wait)
 
     @staticmethod
+    def _yahoo_search(query: str, limit: int = 10, timeout: float = 5) -> List[Dict]:
+        """Recherche via le fournisseur de données (lève une exception en cas d'échec)"""
+        return get_market_data().search(query, limit=limit, timeout=timeout)
+
+    @staticmethod
+    def _pattern_search(query: str, limit: Optional[int] = None) -> List[Dict]:
+        """Recherche par patterns pour les tickers populaires (index local, sans appel réseau)"""
+        return get_ticker_index().search(query, limit=limit)
+
+    @staticmethod
+    def _resolve_cached_metadata(results: List[Dict]) -> List[Dict]:
+        """Complète les résultats affichés avec les métadonnées déjà en cache"""
+        cache = get_metadata_cache()
+        resolved = []
+        for item in results:
+            cached = cache.get(item['symbol']) if item['source'] == 'Pattern' else None
+            if cached:
+                # Copie: les résultats proviennent du cache de recherche partagé entre sessions
+                item = {**item, 'name': cached.get('name', item['name']), 'exchange': cached.get('exchange', item['exchange'])}
+            resolved.append(item)
+        return resolved
+
+    @staticmethod
+    @timed()
     def validate_ticker(symbol: str) -> Dict:
         """Validation d'un ticker avec données financières"""
+        cache = get_metadata_cache()
         try:
-            ticker = yf.Ticker(symbol)
-            info = ticker.info
+            stale = cache.stale_fields(symbol)
+            if not stale:
+                cache.record('hit')
+                return {'valid': True, 'symbol': symbol, **cache.get(symbol)}
+            provider = get_market_data()
+            if stale == ['price']:
+                current_price = provider.last_price(symbol)
+                if current_price:
+                    cache.record('partial')
+                    cache.update(symbol, {'price': float(current_price)})
+                    return {'valid': True, 'symbol': symbol, **cache.get(symbol)}
+            cache.record('miss')
+            info = provider.metadata(symbol)
             current_price = info.get('currentPrice') or info.get('regularMarketPrice')
             if not current_price:
-                hist = ticker.history(period="5d")
-                if not hist.empty:
-                    current_price = hist['Close'].iloc[-1]
+                current_price = provider.last_price(symbol)
             if not current_price:
                 return {'valid': False, 'error': 'Prix indisponible'}
-            return {
-                'valid': True,
-                'symbol': symbol,
+            values = {
                 'name': info.get('shortName', symbol),
                 'price': float(current_price),
                 'currency': info.get('currency', 'USD'),
@@ -747,12 +1896,53 @@ class TickerService:
                 'sector': info.get('sector', 'Unknown'),
                 'industry': info.get('industry', 'Unknown'),
                 'market_cap': info.get('marketCap'),
+                'beta': info.get('beta'),
                 'isin': info.get('isin', 'Unknown'),
                 'type': TickerService._classify_asset_type(info)
             }
+            cache.update(symbol, values)
+            return {'valid': True, 'symbol': symbol, **values}
         except Exception as e:
+            cached = cache.get(symbol)
+            if cached:
+                # Mode dégradé: dernières valeurs connues plutôt qu'un ticker invalide
+                mark_stale('métadonnées', [symbol])
+                return {'valid': True, 'symbol': symbol, 'stale': True, 'price_time': cache.fetched_at(symbol, 'price'), **cached}
             return {'valid': False, 'error': str(e)}
 
+    @staticmethod
+    @timed()
+    def get_last_prices(symbols: List[str], stale_after_days: int = 4, timeout: int = 10) -> Dict:
+        """Récupère en un seul téléchargement groupé les derniers cours d'une liste de symboles"""
+        unique_symbols = list(dict.fromkeys(s.strip() for s in symbols if isinstance(s, str) and s.strip()))
+        report = {'prices': {}, 'dates': {}, 'failed': [], 'stale': []}
+        if not unique_symbols:
+            return report
+        try:
+            closes = get_market_data().quotes(unique_symbols, timeout=timeout)
+        except Exception as e:
+            print(f"Erreur lors de l'actualisation groupée des prix: {e}")
+            mark_stale('cours', unique_symbols)
+            report['failed'] = unique_symbols
+            return report
+        if closes.empty:
+            report['failed'] = unique_symbols
+            return report
+        closes = closes.reindex(columns=unique_symbols)
+        last_dates = closes.apply(pd.Series.last_valid_index)
+        last_prices = closes.ffill().iloc[-1]
+        stale_limit = pd.Timestamp(datetime.now().date() - timedelta(days=stale_after_days))
+        for symbol in unique_symbols:
+            last_date = last_dates.get(symbol)
+            if last_date is None or pd.isna(last_date):
+                report['failed'].append(symbol)
+                continue
+            report['prices'][symbol] = float(last_prices[symbol])
+            report['dates'][symbol] = pd.Timestamp(last_date).date()
+            if pd.Timestamp(last_date).tz_localize(None) < stale_limit:
+                report['stale'].append(symbol)
+        return report
+
     @staticmethod
     def _classify_asset_type(info: Dict) -> str:
         """Classification automatique du type d'actif"""
@@ -783,9 +1973,261 @@ class TickerService:
                 return value
         return 'Stock'
 
+class TickerSearchService:
+    """Recherche de tickers en cache: sources Yahoo et locale en parallèle, réutilisation des préfixes"""
+
+    def __init__(self, ttl: float = 600, maxsize: int = 512, max_workers: int = 4,
+                 remote_timeout: float = 5, fetch_count: int = 10):
+        self.remote_timeout = remote_timeout
+        self.fetch_count = fetch_count
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ticker-search')
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _merge(*sources: List[Dict]) -> List[Dict]:
+        """Fusion dans l'ordre des sources avec déduplication par symbole"""
+        seen = set()
+        merged = []
+        for source in sources:
+            for item in source:
+                if item['symbol'] not in seen:
+                    seen.add(item['symbol'])
+                    merged.append(item)
+        return merged
+
+    def _remote(self, key: str, query: str) -> Future:
+        """Lance (ou réutilise) la recherche Yahoo en cours pour une requête normalisée"""
+        with self._lock:
+            future = self._pending.get(key)
+            if future is not None:
+                return future
+            limit = max(self.fetch_count, 1)
+            future = self._executor.submit(TickerService._yahoo_search, query, limit, self.remote_timeout)
+            self._pending[key] = future
+        # Hors verrou: le callback s'exécute immédiatement (et prend le verrou) si la recherche est déjà terminée
+        future.add_done_callback(lambda f: self._on_remote_done(key, query, f))
+        return future
+
+    def _on_remote_done(self, key: str, query: str, future: Future):
+        with self._lock:
+            self._pending.pop(key, None)
+        if future.cancelled() or future.exception() is not None:
+            return
+        local = TickerService._pattern_search(query, limit=self.fetch_count)
+        self._cache.set(key, self._merge(future.result(), local))
+
+    def _from_prefix(self, key: str) -> List[Dict]:
+        """Filtre les résultats en cache du plus long préfixe déjà recherché"""
+        for end in range(len(key) - 1, 0, -1):
+            cached = self._cache.get(key[:end])
+            if cached is not None:
+                return [
+                    item for item in cached
+                    if key in TickerSearchIndex.normalize(item['name'])
+                    or key in TickerSearchIndex.normalize(item['symbol'])
+                ]
+        return []
+
+    def search(self, query: str, limit: int = 10, wait: Optional[float] = None) -> List[Dict]:
+        """Résultats fusionnés; avec wait, rend la main après ce délai si des résultats locaux existent"""
+        key = TickerSearchIndex.normalize(query)
+        if not key:
+            return []
+        cached = self._cache.get(key)
+        if cached is not None:
+            return TickerService._resolve_cached_metadata(cached[:limit])
+        future = self._remote(key, query)
+        local = TickerService._pattern_search(query, limit=limit)
+        partial = self._merge(self._from_prefix(key), local)
+        timeout = self.remote_timeout if wait is None or not partial else wait
+        try:
+            remote = future.result(timeout=timeout)
+        except FuturesTimeoutError:
+            return TickerService._resolve_cached_metadata(partial[:limit])
+        except Exception as e:
+            st.warning(f"Erreur lors de la recherche Yahoo: {e}")
+            remote = []
+        return TickerService._resolve_cached_metadata(self._merge(remote, local)[:limit])
+
+    def remote_state(self, query: str) -> str:
+        """État de la recherche Yahoo d'une requête: 'done' (en cache), 'pending' ou 'failed'"""
+        key = TickerSearchIndex.normalize(query)
+        if key in self._cache:
+            return 'done'
+        with self._lock:
+            return 'pending' if key in self._pending else 'failed'
+
+    def stats(self) -> Dict:
+        """Compteurs du cache de recherche"""
+        return self._cache.stats()
+
+@st.cache_resource
+def get_ticker_search_service() -> TickerSearchService:
+    """Instance partagée du service de recherche"""
+    return TickerSearchService()
+
+class RateLimiter:
+    """Limiteur de débit partagé entre threads (intervalle minimal entre deux appels)"""
+
+    def __init__(self, rate_per_second: float = 5.0):
+        self.interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+class SymbolResolver:
+    """Résolution dédupliquée et parallèle nom → symbole → métadonnées pour les imports"""
+
+    def __init__(self, max_workers: int = 8, rate_per_second: float = 5.0,
+                 ttl: float = 24 * 3600, maxsize: int = 4096):
+        self.max_workers = max_workers
+        self._limiter = RateLimiter(rate_per_second)
+        self._symbols_by_name = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    @staticmethod
+    def _budget_spent() -> bool:
+        budget = current_fetch_budget()
+        return budget is not None and budget.remaining() <= 0
+
+    def _lookup_name(self, name: str) -> Optional[str]:
+        # Fournisseur interrogé directement: le pool de TickerSearchService (4 threads) plafonnerait
+        # ce pool, et ses avertissements Streamlit n'ont pas de contexte dans ces threads
+        results = []
+        if not self._budget_spent():
+            self._limiter.acquire()
+            try:
+                results = TickerService._yahoo_search(name, limit=1)
+            except Exception as e:
+                print(f"Erreur lors de la recherche Yahoo de {name}: {e}")
+        results = results or TickerService._pattern_search(name, limit=1)
+        return results[0]['symbol'] if results else None
+
+    def _lookup_metadata(self, symbol: str) -> Dict:
+        if get_metadata_cache().stale_fields(symbol, MetadataCache.STATIC_FIELDS) and not self._budget_spent():
+            self._limiter.acquire()
+        return TickerService.validate_ticker(symbol)
+
+    def _parallel(self, func, keys: List[str]) -> Dict:
+        results = {}
+        if not keys:
+            return results
+        func = with_rerun_context(func)
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(keys))) as executor:
+            futures = {executor.submit(func, key): key for key in keys}
+            for future in as_completed(futures):
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as e:
+                    print(f"Erreur lors de la résolution de {futures[future]}: {e}")
+        return results
+
+    def resolve_names(self, names: List[str]) -> Dict[str, str]:
+        """Symbole trouvé pour chaque nom distinct (les noms sans résultat sont absents)"""
+        resolved = {}
+        to_lookup = []
+        for name in dict.fromkeys(names):
+            symbol = self._symbols_by_name.get(TickerSearchIndex.normalize(name))
+            if symbol is not None:
+                resolved[name] = symbol
+            else:
+                to_lookup.append(name)
+        for name, symbol in self._parallel(self._lookup_name, to_lookup).items():
+            if symbol:
+                self._symbols_by_name.set(TickerSearchIndex.normalize(name), symbol)
+                resolved[name] = symbol
+        return resolved
+
+    def resolve_metadata(self, symbols: List[str]) -> pd.DataFrame:
+        """Métadonnées des symboles valides, indexées par symbole"""
+        metadata = self._parallel(self._lookup_metadata, list(dict.fromkeys(symbols)))
+        valid = {symbol: data for symbol, data in metadata.items() if data.get('valid')}
+        columns = ['sector', 'industry', 'type', 'exchange']
+        if not valid:
+            return pd.DataFrame(columns=columns)
+        return pd.DataFrame.from_dict(valid, orient='index').reindex(columns=columns)
+
+@st.cache_resource
+def get_symbol_resolver() -> SymbolResolver:
+    """Instance partagée du résolveur de symboles (cache nom → symbole)"""
+    return SymbolResolver()
+
+SUFFIX_TO_REGION = {
+    '.US': 'USA',
+    '.PA': 'France',
+    '.L': 'UK',
+    '.DE': 'Germany',
+    '.MI': 'Italy',
+    '.AS': 'Netherlands',
+    '.SW': 'Switzerland',
+    '.MC': 'Spain',
+    '.BR': 'Belgium',
+    '.VI': 'Austria',
+    '.HE': 'Finland',
+    '.ST': 'Sweden',
+    '.OL': 'Norway',
+    '.CO': 'Denmark',
+    '.T': 'Japan',
+    '.HK': 'Hong Kong',
+    '.SS': 'China',
+    '.SZ': 'China',
+    '.KS': 'South Korea',
+    '.SI': 'Singapore',
+    '.AX': 'Australia',
+    '.NZ': 'New Zealand',
+    '.TO': 'Canada',
+    '.V': 'Canada',
+    '.SA': 'Brazil',
+    '.MX': 'Mexico',
+    '.JO': 'South Africa',
+    '.TA': 'Israel',
+}
+
+CRYPTO_SYMBOL_PATTERN = 'BTC|ETH|ADA|DOT'
+
+@st.cache_resource
+def get_region_cache() -> Dict[str, str]:
+    """Régions déjà calculées, par symbole"""
+    return {}
+
 class DiversificationAnalyzer:
     """Analyseur de diversification"""
 
+    REGION_CACHE_LIMIT = 200_000
+
+    @staticmethod
+    def _classify_unique_regions(symbols: pd.Series) -> pd.Series:
+        """Classification vectorisée: suffixe de place, puis crypto, puis USA par défaut"""
+        upper = symbols.astype(str).str.upper()
+        regions = upper.str.extract(r'(\.[^.]+)$', expand=False).map(SUFFIX_TO_REGION)
+        crypto = upper.str.contains(CRYPTO_SYMBOL_PATTERN, regex=True)
+        usa = (upper.str.len() <= 5) & ~upper.str.contains('.', regex=False)
+        fallback = pd.Series(np.select([crypto, usa], ['Cryptocurrency', 'USA'], 'Other'), index=symbols.index)
+        regions = regions.fillna(fallback)
+        regions[upper == ''] = 'Unknown'
+        return regions
+
+    @staticmethod
+    def classify_regions(symbols: pd.Series) -> pd.Series:
+        """Région de chaque symbole, calculée une seule fois par symbole distinct"""
+        cache = get_region_cache()
+        unique_symbols = pd.Series(pd.unique(symbols.dropna()), dtype=object)
+        new_symbols = unique_symbols[~unique_symbols.isin(cache.keys())]
+        if not new_symbols.empty:
+            if len(cache) + len(new_symbols) > DiversificationAnalyzer.REGION_CACHE_LIMIT:
+                cache.clear()
+            regions = DiversificationAnalyzer._classify_unique_regions(new_symbols)
+            cache.update(zip(new_symbols, regions))
+        return symbols.map(cache).fillna('Unknown')
+
     @staticmethod
     def calculate_concentration_metrics(df: pd.DataFrame) -> Dict:
         """Calcule les métriques de concentration"""
@@ -829,7 +2271,7 @@ class DiversificationAnalyzer:
         """Analyse la diversification sectorielle"""
         if 'sector' not in df.columns or 'weight' not in df.columns:
             return pd.DataFrame()
-        sector_analysis = df.groupby('sector').agg({
+        sector_analysis = df.groupby('sector', observed=True).agg({
             'weight': 'sum',
             'amount': 'sum',
             'perf': 'mean',
@@ -844,55 +2286,8 @@ class DiversificationAnalyzer:
         """Analyse la diversification géographique"""
         if 'symbol' not in df.columns or 'weight' not in df.columns:
             return pd.DataFrame()
-        symbol_to_region = {
-            '': 'USA',
-            '.US': 'USA',
-            '.PA': 'France',
-            '.L': 'UK',
-            '.DE': 'Germany',
-            '.MI': 'Italy',
-            '.AS': 'Netherlands',
-            '.SW': 'Switzerland',
-            '.MC': 'Spain',
-            '.BR': 'Belgium',
-            '.VI': 'Austria',
-            '.HE': 'Finland',
-            '.ST': 'Sweden',
-            '.OL': 'Norway',
-            '.CO': 'Denmark',
-            '.T': 'Japan',
-            '.HK': 'Hong Kong',
-            '.SS': 'China',
-            '.SZ': 'China',
-            '.KS': 'South Korea',
-            '.SI': 'Singapore',
-            '.AX': 'Australia',
-            '.NZ': 'New Zealand',
-            '.TO': 'Canada',
-            '.V': 'Canada',
-            '.SA': 'Brazil',
-            '.MX': 'Mexico',
-            '.JO': 'South Africa',
-            '.TA': 'Israel',
-        }
-        def get_region_from_symbol(symbol):
-            if pd.isna(symbol) or symbol == '':
-                return 'Unknown'
-            symbol = str(symbol).upper()
-            for suffix, region in symbol_to_region.items():
-                if suffix == '':
-                    continue
-                elif symbol.endswith(suffix):
-                    return region
-            if any(pattern in symbol for pattern in ['BTC', 'ETH', 'ADA', 'DOT']):
-                return 'Cryptocurrency'
-            elif len(symbol) <= 5 and '.' not in symbol:
-                return 'USA'
-            else:
-                return 'Other'
-        df_copy = df.copy()
-        df_copy['region'] = df_copy['symbol'].apply(get_region_from_symbol)
-        geo_analysis = df_copy.groupby('region').agg({
+        regions = DiversificationAnalyzer.classify_regions(df['symbol']).rename('region')
+        geo_analysis = df.groupby(regions).agg({
             'weight': 'sum',
             'amount': 'sum',
             'perf': 'mean',
@@ -902,12 +2297,381 @@ class DiversificationAnalyzer:
         geo_analysis['Weight_Pct'] = geo_analysis['Weight'] * 100
         return geo_analysis.sort_values('Weight', ascending=False)
 
+class AnalyticsCache:
+    """Cache LRU des analyses, indexé par empreinte du contenu du portefeuille et borné en mémoire"""
+
+    def __init__(self, max_bytes: int = 64 * 1024 ** 2, maxsize: int = 256):
+        self.max_bytes = max_bytes
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[Tuple[str, str], Tuple[object, int]]' = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(df: pd.DataFrame, columns: List[str]) -> str:
+        """Empreinte du contenu des colonnes utiles (indépendante de l'index)"""
+        present = [col for col in columns if col in df.columns]
+        digest = hashlib.sha1(repr((present, len(df))).encode())
+        if present and len(df):
+            digest.update(pd.util.hash_pandas_object(df[present], index=False).to_numpy().tobytes())
+        return digest.hexdigest()
+
+    @staticmethod
+    def _sizeof(value) -> int:
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            return int(value.memory_usage(deep=True).sum()) if isinstance(value, pd.DataFrame) else int(value.memory_usage(deep=True))
+        if isinstance(value, np.ndarray):
+            return int(value.nbytes)
+        if isinstance(value, go.Figure):
+            return AnalyticsCache._sizeof(value.to_plotly_json())
+        if isinstance(value, dict):
+            return sys.getsizeof(value) + sum(AnalyticsCache._sizeof(v) for v in value.values())
+        if isinstance(value, (list, tuple)):
+            return sys.getsizeof(value) + sum(AnalyticsCache._sizeof(v) for v in value)
+        return sys.getsizeof(value)
+
+    def get_or_compute(self, name: str, df: pd.DataFrame, columns: List[str], compute):
+        """Résultat en cache pour cet état du portefeuille, sinon calculé une seule fois"""
+        key = (name, self.fingerprint(df, columns))
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+        value = compute()
+        size = self._sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._total_bytes += size
+            while self._entries and (self._total_bytes > self.max_bytes or len(self._entries) > self.maxsize):
+                if len(self._entries) == 1 and next(iter(self._entries)) == key:
+                    break
+                self._total_bytes -= self._entries.popitem(last=False)[1][1]
+        return value
+
+    def stats(self) -> Dict:
+        """Compteurs et occupation mémoire du cache"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'bytes': self._total_bytes
+            }
+
+@st.cache_resource
+def get_analytics_cache() -> AnalyticsCache:
+    """Instance partagée du cache d'analyses"""
+    return AnalyticsCache()
+
+def cached_figure(name: str, df: pd.DataFrame, columns: List[str], build: Callable[[], go.Figure]) -> go.Figure:
+    """Figure Plotly construite une seule fois par état des colonnes qu'elle représente"""
+    return get_analytics_cache().get_or_compute(f"figure:{name}", df, columns, build)
+
+DIVERSIFICATION_COLUMNS = ['name', 'symbol', 'sector', 'weight', 'amount', 'perf']
+
+@timed()
+def get_diversification_analytics(df: pd.DataFrame) -> Tuple[Dict, pd.DataFrame, pd.DataFrame]:
+    """Concentration, répartition sectorielle et géographique, calculées une fois par état du portefeuille"""
+    return get_analytics_cache().get_or_compute(
+        'diversification',
+        df,
+        DIVERSIFICATION_COLUMNS,
+        lambda: (
+            DiversificationAnalyzer.calculate_concentration_metrics(df),
+            DiversificationAnalyzer.analyze_sector_diversification(df),
+            DiversificationAnalyzer.analyze_geographic_diversification(df)
+        )
+    )
+
+class LotLedger:
+    """Journal des lots ajoutés au portefeuille, en tampons colonnes préalloués et extensibles.
+
+    Les ajouts, unitaires ou en masse, s'écrivent dans les tampons sans copier le portefeuille.
+    materialize() convertit les lots en attente puis vide les tampons, pour ne pas dupliquer
+    en session les lots déjà reportés dans portfolio_df.
+    """
+
+    COLUMNS = ['name', 'symbol', 'isin', 'purchase_date', 'quantity', 'buyingPrice', 'lastPrice', 'currency',
+               'exchange', 'sector', 'industry', 'asset_type', 'intradayVariation', 'amount', 'amountVariation',
+               'variation']
+    NUMERIC_COLUMNS = ['quantity', 'buyingPrice', 'lastPrice', 'intradayVariation']
+    TEXT_DEFAULTS = {
+        'name': None,
+        'symbol': None,
+        'isin': 'Unknown',
+        'currency': 'USD',
+        'exchange': 'Unknown',
+        'sector': 'Unknown',
+        'industry': 'Unknown',
+        'asset_type': 'Stock'
+    }
+
+    def __init__(self, capacity: int = 1024):
+        self._capacity = capacity
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int):
+        self._size = 0
+        self._numeric = {col: np.empty(capacity) for col in self.NUMERIC_COLUMNS}
+        self._text = {col: np.empty(capacity, dtype=object) for col in self.TEXT_DEFAULTS}
+        self._dates = np.empty(capacity, dtype='datetime64[ns]')
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        """Taille des tampons (références pour les colonnes texte)"""
+        buffers = [*self._numeric.values(), *self._text.values(), self._dates]
+        return sum(buffer.nbytes for buffer in buffers)
+
+    @property
+    def pending(self) -> int:
+        """Nombre de lots pas encore matérialisés"""
+        return self._size
+
+    def _reserve(self, count: int):
+        needed = self._size + count
+        capacity = len(self._dates)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for buffers in (self._numeric, self._text):
+            for col, buffer in buffers.items():
+                grown = np.empty(capacity, dtype=buffer.dtype)
+                grown[:self._size] = buffer[:self._size]
+                buffers[col] = grown
+        dates = np.empty(capacity, dtype=self._dates.dtype)
+        dates[:self._size] = self._dates[:self._size]
+        self._dates = dates
+
+    def extend(self, lots) -> int:
+        """Ajoute des lots (DataFrame ou dictionnaire de colonnes); symbol, quantity et buyingPrice sont requis.
+
+        Par défaut lastPrice vaut buyingPrice, name vaut symbol et purchase_date la date du jour.
+        """
+        lots = pd.DataFrame(lots)
+        count = len(lots)
+        if count == 0:
+            return 0
+        missing = [col for col in ('symbol', 'quantity', 'buyingPrice') if col not in lots.columns]
+        if missing:
+            raise ValueError(f"Colonnes manquantes: {missing}")
+        self._reserve(count)
+        window = slice(self._size, self._size + count)
+        buying_price = pd.to_numeric(lots['buyingPrice'], errors='coerce').to_numpy(dtype=float)
+        defaults = {'buyingPrice': buying_price, 'lastPrice': buying_price, 'intradayVariation': 0.0}
+        for col in self.NUMERIC_COLUMNS:
+            if col in lots.columns:
+                self._numeric[col][window] = pd.to_numeric(lots[col], errors='coerce').to_numpy(dtype=float)
+            else:
+                self._numeric[col][window] = defaults[col]
+        for col, default in self.TEXT_DEFAULTS.items():
+            source = col if col in lots.columns else ('symbol' if col == 'name' else None)
+            self._text[col][window] = lots[source].to_numpy(dtype=object) if source else default
+        if 'purchase_date' in lots.columns:
+            dates = pd.to_datetime(lots['purchase_date'], errors='coerce')
+            self._dates[window] = dates.fillna(pd.Timestamp.now().normalize()).to_numpy(dtype='datetime64[ns]')
+        else:
+            self._dates[window] = pd.Timestamp.now().normalize().to_datetime64()
+        self._size += count
+        return count
+
+    def append(self, lot: Dict) -> int:
+        """Ajoute un lot (mêmes colonnes et valeurs par défaut que extend)"""
+        self._reserve(1)
+        position = self._size
+        buying_price = float(lot['buyingPrice'])
+        defaults = {'quantity': lot['quantity'], 'lastPrice': buying_price, 'intradayVariation': 0.0}
+        for col in self.NUMERIC_COLUMNS:
+            self._numeric[col][position] = float(lot.get(col, defaults.get(col, buying_price)))
+        for col, default in self.TEXT_DEFAULTS.items():
+            self._text[col][position] = lot.get(col, lot['symbol'] if col == 'name' else default)
+        purchase_date = pd.to_datetime(lot.get('purchase_date'), errors='coerce')
+        self._dates[position] = (purchase_date if pd.notna(purchase_date) else pd.Timestamp.now().normalize()).to_datetime64()
+        self._size += 1
+        return 1
+
+    def materialize(self) -> pd.DataFrame:
+        """Lots non encore matérialisés, avec les colonnes dérivées (montant, plus-value, variation)"""
+        window = slice(0, self._size)
+        quantity = self._numeric['quantity'][window]
+        buying_price = self._numeric['buyingPrice'][window]
+        last_price = self._numeric['lastPrice'][window]
+        with np.errstate(all='ignore'):
+            variation = np.where(buying_price > 0, (last_price - buying_price) / buying_price * 100, 0.0)
+        columns = {col: buffer[window] for col, buffer in self._text.items()}
+        columns.update({col: buffer[window].copy() for col, buffer in self._numeric.items()})
+        columns.update({
+            'purchase_date': self._dates[window].copy(),
+            'amount': quantity * last_price,
+            'amountVariation': quantity * (last_price - buying_price),
+            'variation': variation
+        })
+        new_lots = pd.DataFrame(columns, columns=self.COLUMNS)
+        if len(self._dates) > self._capacity:
+            self._allocate(self._capacity)
+        else:
+            self._size = 0
+        return new_lots
+
+PORTFOLIO_CATEGORY_COLUMNS = ['isin', 'currency', 'exchange', 'sector', 'industry', 'asset_type']
+PORTFOLIO_DERIVED_COLUMNS = ['intradayVariation', 'amountVariation', 'variation', 'weight', 'weight_pct', 'perf',
+                             'annualized_return']
+PORTFOLIO_FLOAT32 = os.environ.get('PORTFOLIO_FLOAT32', '0') == '1'
+
+def compact_portfolio_frame(df: pd.DataFrame, float32: bool = PORTFOLIO_FLOAT32) -> pd.DataFrame:
+    """Schéma compact du portefeuille: catégories pour les champs peu variés, dates datetime64,
+    métriques dérivées en float32 si demandé; la colonne Tickers (copie de symbol) est supprimée"""
+    if 'Tickers' in df.columns:
+        df = df.drop(columns='Tickers')
+    conversions = {
+        col: 'category' for col in PORTFOLIO_CATEGORY_COLUMNS
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype)
+    }
+    if float32:
+        conversions.update({
+            col: 'float32' for col in PORTFOLIO_DERIVED_COLUMNS
+            if col in df.columns and df[col].dtype == np.float64
+        })
+        if 'days_held' in df.columns and df['days_held'].dtype != np.int32:
+            conversions['days_held'] = 'int32'
+    if conversions:
+        df = df.astype(conversions)
+    if 'purchase_date' in df.columns and not pd.api.types.is_datetime64_any_dtype(df['purchase_date']):
+        df['purchase_date'] = pd.to_datetime(df['purchase_date'], errors='coerce')
+    return df
+
+def _deep_sizeof(value, seen: Optional[set] = None) -> int:
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(value.memory_usage(deep=True).sum()) if isinstance(value, pd.DataFrame) else int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, LotLedger):
+        return value.nbytes
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(_deep_sizeof(item, seen) for item in value)
+    return size
+
+def session_memory_report() -> pd.DataFrame:
+    """Empreinte mémoire approximative de chaque objet de la session"""
+    rows = [{'Objet': str(key), 'Octets': _deep_sizeof(st.session_state[key])} for key in st.session_state]
+    report = pd.DataFrame(rows, columns=['Objet', 'Octets'])
+    return report.sort_values('Octets', ascending=False, ignore_index=True)
+
+def display_session_memory():
+    """Rapport mémoire de la session dans la barre latérale"""
+    with st.expander("🧠 Mémoire de la session"):
+        report = session_memory_report()
+        st.metric("Total", f"{report['Octets'].sum() / 1024 ** 2:.3f} Mo")
+        st.dataframe(
+            report.assign(Mo=report['Octets'] / 1024 ** 2)[['Objet', 'Mo']].style.format({'Mo': '{:.3f}'}),
+            use_container_width=True,
+            hide_index=True
+        )
+        df = st.session_state.get('portfolio_df')
+        if isinstance(df, pd.DataFrame) and not df.empty:
+            columns = df.memory_usage(deep=True, index=False)
+            st.caption("Portefeuille par colonne (Ko)")
+            st.dataframe(
+                pd.DataFrame({'Colonne': columns.index, 'Type': df.dtypes.astype(str).to_numpy(), 'Ko': columns.to_numpy() / 1024})
+                .sort_values('Ko', ascending=False).style.format({'Ko': '{:.1f}'}),
+                use_container_width=True,
+                hide_index=True
+            )
+
+def display_instrumentation(trace: 'RerunTrace'):
+    """Durées et appels réseau du rerun dans la barre latérale, capture cProfile à la demande"""
+    with st.expander("⏱️ Performances du rerun"):
+        col1, col2 = st.columns(2)
+        col1.metric("Durée", f"{trace.duration * 1000:,.0f} ms")
+        col2.metric("Appels réseau", trace.network_calls())
+        spans = trace.aggregate()
+        if spans:
+            st.dataframe(
+                pd.DataFrame(spans).rename(columns={'name': 'Span', 'calls': 'Appels', 'total_ms': 'Total (ms)',
+                                                    'max_ms': 'Max (ms)', 'network': 'Réseau'})
+                .style.format({'Total (ms)': '{:,.1f}', 'Max (ms)': '{:,.1f}'}),
+                use_container_width=True,
+                hide_index=True
+            )
+        if trace.network:
+            st.caption("Appels réseau: " + ", ".join(f"{kind} ×{count}" for kind, count in sorted(trace.network.items())))
+        if trace.dropped:
+            st.caption(f"{trace.dropped} spans au-delà de {trace.MAX_SPANS} non détaillés")
+        st.button("🔬 Profiler le prochain rerun", on_click=st.session_state.update,
+                  kwargs={'profile_next_rerun': True}, help="Capture cProfile du rerun déclenché par ce bouton")
+        profile = st.session_state.get('last_profile')
+        if profile:
+            st.caption(f"Profil cProfile du rerun de {profile['timestamp']:%H:%M:%S} (tri par temps cumulé)")
+            st.code(profile['text'], language=None)
+            st.download_button("📥 Télécharger le profil (.prof)", profile['data'],
+                               file_name=f"rerun_{profile['timestamp']:%Y%m%d_%H%M%S}.prof",
+                               mime="application/octet-stream")
+        if TIMING_LOG_PATH:
+            st.caption(f"Journal JSON lines: {TIMING_LOG_PATH}")
+
+def display_degraded_mode(placeholder, budget: 'FetchBudget'):
+    """Signale les données servies depuis le cache pendant ce rerun (budget épuisé, délais, disjoncteurs)"""
+    open_circuits = getattr(get_market_data(), 'open_circuits', list)()
+    if not budget.degraded and not budget.exhausted and not open_circuits:
+        return
+    details = [f"{kind}: {', '.join(sorted(symbols)[:10])}{'…' if len(symbols) > 10 else ''}"
+               for kind, symbols in sorted(budget.degraded.items())]
+    message = "⚠️ Mode dégradé: Yahoo Finance lent ou indisponible, certaines valeurs proviennent du cache et peuvent être obsolètes."
+    if budget.exhausted:
+        message += f" Budget réseau de {budget.seconds:.0f}s épuisé pour cet affichage."
+    if details:
+        message += "\n\n" + "  \n".join(details)
+    if open_circuits:
+        message += "\n\nDisjoncteurs ouverts: " + ", ".join(open_circuits)
+    placeholder.warning(message)
+
 class PortfolioManager:
     """Gestionnaire de portefeuille"""
 
     def __init__(self):
         if 'portfolio_df' not in st.session_state:
             st.session_state.portfolio_df = pd.DataFrame()
+        if 'lot_ledger' not in st.session_state:
+            st.session_state.lot_ledger = LotLedger()
+        self.flush_lots()
+
+    def flush_lots(self):
+        """Reporte dans portfolio_df, en une seule concaténation, les lots ajoutés depuis le dernier report"""
+        ledger = st.session_state.lot_ledger
+        if ledger.pending == 0:
+            return
+        new_lots = ledger.materialize()
+        if st.session_state.portfolio_df.empty:
+            st.session_state.portfolio_df = compact_portfolio_frame(new_lots)
+        else:
+            st.session_state.portfolio_df = compact_portfolio_frame(
+                pd.concat([st.session_state.portfolio_df, new_lots], ignore_index=True)
+            )
+
+    def replace_portfolio(self, df: pd.DataFrame):
+        """Remplace le portefeuille (import) et abandonne les lots en attente"""
+        st.session_state.lot_ledger = LotLedger()
+        st.session_state.portfolio_df = compact_portfolio_frame(df)
+
+    def add_lots(self, lots) -> int:
+        """Ajout en masse de lots (DataFrame ou dictionnaire de colonnes), reportés au prochain flush_lots"""
+        return st.session_state.lot_ledger.extend(lots)
 
     @staticmethod
     def calculate_annualized_return(initial_value: float, final_value: float, days_held: int) -> float:
@@ -925,6 +2689,20 @@ class PortfolioManager:
             annualized_return = total_return
         return annualized_return * 100
 
+    @staticmethod
+    def calculate_annualized_returns(initial_values, final_values, days_held) -> np.ndarray:
+        """Version vectorisée de calculate_annualized_return (mêmes cas limites)"""
+        initial = np.asarray(initial_values, dtype=float)
+        final = np.asarray(final_values, dtype=float)
+        days = np.asarray(days_held, dtype=float)
+        with np.errstate(all='ignore'):
+            total_return = (final / initial) - 1
+            years_held = days / 365.25
+            annualized = np.power(1 + total_return, 1 / years_held) - 1
+        annualized = np.where(np.isfinite(annualized), annualized, total_return)
+        annualized = np.where((initial <= 0) | (days <= 0), 0.0, annualized)
+        return annualized * 100
+
     def add_stock_to_portfolio(self, ticker_data: Dict, quantity: int, buying_price: float = None, purchase_date=None):
         """Ajoute une action au portefeuille"""
         purchase_price = buying_price if buying_price is not None else ticker_data['price']
@@ -935,36 +2713,26 @@ class PortfolioManager:
                 purchase_date = datetime.strptime(purchase_date, '%Y-%m-%d').date()
             except ValueError:
                 purchase_date = datetime.now().date()
-        new_row = {
+        st.session_state.lot_ledger.append({
             'name': ticker_data['name'],
             'symbol': ticker_data['symbol'],
             'isin': ticker_data.get('isin', 'Unknown'),
-            "purchase_date": purchase_date,
+            'purchase_date': purchase_date,
             'quantity': quantity,
             'buyingPrice': purchase_price,
             'lastPrice': ticker_data['price'],
             'currency': ticker_data.get('currency', 'USD'),
             'exchange': ticker_data.get('exchange', 'Unknown'),
-            'sector': ticker_data.get('sector', 'Unknown'),
-            'industry': ticker_data.get('industry', 'Unknown'),
-            'asset_type': ticker_data.get('type', 'Stock'),
-            'intradayVariation': 0.0,
-            'amount': quantity * ticker_data['price'],
-            'amountVariation': quantity * (ticker_data['price'] - purchase_price),
-            'variation': ((ticker_data['price'] - purchase_price) / purchase_price * 100) if purchase_price > 0 else 0.0,
-            'Tickers': ticker_data['symbol']
-        }
-        if st.session_state.portfolio_df.empty:
-            st.session_state.portfolio_df = pd.DataFrame([new_row])
-        else:
-            st.session_state.portfolio_df = pd.concat([
-                st.session_state.portfolio_df,
-                pd.DataFrame([new_row])
-            ], ignore_index=True)
+            'sector': ticker_data.get('sector', 'Unknown'),
+            'industry': ticker_data.get('industry', 'Unknown'),
+            'asset_type': ticker_data.get('type', 'Stock')
+        })
         return True
 
+    @timed()
     def update_portfolio_metrics(self):
         """Met à jour toutes les métriques du portefeuille"""
+        self.flush_lots()
         if st.session_state.portfolio_df.empty:
             return {
                 'total_value': 0,
@@ -972,47 +2740,22 @@ class PortfolioManager:
                 'annualized_return': 0,
                 'weighted_annualized_return': 0
             }
-        df = st.session_state.portfolio_df.copy()
-        current_date = datetime.now().date()
-        total_value = df['amount'].sum()
-        if total_value > 0:
-            df['weight'] = df['amount'] / total_value
-            df['weight_pct'] = df['weight'] * 100
-        else:
-            df['weight'] = 0
-            df['weight_pct'] = 0
-        df['perf'] = ((df['lastPrice'] - df['buyingPrice']) / df['buyingPrice'] * 100).fillna(0)
-        df['days_held'] = df['purchase_date'].apply(
-            lambda x: max(1, (current_date - x).days) if pd.notna(x) else 1
-        )
-        annualized_returns = []
-        for _, row in df.iterrows():
-            initial_val = row['buyingPrice'] * row['quantity']
-            final_val = row['lastPrice'] * row['quantity']
-            days = row['days_held']
-            ann_return = self.calculate_annualized_return(initial_val, final_val, days)
-            annualized_returns.append(ann_return)
-        df['annualized_return'] = annualized_returns
-        portfolio_perf = (df['weight'] * df['perf']).sum()
-        weighted_annualized_return = (df['weight'] * df['annualized_return']).sum()
-        total_initial_value = (df['buyingPrice'] * df['quantity']).sum()
-        total_current_value = (df['lastPrice'] * df['quantity']).sum()
-        weighted_days_held = (df['weight'] * df['days_held']).sum()
-        portfolio_annualized_return = self.calculate_annualized_return(
-            total_initial_value,
-            total_current_value,
-            max(1, int(weighted_days_held))
-        )
+        df, metrics = compute_portfolio_metrics(st.session_state.portfolio_df)
         st.session_state.portfolio_df = df
-        return {
-            'total_value': total_value,
-            'portfolio_performance': portfolio_perf,
-            'annualized_return': portfolio_annualized_return,
-            'weighted_annualized_return': weighted_annualized_return,
-            'total_initial_value': total_initial_value,
-            'total_current_value': total_current_value,
-            'weighted_days_held': weighted_days_held
-        }
+        return metrics
+
+    @timed()
+    def refresh_prices(self) -> Dict:
+        """Actualise en bloc les derniers prix de toutes les positions"""
+        self.flush_lots()
+        df = st.session_state.portfolio_df
+        if df.empty or 'symbol' not in df.columns:
+            return {'updated': 0, 'failed': [], 'stale': []}
+        report = TickerService.get_last_prices(df['symbol'].tolist())
+        updated = apply_last_prices(df, report['prices'])
+        if updated:
+            st.session_state.portfolio_df = df
+        return {'updated': updated, 'failed': report['failed'], 'stale': report['stale']}
 
     def get_portfolio_annualized_metrics(self) -> Dict:
         """Retourne les métriques annualisées détaillées du portefeuille"""
@@ -1020,9 +2763,10 @@ class PortfolioManager:
         df = st.session_state.portfolio_df
         if df.empty:
             return metrics
-        current_date = datetime.now().date()
-        min_purchase_date = df['purchase_date'].min()
-        max_purchase_date = df['purchase_date'].max()
+        current_date = pd.Timestamp.now().normalize()
+        purchase_dates = pd.to_datetime(df['purchase_date'], errors='coerce') if 'purchase_date' in df.columns else pd.Series(pd.NaT)
+        min_purchase_date = purchase_dates.min()
+        max_purchase_date = purchase_dates.max()
         portfolio_age_days = (current_date - min_purchase_date).days if pd.notna(min_purchase_date) else 0
         portfolio_age_years = portfolio_age_days / 365.25
         if len(df) > 1:
@@ -1080,8 +2824,8 @@ class PortfolioManager:
             st.write(f"**Volatilité estimée:** {metrics['portfolio_volatility']:.2f}%")
             st.write(f"**Rendement excédentaire:** {metrics['excess_return']:.2f}%")
         with col2:
-            st.write(f"**Première acquisition:** {metrics['min_purchase_date']}")
-            st.write(f"**Dernière acquisition:** {metrics['max_purchase_date']}")
+            st.write(f"**Première acquisition:** {metrics['min_purchase_date']:%Y-%m-%d}" if pd.notna(metrics['min_purchase_date']) else "**Première acquisition:** -")
+            st.write(f"**Dernière acquisition:** {metrics['max_purchase_date']:%Y-%m-%d}" if pd.notna(metrics['max_purchase_date']) else "**Dernière acquisition:** -")
             st.write(f"**Taux sans risque:** {metrics['risk_free_rate']:.1f}%")
         if not st.session_state.portfolio_df.empty:
             st.subheader("Détail par position")
@@ -1100,6 +2844,63 @@ class PortfolioManager:
             display_df['Poids (%)'] = display_df['Poids (%)'].apply(lambda x: f"{x:.1f}%")
             st.dataframe(display_df, use_container_width=True)
 
+def apply_last_prices(df: pd.DataFrame, prices: Dict[str, float]) -> int:
+    """Reporte les derniers prix (symbole -> prix) sur les positions et recalcule les montants"""
+    new_prices = df['symbol'].map(prices)
+    mask = new_prices.notna()
+    if mask.any():
+        df.loc[mask, 'lastPrice'] = new_prices[mask]
+        if 'quantity' in df.columns:
+            df.loc[mask, 'amount'] = df.loc[mask, 'quantity'] * new_prices[mask]
+    return int(mask.sum())
+
+@timed()
+def compute_portfolio_metrics(df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict]:
+    """Colonnes dérivées (poids, performance, rendement annualisé) et métriques globales, hors session Streamlit"""
+    current_date = pd.Timestamp(datetime.now().date())
+    amount = df['amount'].to_numpy(dtype=float)
+    total_value = np.nansum(amount)
+    if total_value > 0:
+        weight = amount / total_value
+    else:
+        weight = np.zeros(len(df))
+    df['weight'] = weight
+    df['weight_pct'] = weight * 100
+    buying_price = df['buyingPrice'].to_numpy(dtype=float)
+    last_price = df['lastPrice'].to_numpy(dtype=float)
+    quantity = df['quantity'].to_numpy(dtype=float)
+    with np.errstate(all='ignore'):
+        perf = (last_price - buying_price) / buying_price * 100
+    df['perf'] = np.where(np.isnan(perf), 0.0, perf)
+    if 'purchase_date' in df.columns:
+        purchase_dates = pd.to_datetime(df['purchase_date'], errors='coerce')
+        days_held = (current_date - purchase_dates).dt.days.clip(lower=1).fillna(1).astype(int)
+    else:
+        days_held = pd.Series(1, index=df.index)
+    df['days_held'] = days_held
+    initial_values = buying_price * quantity
+    final_values = last_price * quantity
+    df['annualized_return'] = PortfolioManager.calculate_annualized_returns(initial_values, final_values, days_held)
+    portfolio_perf = np.nansum(weight * df['perf'].to_numpy())
+    weighted_annualized_return = np.nansum(weight * df['annualized_return'].to_numpy())
+    total_initial_value = np.nansum(initial_values)
+    total_current_value = np.nansum(final_values)
+    weighted_days_held = np.nansum(weight * days_held.to_numpy())
+    portfolio_annualized_return = PortfolioManager.calculate_annualized_return(
+        total_initial_value,
+        total_current_value,
+        max(1, int(weighted_days_held))
+    )
+    return compact_portfolio_frame(df), {
+        'total_value': total_value,
+        'portfolio_performance': portfolio_perf,
+        'annualized_return': portfolio_annualized_return,
+        'weighted_annualized_return': weighted_annualized_return,
+        'total_initial_value': total_initial_value,
+        'total_current_value': total_current_value,
+        'weighted_days_held': weighted_days_held
+    }
+
 def generate_recommendations(df: pd.DataFrame, concentration: Dict,
                            sector_analysis: pd.DataFrame, geo_analysis: pd.DataFrame):
     """Génère des recommandations personnalisées"""
@@ -1200,23 +3001,224 @@ def generate_recommendations(df: pd.DataFrame, concentration: Dict,
     else:
         st.info("Aucune recommandation spécifique pour le moment.")
 
+IMPORT_COLUMN_MAPPING = {
+    'name': ['name', 'nom', 'title', 'security', 'instrument'],
+    'quantity': ['quantity', 'qty', 'quantite', 'shares', 'units'],
+    'purchase_date': ['purchase_date', 'date'],
+    'buyingPrice': ['buyingPrice', 'prix_achat', 'purchase_price', 'cost'],
+    'lastPrice': ['lastPrice', 'prix_actuel', 'current_price', 'market_price'],
+    'isin': ['isin', 'ISIN'],
+    'symbol': ['symbol', 'ticker', 'symbole']
+}
+
+IMPORT_PASSTHROUGH_COLUMNS = ['currency', 'exchange', 'sector', 'industry', 'asset_type']
+
+def resolve_column_mapping(columns) -> Dict[str, str]:
+    """Associe les colonnes d'un fichier aux colonnes standard (première colonne reconnue pour chacune)"""
+    lookup = {}
+    for standard_col, possible_names in IMPORT_COLUMN_MAPPING.items():
+        for name in possible_names:
+            lookup.setdefault(name.lower(), standard_col)
+    for col in IMPORT_PASSTHROUGH_COLUMNS:
+        lookup.setdefault(col.lower(), col)
+    mapping = {}
+    for col in columns:
+        standard_col = lookup.get(str(col).strip().lower())
+        if standard_col and standard_col not in mapping.values():
+            mapping[col] = standard_col
+    return mapping
+
+class PortfolioImporter:
+    """Import par blocs des fichiers CSV/Excel/JSON, les lots étant agrégés en positions au fil de la lecture.
+
+    La correspondance des colonnes est résolue une fois sur l'en-tête et seules les colonnes reconnues
+    sont lues. Les lots d'un même titre achetés le même jour sont regroupés (quantités sommées,
+    prix d'achat moyen pondéré), la mémoire dépend donc du nombre de positions et non de la taille du fichier.
+    """
+
+    NUMERIC_COLUMNS = ['quantity', 'buyingPrice', 'lastPrice']
+    TEXT_COLUMNS = ['name', 'symbol', 'isin'] + IMPORT_PASSTHROUGH_COLUMNS
+
+    def __init__(self, chunk_size: int = 50_000, progress_callback: Optional[Callable[[float, str], None]] = None):
+        self.chunk_size = chunk_size
+        self.progress_callback = progress_callback
+        self.rows_read = 0
+        self._keys: List[str] = []
+        self._positions: Optional[pd.DataFrame] = None
+        self._pending: List[pd.DataFrame] = []
+        self._pending_rows = 0
+
+    def _report(self, fraction: float):
+        if self.progress_callback:
+            self.progress_callback(min(max(fraction, 0.0), 1.0), f"Import: {self.rows_read:,} lignes lues")
+
+    def read(self, file, filename: str, size: Optional[int] = None) -> pd.DataFrame:
+        """Lit le fichier par blocs et retourne les positions agrégées"""
+        extension = os.path.splitext(filename.lower())[1]
+        if extension == '.csv':
+            chunks = self._csv_chunks(file, size)
+        elif extension == '.xlsx':
+            chunks = self._excel_chunks(file)
+        elif extension in ('.jsonl', '.ndjson'):
+            chunks = self._json_lines_chunks(file, size)
+        elif extension == '.json':
+            chunks = self._json_chunks(file)
+        else:
+            raise ValueError(f"Format non supporté: {extension}")
+        for chunk in chunks:
+            self._accumulate(chunk)
+        self._report(1.0)
+        return self._finalize()
+
+    def _dtypes(self, mapping: Dict[str, str]) -> Dict[str, object]:
+        return {
+            col: 'float64' if standard_col in self.NUMERIC_COLUMNS else str
+            for col, standard_col in mapping.items()
+            if standard_col != 'purchase_date'
+        }
+
+    @staticmethod
+    def _require_columns(mapping: Dict[str, str]):
+        if not mapping:
+            raise ValueError("Aucune colonne reconnue dans le fichier")
+
+    def _csv_chunks(self, file, size: Optional[int]):
+        header = pd.read_csv(file, nrows=0).columns
+        file.seek(0)
+        mapping = resolve_column_mapping(header)
+        self._require_columns(mapping)
+        reader = pd.read_csv(file, usecols=list(mapping), dtype=self._dtypes(mapping), chunksize=self.chunk_size)
+        for chunk in reader:
+            yield chunk.rename(columns=mapping)
+            if size:
+                self._report(file.tell() / size)
+
+    def _excel_chunks(self, file):
+        from openpyxl import load_workbook
+        workbook = load_workbook(file, read_only=True, data_only=True)
+        try:
+            sheet = workbook.active
+            rows = sheet.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            mapping = resolve_column_mapping([col for col in header if col is not None])
+            self._require_columns(mapping)
+            positions = [i for i, col in enumerate(header) if col in mapping]
+            columns = [mapping[header[i]] for i in positions]
+            total_rows = sheet.max_row or 0
+            batch = []
+            for row in rows:
+                batch.append([row[i] if i < len(row) else None for i in positions])
+                if len(batch) >= self.chunk_size:
+                    yield pd.DataFrame(batch, columns=columns)
+                    batch = []
+                    if total_rows:
+                        self._report(self.rows_read / total_rows)
+            if batch:
+                yield pd.DataFrame(batch, columns=columns)
+        finally:
+            workbook.close()
+
+    def _json_lines_chunks(self, file, size: Optional[int]):
+        mapping = None
+        for chunk in pd.read_json(file, lines=True, chunksize=self.chunk_size, dtype=False):
+            if mapping is None:
+                mapping = resolve_column_mapping(chunk.columns)
+                self._require_columns(mapping)
+            yield chunk[[col for col in mapping if col in chunk.columns]].rename(columns=mapping)
+            if size:
+                self._report(file.tell() / size)
+
+    def _json_chunks(self, file):
+        # Un document JSON ne se lit pas par morceaux: il est chargé puis agrégé par blocs
+        json_data = json.load(file)
+        if isinstance(json_data, dict) and 'positions' in json_data:
+            json_data = json_data['positions']
+        frame = pd.DataFrame(json_data)
+        mapping = resolve_column_mapping(frame.columns)
+        self._require_columns(mapping)
+        frame = frame[list(mapping)].rename(columns=mapping)
+        del json_data
+        for offset in range(0, len(frame), self.chunk_size):
+            yield frame.iloc[offset:offset + self.chunk_size]
+            self._report((offset + self.chunk_size) / len(frame))
+
+    def _accumulate(self, chunk: pd.DataFrame):
+        self.rows_read += len(chunk)
+        chunk = chunk.copy()
+        for col in self.NUMERIC_COLUMNS:
+            if col in chunk.columns:
+                chunk[col] = pd.to_numeric(chunk[col], errors='coerce').astype('float64')
+        for col in self.TEXT_COLUMNS:
+            if col in chunk.columns:
+                # astype(str) écrit 'nan' pour les cellules vides sous pandas 2: on les masque explicitement
+                text = chunk[col].astype(str).str.strip()
+                chunk[col] = text.where(chunk[col].notna() & (text != ''))
+        # Identifiant de la position: symbole, à défaut ISIN, à défaut nom
+        key = pd.Series(np.nan, index=chunk.index, dtype=str)
+        for col in ('symbol', 'isin', 'name'):
+            if col in chunk.columns:
+                key = key.fillna(chunk[col])
+        chunk['_key'] = key
+        keys = ['_key']
+        if 'purchase_date' in chunk.columns:
+            chunk['purchase_date'] = pd.to_datetime(chunk['purchase_date'], errors='coerce').dt.normalize()
+            keys.append('purchase_date')
+        chunk = chunk[chunk['_key'].notna()]
+        if 'buyingPrice' in chunk.columns:
+            # Prix d'achat moyen pondéré par les quantités (moyenne simple sans quantité)
+            quantity = chunk['quantity'].fillna(1.0) if 'quantity' in chunk.columns else pd.Series(1.0, index=chunk.index)
+            chunk['_cost'] = quantity * chunk['buyingPrice']
+            chunk['_priced_quantity'] = quantity.where(chunk['buyingPrice'].notna())
+            chunk = chunk.drop(columns='buyingPrice')
+        self._keys = keys
+        chunk = self._combine(chunk, keys)
+        self._pending.append(chunk)
+        self._pending_rows += len(chunk)
+        # Fusion différée: l'agrégat cumulé n'est retraité que lorsque les blocs en attente atteignent sa taille
+        if self._pending_rows >= max(self.chunk_size, 0 if self._positions is None else len(self._positions)):
+            self._merge()
+
+    def _merge(self):
+        if not self._pending:
+            return
+        frames = self._pending if self._positions is None else [self._positions] + self._pending
+        self._positions = self._combine(pd.concat(frames, ignore_index=True), self._keys)
+        self._pending = []
+        self._pending_rows = 0
+
+    @staticmethod
+    def _combine(frame: pd.DataFrame, keys: List[str]) -> pd.DataFrame:
+        aggregations = {
+            col: 'sum' if col in ('quantity', '_cost', '_priced_quantity') else ('last' if col == 'lastPrice' else 'first')
+            for col in frame.columns if col not in keys
+        }
+        grouped = frame.groupby(keys, sort=False, dropna=False)
+        combined = grouped.agg(aggregations)
+        if 'quantity' in combined.columns:
+            combined['quantity'] = grouped['quantity'].sum(min_count=1)
+        return combined.reset_index()
+
+    def _finalize(self) -> pd.DataFrame:
+        self._merge()
+        if self._positions is None:
+            return pd.DataFrame(columns=['name', 'symbol', 'quantity'])
+        positions = self._positions
+        if '_cost' in positions.columns:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                positions['buyingPrice'] = np.where(
+                    positions['_priced_quantity'] != 0, positions['_cost'] / positions['_priced_quantity'], np.nan
+                )
+            positions = positions.drop(columns=['_cost', '_priced_quantity'])
+        order = ['name', 'symbol', 'isin', 'quantity', 'purchase_date', 'buyingPrice', 'lastPrice']
+        columns = [col for col in order if col in positions.columns]
+        columns += [col for col in positions.columns if col not in columns and col != '_key']
+        return positions[columns].reset_index(drop=True)
+
 def enhance_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     """Améliore automatiquement un DataFrame importé"""
-    column_mapping = {
-        'name': ['name', 'nom', 'title', 'security', 'instrument'],
-        'quantity': ['quantity', 'qty', 'quantite', 'shares', 'units'],
-        'date': ['purchase_date', 'date'],
-        'buyingPrice': ['buyingPrice', 'prix_achat', 'purchase_price', 'cost'],
-        'lastPrice': ['lastPrice', 'prix_actuel', 'current_price', 'market_price'],
-        'isin': ['isin', 'ISIN'],
-        'symbol': ['symbol', 'ticker', 'symbole']
-    }
-    df_enhanced = df.copy()
-    for standard_col, possible_names in column_mapping.items():
-        for col in df_enhanced.columns:
-            if col.lower() in [name.lower() for name in possible_names]:
-                df_enhanced = df_enhanced.rename(columns={col: standard_col})
-                break
+    df_enhanced = df.rename(columns=resolve_column_mapping(df.columns))
     required_columns = {
         'isin': 'Unknown',
         'symbol': '',
@@ -1235,22 +3237,19 @@ def enhance_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     if 'amount' not in df_enhanced.columns and 'quantity' in df_enhanced.columns and 'lastPrice' in df_enhanced.columns:
         df_enhanced['amount'] = df_enhanced['quantity'] * df_enhanced['lastPrice']
     if 'symbol' in df_enhanced.columns and 'name' in df_enhanced.columns:
-        for idx, row in df_enhanced.iterrows():
-            if not row['symbol'] or row['symbol'] == '':
-                try:
-                    search_results = TickerService.search_tickers(row['name'], limit=1)
-                    if search_results:
-                        df_enhanced.at[idx, 'symbol'] = search_results[0]['symbol']
-                        ticker_data = TickerService.validate_ticker(search_results[0]['symbol'])
-                        if ticker_data['valid']:
-                            df_enhanced.at[idx, 'sector'] = ticker_data.get('sector', 'Unknown')
-                            df_enhanced.at[idx, 'industry'] = ticker_data.get('industry', 'Unknown')
-                            df_enhanced.at[idx, 'asset_type'] = ticker_data.get('type', 'Stock')
-                            df_enhanced.at[idx, 'exchange'] = ticker_data.get('exchange', 'Unknown')
-                except:
-                    continue
-    if 'Tickers' not in df_enhanced.columns and 'symbol' in df_enhanced.columns:
-        df_enhanced['Tickers'] = df_enhanced['symbol']
+        symbols = df_enhanced['symbol'].fillna('').astype(str).str.strip()
+        missing = (symbols == '') & df_enhanced['name'].notna()
+        if missing.any():
+            resolver = get_symbol_resolver()
+            names = df_enhanced.loc[missing, 'name'].astype(str)
+            resolved = names.map(resolver.resolve_names(names.unique().tolist())).dropna()
+            if not resolved.empty:
+                df_enhanced.loc[resolved.index, 'symbol'] = resolved
+                metadata = resolver.resolve_metadata(resolved.unique().tolist())
+                validated = resolved[resolved.isin(metadata.index)]
+                for source_col, target_col in [('sector', 'sector'), ('industry', 'industry'),
+                                               ('type', 'asset_type'), ('exchange', 'exchange')]:
+                    df_enhanced.loc[validated.index, target_col] = validated.map(metadata[source_col]).to_numpy()
     return df_enhanced
 
 def display_portfolio_summary(df: pd.DataFrame):
@@ -1278,6 +3277,187 @@ def display_portfolio_summary(df: pd.DataFrame):
             'Performance (%)': '{:.2f}'
         }), use_container_width=True)
 
+class _CovarianceState:
+    """Moments accumulés d'une fenêtre de rendements (somme, produits croisés, produits pondérés EWMA)"""
+
+    def __init__(self, returns: pd.DataFrame, ewma_lambda: float):
+        self.ewma_lambda = ewma_lambda
+        self.symbols = list(returns.columns)
+        self.dates = returns.index
+        self.data = returns.to_numpy(dtype=float)
+        self.rolled_rows = 0
+        self.results: Dict[str, Tuple[pd.Series, pd.DataFrame]] = {}
+        self._rebuild()
+
+    def matches(self, returns: pd.DataFrame) -> bool:
+        """Mêmes dates et mêmes rendements (colonnes de l'état) que la fenêtre fournie"""
+        return (self.dates.equals(returns.index)
+                and np.array_equal(self.data, returns[self.symbols].to_numpy(dtype=float)))
+
+    def _ewma_weights(self, count: int) -> np.ndarray:
+        return self.ewma_lambda ** np.arange(count - 1, -1, -1, dtype=float)
+
+    def _rebuild(self):
+        x = self.data
+        self.sum = x.sum(axis=0)
+        self.cross = x.T @ x
+        weights = self._ewma_weights(len(x))
+        self.ewma_cross = (x * weights[:, None]).T @ x
+        self.ewma_weight = weights.sum()
+        self.rolled_rows = 0
+
+    def roll(self, returns: pd.DataFrame, shift: int):
+        """Avance la fenêtre de `shift` lignes et corrige les lignes révisées du recouvrement"""
+        new_data = returns.to_numpy(dtype=float)
+        count = len(new_data)
+        removed = self.data[:shift]
+        overlap_old = self.data[shift:]
+        overlap_new = new_data[:count - shift]
+        changed = np.flatnonzero(~np.all(np.isclose(overlap_old, overlap_new, rtol=0, atol=1e-15), axis=1))
+        added = new_data[count - shift:]
+        old_changed = overlap_old[changed]
+        new_changed = overlap_new[changed]
+        self.sum += added.sum(axis=0) - removed.sum(axis=0) + new_changed.sum(axis=0) - old_changed.sum(axis=0)
+        self.cross += added.T @ added - removed.T @ removed + new_changed.T @ new_changed - old_changed.T @ old_changed
+        decay = self.ewma_lambda ** shift
+        window_weights = self._ewma_weights(count)
+        removed_weights = window_weights[:shift] * decay
+        changed_weights = window_weights[:count - shift][changed]
+        self.ewma_cross = (
+            self.ewma_cross * decay
+            - (removed * removed_weights[:, None]).T @ removed
+            + (added * self._ewma_weights(shift)[:, None]).T @ added
+            + (new_changed * changed_weights[:, None]).T @ new_changed
+            - (old_changed * changed_weights[:, None]).T @ old_changed
+        )
+        self.ewma_weight = window_weights.sum()
+        self.data = new_data
+        self.dates = returns.index
+        self.results = {}
+        self.rolled_rows += shift
+        if self.rolled_rows >= count:
+            self._rebuild()
+
+    def copy(self) -> '_CovarianceState':
+        clone = _CovarianceState.__new__(_CovarianceState)
+        clone.__dict__.update({
+            name: value.copy() if isinstance(value, (np.ndarray, list)) else value
+            for name, value in self.__dict__.items()
+        })
+        clone.results = {}
+        return clone
+
+    def extend(self, returns: pd.DataFrame):
+        """Ajoute des colonnes (nouveaux symboles) en ne calculant que les nouvelles lignes/colonnes"""
+        new_symbols = [symbol for symbol in returns.columns if symbol not in self.symbols]
+        x_old = self.data
+        x_new = returns[new_symbols].to_numpy(dtype=float)
+        weights = self._ewma_weights(len(x_old))[:, None]
+        cross_old_new = x_old.T @ x_new
+        cross_new = x_new.T @ x_new
+        ewma_old_new = (x_old * weights).T @ x_new
+        ewma_new = (x_new * weights).T @ x_new
+        self.cross = np.block([[self.cross, cross_old_new], [cross_old_new.T, cross_new]])
+        self.ewma_cross = np.block([[self.ewma_cross, ewma_old_new], [ewma_old_new.T, ewma_new]])
+        self.sum = np.concatenate([self.sum, x_new.sum(axis=0)])
+        self.symbols = self.symbols + new_symbols
+        self.data = np.hstack([x_old, x_new])
+        self.results = {}
+
+    def estimate(self, method: str, frequency: int) -> Tuple[pd.Series, pd.DataFrame]:
+        if method in self.results:
+            return self.results[method]
+        count = len(self.data)
+        mean = self.sum / count
+        if method == 'sample':
+            cov = (self.cross - count * np.outer(mean, mean)) / (count - 1)
+        elif method == 'ewma':
+            cov = self.ewma_cross / self.ewma_weight
+        elif method == 'ledoit_wolf':
+            cov = LedoitWolf().fit(self.data).covariance_
+        else:
+            raise ValueError(f"Estimateur inconnu: {method}")
+        result = (
+            pd.Series(mean * frequency, index=self.symbols),
+            pd.DataFrame(cov * frequency, index=self.symbols, columns=self.symbols)
+        )
+        self.results[method] = result
+        return result
+
+class CovarianceService:
+    """Estimation de covariance (échantillon, Ledoit-Wolf, EWMA) mise en cache par (symboles, fenêtre, fréquence).
+
+    Une fenêtre décalée de quelques jours est mise à jour par ajout/retrait de lignes,
+    l'ajout d'un symbole ne calcule que la nouvelle ligne/colonne.
+    """
+
+    METHODS = ('sample', 'ledoit_wolf', 'ewma')
+
+    def __init__(self, maxsize: int = 16, ewma_lambda: float = 0.94):
+        self.maxsize = maxsize
+        self.ewma_lambda = ewma_lambda
+        self.stats = {'hits': 0, 'rolls': 0, 'extends': 0, 'builds': 0}
+        self._states: 'OrderedDict[Tuple, _CovarianceState]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _find_incremental(self, symbols: Tuple[str, ...], returns: pd.DataFrame, frequency: int):
+        for key, state in reversed(self._states.items()):
+            state_symbols, window, state_frequency = key
+            if state_frequency != frequency or window != len(returns):
+                continue
+            if state_symbols == symbols and len(state.dates) and returns.index[0] in state.dates:
+                shift = state.dates.get_loc(returns.index[0])
+                if isinstance(shift, int) and 0 < shift < window and state.dates[shift:].equals(returns.index[:window - shift]):
+                    return key, 'roll', shift
+            # Un cours révisé sur les colonnes existantes impose une reconstruction
+            if (len(state_symbols) < len(symbols) and set(state_symbols) < set(symbols)
+                    and state.matches(returns)):
+                return key, 'extend', 0
+        return None, None, 0
+
+    def estimate(self, returns: pd.DataFrame, method: str = 'sample', frequency: int = 252) -> Tuple[pd.Series, pd.DataFrame]:
+        """Rendements moyens et matrice de covariance annualisés"""
+        if method not in self.METHODS:
+            raise ValueError(f"Estimateur inconnu: {method}")
+        returns = returns.dropna()
+        symbols = tuple(returns.columns)
+        key = (symbols, len(returns), frequency)
+        with self._lock:
+            state = self._states.get(key)
+            if state is not None and state.matches(returns):
+                self._states.move_to_end(key)
+                self.stats['hits'] += 1
+                mean_returns, cov_matrix = state.estimate(method, frequency)
+                return mean_returns.reindex(symbols), cov_matrix.reindex(index=symbols, columns=symbols)
+            previous_key, operation, shift = self._find_incremental(symbols, returns, frequency)
+            if operation == 'roll':
+                state = self._states.pop(previous_key)
+                state.roll(returns[state.symbols], shift)
+                self.stats['rolls'] += 1
+            elif operation == 'extend':
+                state = self._states[previous_key].copy()
+                state.extend(returns)
+                self.stats['extends'] += 1
+            else:
+                state = _CovarianceState(returns, self.ewma_lambda)
+                self.stats['builds'] += 1
+            self._states[key] = state
+            while len(self._states) > self.maxsize:
+                self._states.popitem(last=False)
+            mean_returns, cov_matrix = state.estimate(method, frequency)
+            if list(mean_returns.index) != list(symbols):
+                mean_returns = mean_returns.reindex(symbols)
+                cov_matrix = cov_matrix.reindex(index=symbols, columns=symbols)
+            return mean_returns, cov_matrix
+
+@st.cache_resource
+def get_covariance_service() -> CovarianceService:
+    """Instance partagée du service de covariance"""
+    return CovarianceService()
+
+class JobCancelled(Exception):
+    """Interruption d'un job dont l'annulation a été demandée"""
+
 class EfficientFrontier:
     """Classe pour le calcul de la frontière efficiente"""
 
@@ -1285,10 +3465,9 @@ class EfficientFrontier:
     def get_historical_data(symbols: List[str], start_date: str, end_date: str) -> pd.DataFrame:
         """Récupère les données historiques pour les symboles donnés"""
         try:
-            data = yf.download(symbols, start=start_date, end=end_date)['Close']
-            if isinstance(data, pd.Series):
-                data = data.to_frame()
-                data.columns = symbols
+            data = get_price_store().get_history(symbols, start_date, end_date)
+            if data.empty:
+                return data
             data = data.dropna(thresh=len(data) * 0.7, axis=1)
             return data.dropna()
         except Exception as e:
@@ -1313,31 +3492,127 @@ class EfficientFrontier:
         return -sharpe_ratio
 
     @staticmethod
-    def get_efficient_frontier(symbols: List[str], start_date: str, end_date: str, risk_free_rate: float = 0.02) -> Tuple[pd.DataFrame, Dict]:
+    def negative_sharpe_ratio_gradient(weights: np.ndarray, returns: np.ndarray, cov_matrix: np.ndarray, risk_free_rate: float = 0.02) -> np.ndarray:
+        """Gradient analytique de negative_sharpe_ratio"""
+        cov_weights = cov_matrix @ weights
+        portfolio_variance = weights @ cov_weights
+        if portfolio_variance <= 0:
+            return np.zeros_like(weights)
+        portfolio_volatility = np.sqrt(portfolio_variance)
+        excess_return = weights @ returns - risk_free_rate
+        return -(returns / portfolio_volatility - excess_return * cov_weights / portfolio_volatility ** 3)
+
+    @staticmethod
+    def optimize_weights(mean_returns: np.ndarray, cov_matrix: np.ndarray, objective: str = 'sharpe',
+                         risk_free_rate: float = 0.02, target_return: Optional[float] = None,
+                         initial_weights: Optional[np.ndarray] = None, max_iter: int = 1000):
+        """Optimisation SLSQP avec gradients analytiques.
+
+        objective: 'sharpe' (ratio de Sharpe maximal), 'min_variance' (variance minimale)
+        ou 'target_return' (variance minimale à rendement cible). initial_weights sert de
+        point de départ (démarrage à chaud), à défaut l'équipondération.
+        """
+        mean_returns = np.asarray(mean_returns, dtype=float)
+        cov_matrix = np.asarray(cov_matrix, dtype=float)
+        num_assets = len(mean_returns)
+        if initial_weights is None or len(initial_weights) != num_assets or np.sum(np.clip(initial_weights, 0, 1)) <= 0:
+            initial_weights = np.full(num_assets, 1 / num_assets)
+        else:
+            initial_weights = np.clip(np.asarray(initial_weights, dtype=float), 0, 1)
+            initial_weights = initial_weights / initial_weights.sum()
+        constraints = [{'type': 'eq', 'fun': lambda x: np.sum(x) - 1, 'jac': lambda x: np.ones_like(x)}]
+        if objective == 'sharpe':
+            fun = EfficientFrontier.negative_sharpe_ratio
+            jac = EfficientFrontier.negative_sharpe_ratio_gradient
+            args = (mean_returns, cov_matrix, risk_free_rate)
+        elif objective in ('min_variance', 'target_return'):
+            fun = lambda x: x @ cov_matrix @ x
+            jac = lambda x: 2 * (cov_matrix @ x)
+            args = ()
+            if objective == 'target_return':
+                if target_return is None:
+                    raise ValueError("target_return requis pour l'objectif 'target_return'")
+                constraints.append({
+                    'type': 'eq',
+                    'fun': lambda x: x @ mean_returns - target_return,
+                    'jac': lambda x: mean_returns
+                })
+        else:
+            raise ValueError(f"Objectif inconnu: {objective}")
+        return minimize(
+            fun,
+            initial_weights,
+            args=args,
+            jac=jac,
+            method='SLSQP',
+            bounds=tuple((0, 1) for _ in range(num_assets)),
+            constraints=constraints,
+            options={'maxiter': max_iter}
+        )
+
+    @staticmethod
+    def trace_efficient_frontier(mean_returns: np.ndarray, cov_matrix: np.ndarray, num_points: int = 25,
+                                 initial_weights: Optional[np.ndarray] = None,
+                                 progress_callback: Optional[Callable[[float, str], None]] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Frontière exacte par balayage du rendement cible, chaque point démarrant de la solution précédente"""
+        mean_returns = np.asarray(mean_returns, dtype=float)
+        cov_matrix = np.asarray(cov_matrix, dtype=float)
+        min_variance = EfficientFrontier.optimize_weights(
+            mean_returns, cov_matrix, objective='min_variance', initial_weights=initial_weights
+        )
+        weights = np.clip(min_variance.x, 0, 1)
+        targets = np.linspace(weights @ mean_returns, mean_returns.max(), num_points)
+        frontier_returns, frontier_volatilities, frontier_weights = [], [], []
+        for i, target in enumerate(targets):
+            if progress_callback:
+                progress_callback(i / num_points, f"Frontière: point {i + 1}/{num_points}")
+            result = EfficientFrontier.optimize_weights(
+                mean_returns, cov_matrix, objective='target_return', target_return=target, initial_weights=weights
+            )
+            if not result.success:
+                continue
+            weights = np.clip(result.x, 0, 1)
+            portfolio_return, portfolio_volatility = EfficientFrontier.calculate_portfolio_performance(
+                weights, mean_returns, cov_matrix
+            )
+            frontier_returns.append(portfolio_return)
+            frontier_volatilities.append(portfolio_volatility)
+            frontier_weights.append(weights)
+        return (np.array(frontier_returns), np.array(frontier_volatilities),
+                np.array(frontier_weights).reshape(len(frontier_weights), len(mean_returns)))
+
+    @staticmethod
+    def get_efficient_frontier(symbols: List[str], start_date: str, end_date: str, risk_free_rate: float = 0.02,
+                               objective: str = 'sharpe', target_return: Optional[float] = None,
+                               current_weights: Optional[Dict[str, float]] = None,
+                               frontier_points: int = 0, cov_method: str = 'sample',
+                               progress_callback: Optional[Callable[[float, str], None]] = None) -> Tuple[pd.DataFrame, Dict]:
         """Calcule le portefeuille optimal sur la frontière efficiente"""
+        report = progress_callback or (lambda fraction, message: None)
         try:
+            report(0.0, "Chargement des prix historiques")
             price_data = EfficientFrontier.get_historical_data(symbols, start_date, end_date)
             if price_data.empty or len(price_data.columns) < 2:
                 return pd.DataFrame(), {'error': 'Données insuffisantes'}
             returns = price_data.pct_change().dropna()
             if len(returns) < 30:
                 return pd.DataFrame(), {'error': 'Historique trop court (moins de 30 jours)'}
-            mean_returns = returns.mean() * 252
-            cov_matrix = returns.cov() * 252
+            report(0.2, "Estimation de la covariance")
+            mean_returns, cov_matrix = get_covariance_service().estimate(returns, method=cov_method)
             if np.any(np.isnan(cov_matrix.values)) or np.any(np.isinf(cov_matrix.values)):
                 return pd.DataFrame(), {'error': 'Matrice de covariance invalide'}
-            num_assets = len(symbols)
-            constraints = {'type': 'eq', 'fun': lambda x: np.sum(x) - 1}
-            bounds = tuple((0, 1) for _ in range(num_assets))
-            initial_weights = np.array([1/num_assets] * num_assets)
-            result = minimize(
-                EfficientFrontier.negative_sharpe_ratio,
-                initial_weights,
-                args=(mean_returns.values, cov_matrix.values, risk_free_rate),
-                method='SLSQP',
-                bounds=bounds,
-                constraints=constraints,
-                options={'maxiter': 1000}
+            assets = list(price_data.columns)
+            initial_weights = None
+            if current_weights:
+                initial_weights = np.array([current_weights.get(asset, 0.0) for asset in assets], dtype=float)
+            report(0.3, "Optimisation du portefeuille")
+            result = EfficientFrontier.optimize_weights(
+                mean_returns.values,
+                cov_matrix.values,
+                objective=objective,
+                risk_free_rate=risk_free_rate,
+                target_return=target_return,
+                initial_weights=initial_weights
             )
             if not result.success:
                 return pd.DataFrame(), {'error': f'Optimisation échouée: {result.message}'}
@@ -1348,152 +3623,455 @@ class EfficientFrontier:
             sharpe_ratio = (portfolio_return - risk_free_rate) / portfolio_volatility
             results_df = pd.DataFrame({
                 'weight': optimal_weights
-            }, index=symbols)
+            }, index=assets)
             results_df = results_df[results_df['weight'] > 0.005].sort_values('weight', ascending=False)
             metrics = {
                 'expected_return': portfolio_return,
                 'volatility': portfolio_volatility,
                 'sharpe_ratio': sharpe_ratio
             }
+            if frontier_points > 0:
+                frontier_returns, frontier_volatilities, _ = EfficientFrontier.trace_efficient_frontier(
+                    mean_returns.values, cov_matrix.values, num_points=frontier_points, initial_weights=optimal_weights,
+                    progress_callback=lambda fraction, message: report(0.4 + 0.6 * fraction, message)
+                )
+                metrics['frontier_returns'] = frontier_returns.tolist()
+                metrics['frontier_volatilities'] = frontier_volatilities.tolist()
+            report(1.0, "Terminé")
             return results_df, metrics
+        except JobCancelled:
+            raise
         except Exception as e:
             return pd.DataFrame(), {'error': f'Erreur lors du calcul: {str(e)}'}
 
     @staticmethod
-    def generate_efficient_frontier_curve(symbols: List[str], start_date: str, end_date: str, num_portfolios: int = 50) -> Tuple[List[float], List[float]]:
+    def simulate_portfolios(mean_returns: np.ndarray, cov_matrix: np.ndarray, num_simulations: int,
+                            keep: int = 50, risk_free_rate: float = 0.02, selection: str = 'sharpe',
+                            chunk_size: int = 100_000, max_chunk_bytes: int = 64 * 1024 ** 2,
+                            seed: Optional[int] = None,
+                            progress_callback: Optional[Callable[[float, str], None]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Simulation Monte Carlo par blocs de portefeuilles aléatoires.
+
+        selection='sharpe' conserve les `keep` meilleurs ratios de Sharpe (tri décroissant),
+        selection='envelope' conserve l'enveloppe efficiente (tri par volatilité croissante).
+        """
+        mean_returns = np.asarray(mean_returns, dtype=float)
+        cov_matrix = np.asarray(cov_matrix, dtype=float)
+        num_assets = len(mean_returns)
+        rng = np.random.default_rng(seed)
+        # Deux matrices (poids et poids x covariance) de chunk x num_assets flottants en mémoire
+        chunk = max(1, min(chunk_size, max_chunk_bytes // (16 * max(num_assets, 1))))
+        best_returns = np.empty(0)
+        best_volatilities = np.empty(0)
+        best_scores = np.empty(0)
+        for offset in range(0, num_simulations, chunk):
+            if progress_callback:
+                progress_callback(offset / num_simulations, f"Simulation: {offset:,}/{num_simulations:,} portefeuilles")
+            size = min(chunk, num_simulations - offset)
+            weights = rng.random((size, num_assets))
+            weights /= weights.sum(axis=1, keepdims=True)
+            returns = weights @ mean_returns
+            volatilities = np.sqrt(np.maximum(np.einsum('ij,ij->i', weights @ cov_matrix, weights), 0))
+            returns = np.concatenate([best_returns, returns])
+            volatilities = np.concatenate([best_volatilities, volatilities])
+            if selection == 'envelope':
+                order = np.argsort(volatilities, kind='stable')
+                sorted_returns = returns[order]
+                running_max = np.maximum.accumulate(sorted_returns)
+                on_frontier = np.ones(len(order), dtype=bool)
+                on_frontier[1:] = sorted_returns[1:] > running_max[:-1]
+                best_returns = sorted_returns[on_frontier]
+                best_volatilities = volatilities[order][on_frontier]
+            else:
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    scores = np.where(volatilities > 0, (returns - risk_free_rate) / volatilities, 0)
+                if len(scores) > keep:
+                    top = np.argpartition(-scores, keep - 1)[:keep]
+                    returns, volatilities, scores = returns[top], volatilities[top], scores[top]
+                best_returns, best_volatilities, best_scores = returns, volatilities, scores
+        if selection == 'envelope':
+            if len(best_returns) > keep:
+                picks = np.unique(np.linspace(0, len(best_returns) - 1, keep).round().astype(int))
+                best_returns, best_volatilities = best_returns[picks], best_volatilities[picks]
+            return best_returns, best_volatilities
+        order = np.argsort(-best_scores, kind='stable')
+        return best_returns[order], best_volatilities[order]
+
+    @staticmethod
+    def generate_efficient_frontier_curve(symbols: List[str], start_date: str, end_date: str, num_portfolios: int = 50,
+                                          num_simulations: Optional[int] = None, selection: str = 'sharpe',
+                                          seed: Optional[int] = None, cov_method: str = 'sample',
+                                          progress_callback: Optional[Callable[[float, str], None]] = None) -> Tuple[List[float], List[float]]:
         """Génère la courbe de la frontière efficiente"""
         try:
             price_data = EfficientFrontier.get_historical_data(symbols, start_date, end_date)
             if price_data.empty:
                 return [], []
             returns = price_data.pct_change().dropna()
-            mean_returns = returns.mean() * 252
-            cov_matrix = returns.cov() * 252
-            num_assets = len(symbols)
-            results = []
-            for _ in range(num_portfolios * 10):
-                weights = np.random.random(num_assets)
-                weights /= np.sum(weights)
-                portfolio_return, portfolio_volatility = EfficientFrontier.calculate_portfolio_performance(
-                    weights, mean_returns.values, cov_matrix.values
-                )
-                results.append({
-                    'return': portfolio_return,
-                    'volatility': portfolio_volatility,
-                    'sharpe': (portfolio_return - 0.02) / portfolio_volatility if portfolio_volatility > 0 else 0
-                })
-            results.sort(key=lambda x: x['sharpe'], reverse=True)
-            results = results[:num_portfolios]
-            returns_list = [r['return'] for r in results]
-            volatility_list = [r['volatility'] for r in results]
-            return returns_list, volatility_list
+            mean_returns, cov_matrix = get_covariance_service().estimate(returns, method=cov_method)
+            portfolio_returns, portfolio_volatilities = EfficientFrontier.simulate_portfolios(
+                mean_returns.values,
+                cov_matrix.values,
+                num_simulations or num_portfolios * 10,
+                keep=num_portfolios,
+                selection=selection,
+                seed=seed,
+                progress_callback=progress_callback
+            )
+            return portfolio_returns.tolist(), portfolio_volatilities.tolist()
+        except JobCancelled:
+            raise
         except Exception as e:
             print(f"Erreur lors de la génération de la courbe: {e}")
             return [], []
 
+class PortfolioHistory:
+    """Valorisation historique quotidienne des lignes réellement détenues"""
+
+    @staticmethod
+    def holdings_matrix(symbol_codes: np.ndarray, quantities: np.ndarray, start_positions: np.ndarray,
+                        num_dates: int, num_symbols: int) -> np.ndarray:
+        """Quantités détenues (dates x symboles): chaque lot compte à partir de sa date d'achat"""
+        holdings = np.zeros((num_dates + 1, num_symbols))
+        np.add.at(holdings, (start_positions, symbol_codes), quantities)
+        return np.cumsum(holdings[:-1], axis=0)
+
+    @staticmethod
+    def valuation(df: pd.DataFrame, start_date=None, end_date=None, default_lookback_days: int = 365) -> pd.DataFrame:
+        """Valeur quotidienne du portefeuille et rendements pondérés dans le temps.
+
+        La valeur est le produit ligne à ligne de la matrice des cours (dates x symboles) par celle
+        des quantités détenues. Le rendement du jour t est celui des positions détenues la veille,
+        ce qui neutralise les apports liés aux achats. Sans date d'achat, un lot est réputé détenu
+        depuis le début de la période.
+        """
+        if len(df) == 0 or 'symbol' not in df.columns or 'quantity' not in df.columns:
+            return pd.DataFrame(columns=['value', 'return'])
+        symbols = df['symbol'].fillna('').astype(str).str.strip()
+        quantities = pd.to_numeric(df['quantity'], errors='coerce')
+        if 'purchase_date' in df.columns:
+            purchase_dates = pd.to_datetime(df['purchase_date'], errors='coerce')
+        else:
+            purchase_dates = pd.Series(pd.NaT, index=df.index)
+        valid = ((symbols != '') & quantities.notna() & (quantities != 0)).to_numpy()
+        if not valid.any():
+            return pd.DataFrame(columns=['value', 'return'])
+        end = pd.Timestamp(end_date if end_date is not None else datetime.now()).normalize() + pd.Timedelta(days=1)
+        if start_date is not None:
+            start = pd.Timestamp(start_date).normalize()
+        elif purchase_dates[valid].notna().any():
+            start = purchase_dates[valid].min().normalize()
+        else:
+            start = end - pd.Timedelta(days=default_lookback_days)
+        symbol_codes, unique_symbols = pd.factorize(symbols[valid])
+        prices = get_price_store().get_history(list(unique_symbols), start, end)
+        if prices.empty:
+            return pd.DataFrame(columns=['value', 'return'])
+        prices = prices.reindex(columns=unique_symbols).sort_index().ffill()
+        dates = prices.index
+        start_positions = np.searchsorted(
+            dates.values, purchase_dates[valid].to_numpy(dtype='datetime64[ns]'), side='left'
+        )
+        start_positions[pd.isna(purchase_dates[valid]).to_numpy()] = 0
+        holdings = PortfolioHistory.holdings_matrix(
+            symbol_codes, quantities[valid].to_numpy(dtype=float), start_positions, len(dates), len(unique_symbols)
+        )
+        price_matrix = prices.to_numpy(dtype=float)
+        priced = ~np.isnan(price_matrix)
+        filled_prices = np.where(priced, price_matrix, 0.0)
+        values = np.einsum('ij,ij->i', holdings, filled_prices)
+        # Rendement des positions de la veille, restreint aux titres cotés les deux jours
+        previous_holdings = holdings[:-1] * (priced[1:] & priced[:-1])
+        start_values = np.einsum('ij,ij->i', previous_holdings, filled_prices[:-1])
+        end_values = np.einsum('ij,ij->i', previous_holdings, filled_prices[1:])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            daily_returns = np.where(start_values > 0, end_values / start_values - 1, np.nan)
+        return pd.DataFrame({
+            'value': values,
+            'return': np.concatenate([[np.nan], daily_returns])
+        }, index=dates)
+
+    @staticmethod
+    def performance_metrics(returns: pd.Series, periods_per_year: int = 252, risk_free_rate: float = 0.02) -> Dict:
+        """Rendement, volatilité, Sharpe, Sortino, drawdown et VaR historiques d'une série de rendements quotidiens"""
+        returns = returns.dropna().to_numpy(dtype=float)
+        if len(returns) < 2:
+            return {}
+        wealth = np.cumprod(1 + returns)
+        annualized_return = wealth[-1] ** (periods_per_year / len(returns)) - 1
+        annualized_volatility = returns.std(ddof=1) * np.sqrt(periods_per_year)
+        downside = np.minimum(returns - risk_free_rate / periods_per_year, 0)
+        downside_deviation = np.sqrt(np.mean(downside ** 2)) * np.sqrt(periods_per_year)
+        drawdowns = 1 - wealth / np.maximum.accumulate(np.maximum(wealth, 1))
+        var_95 = np.percentile(returns, 5)
+        excess_return = annualized_return - risk_free_rate
+        return {
+            'portfolio_return': annualized_return,
+            'portfolio_volatility': annualized_volatility,
+            'sharpe_ratio': excess_return / annualized_volatility if annualized_volatility > 0 else 0,
+            'sortino_ratio': excess_return / downside_deviation if downside_deviation > 0 else 0,
+            'max_drawdown': float(drawdowns.max()),
+            'var_95': var_95,
+            'cvar_95': returns[returns <= var_95].mean(),
+            'history_days': len(returns)
+        }
+
+class MonteCarloVaR:
+    """VaR/CVaR par simulation: bootstrap historique, paramétrique (normale, Student-t) ou historique filtrée"""
+
+    METHODS = ('historical', 'normal', 'student_t', 'filtered')
+
+    @staticmethod
+    def _factor(cov_matrix: np.ndarray) -> np.ndarray:
+        """Facteur F tel que F @ F.T = cov_matrix (Cholesky, décomposition spectrale si non définie positive)"""
+        try:
+            return np.linalg.cholesky(cov_matrix)
+        except np.linalg.LinAlgError:
+            eigenvalues, eigenvectors = np.linalg.eigh(cov_matrix)
+            return eigenvectors * np.sqrt(np.clip(eigenvalues, 0, None))
+
+    @staticmethod
+    def filtered_residuals(returns: np.ndarray, decay: float = 0.94) -> Tuple[np.ndarray, np.ndarray]:
+        """Résidus standardisés par la volatilité EWMA de la veille et volatilité prévue pour le lendemain"""
+        variance = pd.DataFrame(returns ** 2).ewm(alpha=1 - decay, adjust=False).mean().to_numpy()
+        volatility = np.sqrt(np.maximum(variance, 1e-12))
+        residuals = returns[1:] / volatility[:-1]
+        # Les premières volatilités reposent sur trop peu d'observations
+        burn_in = min(20, len(residuals) // 4)
+        return residuals[burn_in:], volatility[-1]
+
+    @staticmethod
+    def simulate(returns: np.ndarray, values: np.ndarray, num_scenarios: int = 100_000, horizon_days: int = 1,
+                 method: str = 'historical', confidence_levels: Tuple[float, ...] = (0.95, 0.99),
+                 seed: Optional[int] = None, degrees_of_freedom: float = 5.0, decay: float = 0.94,
+                 chunk_size: int = 20_000, max_chunk_bytes: int = 64 * 1024 ** 2,
+                 progress_callback: Optional[Callable[[float, str], None]] = None) -> Dict:
+        """Distribution des pertes et profits du portefeuille sur l'horizon, générée par blocs.
+
+        returns: rendements logarithmiques quotidiens (jours x actifs); values: exposition actuelle par actif.
+        Seules les plus fortes pertes nécessaires aux quantiles sont conservées (tampon de queue),
+        la moyenne et l'écart-type du P&L sont agrégés au fil des blocs.
+        """
+        if method not in MonteCarloVaR.METHODS:
+            raise ValueError(f"Méthode inconnue: {method}")
+        returns = np.asarray(returns, dtype=float)
+        values = np.asarray(values, dtype=float)
+        num_days, num_assets = returns.shape
+        rng = np.random.default_rng(seed)
+        if method in ('normal', 'student_t'):
+            mean_returns = returns.mean(axis=0) * horizon_days
+            factor = MonteCarloVaR._factor(np.atleast_2d(np.cov(returns, rowvar=False))).T * np.sqrt(horizon_days)
+        elif method == 'filtered':
+            residuals, forecast_volatility = MonteCarloVaR.filtered_residuals(returns, decay)
+        tail_counts = {level: max(1, int(np.ceil(round(num_scenarios * (1 - level), 6)))) for level in confidence_levels}
+        tail_size = max(tail_counts.values())
+        tail_losses = np.empty(0)
+        pnl_sum = pnl_sum_squares = 0.0
+        # Au plus quatre matrices de chunk x num_assets flottants en mémoire
+        chunk = max(1, min(chunk_size, max_chunk_bytes // (32 * max(num_assets, 1))))
+        for offset in range(0, num_scenarios, chunk):
+            if progress_callback:
+                progress_callback(offset / num_scenarios, f"Simulation: {offset:,}/{num_scenarios:,} scénarios")
+            size = min(chunk, num_scenarios - offset)
+            if method == 'historical':
+                horizon_returns = np.zeros((size, num_assets))
+                for _ in range(horizon_days):
+                    horizon_returns += returns[rng.integers(0, num_days, size)]
+            elif method == 'filtered':
+                horizon_returns = np.zeros((size, num_assets))
+                variance = np.tile(forecast_volatility ** 2, (size, 1))
+                for _ in range(horizon_days):
+                    daily = residuals[rng.integers(0, len(residuals), size)] * np.sqrt(variance)
+                    horizon_returns += daily
+                    variance = decay * variance + (1 - decay) * daily ** 2
+            else:
+                horizon_returns = rng.standard_normal((size, num_assets)) @ factor
+                if method == 'student_t':
+                    # Loi de Student multivariée normalisée à la covariance estimée
+                    mixing = np.sqrt((degrees_of_freedom - 2) / rng.chisquare(degrees_of_freedom, size))
+                    horizon_returns *= mixing[:, None]
+                horizon_returns += mean_returns
+            pnl = np.expm1(horizon_returns) @ values
+            pnl_sum += pnl.sum()
+            pnl_sum_squares += np.square(pnl).sum()
+            tail_losses = np.concatenate([tail_losses, -pnl])
+            if len(tail_losses) > tail_size:
+                tail_losses = np.partition(tail_losses, len(tail_losses) - tail_size)[-tail_size:]
+        tail_losses = np.sort(tail_losses)[::-1]
+        var, cvar = {}, {}
+        for level, count in tail_counts.items():
+            var[level] = float(tail_losses[count - 1])
+            cvar[level] = float(tail_losses[:count].mean())
+        expected_pnl = pnl_sum / num_scenarios
+        return {
+            'method': method,
+            'num_scenarios': num_scenarios,
+            'horizon_days': horizon_days,
+            'portfolio_value': float(values.sum()),
+            'expected_pnl': expected_pnl,
+            'pnl_volatility': float(np.sqrt(max(pnl_sum_squares / num_scenarios - expected_pnl ** 2, 0))),
+            'var': var,
+            'cvar': cvar
+        }
+
+    @staticmethod
+    def portfolio_var(symbols: List[str], values: List[float], start_date: str, end_date: str,
+                      progress_callback: Optional[Callable[[float, str], None]] = None, **kwargs) -> Dict:
+        """VaR/CVaR simulées des positions (symbole, valeur) à partir des cours historiques de la période"""
+        try:
+            price_data = EfficientFrontier.get_historical_data(symbols, start_date, end_date)
+            if price_data.empty:
+                return {'error': 'Données insuffisantes'}
+            returns = np.log(price_data).diff().dropna()
+            if len(returns) < 30:
+                return {'error': 'Historique trop court (moins de 30 jours)'}
+            exposures = pd.Series(values, index=symbols, dtype=float).groupby(level=0).sum()
+            covered = exposures.reindex(returns.columns).fillna(0.0)
+            results = MonteCarloVaR.simulate(
+                returns.to_numpy(), covered.to_numpy(), progress_callback=progress_callback, **kwargs
+            )
+            results['uncovered_value'] = float(exposures.sum() - covered.sum())
+            return results
+        except JobCancelled:
+            raise
+        except Exception as e:
+            return {'error': f'Erreur lors de la simulation: {str(e)}'}
+
 class RiskPerformanceAnalyzer:
     """Analyseur avancé de risque et performance"""
 
     @staticmethod
-    def get_beta(ticker: str, period: str = "2y") -> float:
+    @timed()
+    def get_beta(ticker: str, period: str = "2y", benchmark: str = "^GSPC") -> float:
         """Récupère le bêta d'une action calculé par rapport au marché (S&P 500)"""
+        years = {'1y': 1, '2y': 2, '3y': 3, '5y': 5}.get(period, 2)
+        betas = RiskPerformanceAnalyzer.get_betas([ticker], benchmark=benchmark, period_days=365 * years)
+        return float(betas.get(ticker, 1.0))
+
+    @staticmethod
+    @timed()
+    def get_betas(symbols: List[str], benchmark: str = "^GSPC", period_days: int = 730,
+                  min_observations: int = 50) -> pd.Series:
+        """Bêtas de plusieurs actions: un seul chargement de l'indice et des titres, calcul matriciel"""
+        symbols = list(dict.fromkeys(s for s in symbols if isinstance(s, str) and s.strip()))
+        betas = pd.Series(np.nan, index=symbols, dtype=float)
+        if not symbols:
+            return betas
         try:
-            stock = yf.Ticker(ticker)
-            market = yf.Ticker("^GSPC")
             end_date = datetime.now()
-            start_date = end_date - timedelta(days=730)
-            stock_data = stock.history(start=start_date, end=end_date)
-            market_data = market.history(start=start_date, end=end_date)
-            if len(stock_data) < 50 or len(market_data) < 50:
-                beta = stock.info.get('beta', 1.0)
-                return beta if beta is not None else 1.0
-            stock_returns = stock_data['Close'].pct_change().dropna()
-            market_returns = market_data['Close'].pct_change().dropna()
-            common_dates = stock_returns.index.intersection(market_returns.index)
-            stock_returns = stock_returns.loc[common_dates]
-            market_returns = market_returns.loc[common_dates]
-            covariance = np.cov(stock_returns, market_returns)[0, 1]
-            market_variance = np.var(market_returns)
-            beta = covariance / market_variance if market_variance > 0 else 1.0
-            return beta
+            start_date = end_date - timedelta(days=period_days)
+            closes = get_price_store().get_history(symbols + [benchmark], start_date, end_date)
+            if benchmark in closes.columns and closes[benchmark].count() >= min_observations:
+                # Rendements calculés sur les cours disponibles de chaque titre (jours fériés propres à chaque place)
+                returns = closes / closes.ffill().shift(1) - 1
+                present = [s for s in symbols if s in closes.columns and closes[s].count() >= min_observations]
+                stock_returns = returns[present].to_numpy(dtype=float)
+                market_returns = returns[benchmark].to_numpy(dtype=float)[:, None]
+                mask = ~np.isnan(stock_returns) & ~np.isnan(market_returns)
+                x = np.where(mask, stock_returns, 0.0)
+                m = np.where(mask, market_returns, 0.0)
+                n = mask.sum(axis=0)
+                with np.errstate(all='ignore'):
+                    mean_x = x.sum(axis=0) / n
+                    mean_m = m.sum(axis=0) / n
+                    covariance = (((x - mean_x) * (m - mean_m)) * mask).sum(axis=0) / (n - 1)
+                    market_variance = (((m - mean_m) ** 2) * mask).sum(axis=0) / (n - 1)
+                    beta = np.where(market_variance > 0, covariance / market_variance, 1.0)
+                betas.loc[present] = np.where(n > 1, beta, np.nan)
+        except Exception as e:
+            print(f"Erreur lors du calcul des bêtas: {e}")
+        for symbol in betas.index[betas.isna()]:
+            betas[symbol] = RiskPerformanceAnalyzer._reported_beta(symbol)
+        return betas
+
+    @staticmethod
+    def _reported_beta(symbol: str) -> float:
+        """Bêta publié par Yahoo (via le cache de métadonnées) à défaut d'historique suffisant"""
+        try:
+            cached = get_metadata_cache().get(symbol) or {}
+            if 'beta' not in cached:
+                cached = TickerService.validate_ticker(symbol)
+            beta = cached.get('beta')
+            return float(beta) if beta is not None else 1.0
         except Exception as e:
-            print(f"Erreur lors du calcul du bêta pour {ticker}: {e}")
+            print(f"Erreur lors du calcul du bêta pour {symbol}: {e}")
             return 1.0
 
     @staticmethod
-    def calculate_advanced_metrics(df: pd.DataFrame, period_days: int = 252) -> Dict:
-        """Calcule les métriques avancées de risque et performance"""
+    @timed()
+    def calculate_advanced_metrics(df: pd.DataFrame, period_days: int = 252, benchmark: str = "^GSPC",
+                                   beta_window_days: int = 730, start_date=None) -> Dict:
+        """Calcule les métriques avancées de risque et performance à partir de la valorisation historique"""
+        metrics = {
+            'sharpe_ratio': 0,
+            'sortino_ratio': 0,
+            'calmar_ratio': 0,
+            'max_drawdown': 0,
+            'var_95': 0,
+            'cvar_95': 0,
+            'beta': 1.0,
+            'alpha': 0,
+            'information_ratio': 0,
+            'treynor_ratio': 0,
+            'portfolio_return': 0,
+            'portfolio_volatility': 0,
+            'history_days': 0
+        }
         if 'perf' not in df.columns or 'weight' not in df.columns or len(df) == 0:
-            return {
-                'sharpe_ratio': 0,
-                'sortino_ratio': 0,
-                'calmar_ratio': 0,
-                'max_drawdown': 0,
-                'var_95': 0,
-                'cvar_95': 0,
-                'beta': 1.0,
-                'alpha': 0,
-                'information_ratio': 0,
-                'treynor_ratio': 0,
-                'portfolio_return': 0,
-                'portfolio_volatility': 0
-            }
-        returns = df['perf'].values / 100
-        weights = df['weight'].values / 100
+            return metrics
+        risk_free_rate = 0.02
+        try:
+            history = PortfolioHistory.valuation(df, start_date=start_date)
+            metrics.update(PortfolioHistory.performance_metrics(
+                history['return'], periods_per_year=period_days, risk_free_rate=risk_free_rate
+            ))
+        except Exception as e:
+            print(f"Erreur lors de la valorisation historique: {e}")
+            return metrics
+        if metrics['history_days'] == 0:
+            return metrics
+        annualized_return = metrics['portfolio_return']
+        annualized_volatility = metrics['portfolio_volatility']
+        weights = df['weight'].to_numpy(dtype=float) / 100
         if np.sum(weights) > 0:
             weights = weights / np.sum(weights)
         else:
             weights = np.ones(len(weights)) / len(weights)
-        portfolio_return = np.sum(weights * returns)
-        individual_volatilities = np.abs(returns - np.mean(returns))
-        portfolio_volatility = np.sqrt(np.sum((weights**2) * (individual_volatilities**2)))
-        annualized_return = portfolio_return * period_days
-        annualized_volatility = portfolio_volatility * np.sqrt(period_days)
-        risk_free_rate = 0.02
-        sharpe_ratio = (annualized_return - risk_free_rate) / annualized_volatility if annualized_volatility > 0 else 0
-        negative_returns = returns[returns < 0]
-        if len(negative_returns) > 0:
-            downside_deviation = np.std(negative_returns) * np.sqrt(period_days)
-        else:
-            downside_deviation = annualized_volatility
-        sortino_ratio = (annualized_return - risk_free_rate) / downside_deviation if downside_deviation > 0 else 0
-        sorted_returns = np.sort(returns)
-        max_drawdown = abs(sorted_returns[0]) if len(sorted_returns) > 0 else 0
-        calmar_ratio = annualized_return / max_drawdown if max_drawdown > 0 else 0
-        var_95 = np.percentile(returns, 5)
-        returns_below_var = returns[returns <= var_95]
-        cvar_95 = np.mean(returns_below_var) if len(returns_below_var) > 0 else var_95
         portfolio_beta = 1.0
         if 'symbol' in df.columns:
             try:
-                betas = []
-                for idx, row in df.iterrows():
-                    if pd.notna(row['symbol']) and row['symbol'].strip():
-                        beta = RiskPerformanceAnalyzer.get_beta(row['symbol'])
-                        betas.append(beta * weights[idx])
-                if betas:
-                    portfolio_beta = np.sum(betas)
+                symbols = df['symbol'].fillna('').astype(str).str.strip()
+                has_symbol = (symbols != '').to_numpy()
+                if has_symbol.any():
+                    betas = RiskPerformanceAnalyzer.get_betas(
+                        symbols[has_symbol].unique().tolist(),
+                        benchmark=benchmark,
+                        period_days=beta_window_days
+                    )
+                    portfolio_beta = float(np.sum(weights[has_symbol] * symbols[has_symbol].map(betas).to_numpy()))
             except:
                 portfolio_beta = 1.0
         market_return = 0.08
-        alpha = annualized_return - (risk_free_rate + portfolio_beta * (market_return - risk_free_rate))
         tracking_error = annualized_volatility * 0.8
-        information_ratio = alpha / tracking_error if tracking_error > 0 else 0
-        treynor_ratio = (annualized_return - risk_free_rate) / portfolio_beta if portfolio_beta > 0 else 0
-        return {
-            'sharpe_ratio': sharpe_ratio,
-            'sortino_ratio': sortino_ratio,
-            'calmar_ratio': calmar_ratio,
-            'max_drawdown': max_drawdown,
-            'var_95': var_95,
-            'cvar_95': cvar_95,
+        try:
+            market = get_price_store().get_history([benchmark], history.index[0], history.index[-1] + pd.Timedelta(days=1))
+            if benchmark in market.columns:
+                market_returns = market[benchmark].reindex(history.index).ffill().pct_change()
+                aligned = pd.concat([history['return'], market_returns], axis=1, keys=['portfolio', 'market']).dropna()
+                if len(aligned) >= 2:
+                    market_return = np.prod(1 + aligned['market'].to_numpy()) ** (period_days / len(aligned)) - 1
+                    tracking_error = (aligned['portfolio'] - aligned['market']).std() * np.sqrt(period_days)
+        except Exception as e:
+            print(f"Erreur lors du chargement de l'indice {benchmark}: {e}")
+        alpha = annualized_return - (risk_free_rate + portfolio_beta * (market_return - risk_free_rate))
+        metrics.update({
+            'calmar_ratio': annualized_return / metrics['max_drawdown'] if metrics['max_drawdown'] > 0 else 0,
             'beta': portfolio_beta,
             'alpha': alpha,
-            'information_ratio': information_ratio,
-            'treynor_ratio': treynor_ratio,
-            'portfolio_return': annualized_return,
-            'portfolio_volatility': annualized_volatility
-        }
+            'information_ratio': alpha / tracking_error if tracking_error > 0 else 0,
+            'treynor_ratio': (annualized_return - risk_free_rate) / portfolio_beta if portfolio_beta > 0 else 0
+        })
+        return metrics
 
     @staticmethod
     def get_performance_grade(sharpe_ratio: float, sortino_ratio: float) -> str:
@@ -1511,6 +4089,138 @@ class RiskPerformanceAnalyzer:
         else:
             return "D (Insuffisant)"
 
+JOB_FUNCTIONS = {
+    'optimisation': EfficientFrontier.get_efficient_frontier,
+    'frontier': EfficientFrontier.trace_efficient_frontier,
+    'simulation': EfficientFrontier.generate_efficient_frontier_curve,
+    'var': MonteCarloVaR.portfolio_var
+}
+
+JOB_FINAL_STATES = ('done', 'failed', 'cancelled')
+
+def _run_job(kind: str, job_id: str, progress, cancelled, args: tuple, kwargs: Dict) -> Any:
+    """Point d'entrée exécuté dans un processus du pool"""
+    def report(fraction: float, message: str = ''):
+        if cancelled.get(job_id):
+            raise JobCancelled(job_id)
+        progress[job_id] = (float(fraction), message)
+
+    report(0.0, "Démarrage")
+    return JOB_FUNCTIONS[kind](*args, progress_callback=report, **kwargs)
+
+class JobRunner:
+    """Exécute les calculs lourds dans un pool de processus avec progression et annulation.
+
+    La progression et les demandes d'annulation transitent par des dictionnaires partagés
+    (multiprocessing.Manager); un job annulé s'interrompt à son prochain point de progression.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or max(1, min(4, (os.cpu_count() or 2) - 1))
+        self._context = multiprocessing.get_context('spawn')
+        self._manager = None
+        self._executor = None
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._manager is None:
+            self._manager = self._context.Manager()
+            self._progress = self._manager.dict()
+            self._cancelled = self._manager.dict()
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.max_workers, mp_context=self._context)
+
+    def submit(self, kind: str, *args, **kwargs) -> str:
+        """Soumet un job (voir JOB_FUNCTIONS) et retourne son identifiant"""
+        if kind not in JOB_FUNCTIONS:
+            raise ValueError(f"Type de job inconnu: {kind}")
+        # Streamlit réinstalle un nouveau module __main__ à chaque rerun : pickle exige la
+        # fonction du module courant, pas celle capturée lors de la création du singleton
+        entry = getattr(sys.modules.get(_run_job.__module__), '_run_job', _run_job)
+        job_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._ensure_started()
+            self._progress[job_id] = (0.0, "En attente")
+            try:
+                future = self._executor.submit(entry, kind, job_id, self._progress, self._cancelled, args, kwargs)
+            except BrokenProcessPool:
+                self._executor = ProcessPoolExecutor(self.max_workers, mp_context=self._context)
+                future = self._executor.submit(entry, kind, job_id, self._progress, self._cancelled, args, kwargs)
+            self._futures[job_id] = future
+        return job_id
+
+    def status(self, job_id: str) -> Dict[str, Any]:
+        """État du job: pending, running, cancelling, done (avec 'result'), failed, cancelled ou unknown"""
+        future = self._futures.get(job_id)
+        if future is None:
+            return {'state': 'unknown', 'progress': 0.0, 'message': "Job introuvable"}
+        fraction, message = self._progress.get(job_id, (0.0, ''))
+        cancel_requested = bool(self._cancelled.get(job_id))
+        if not future.done():
+            if cancel_requested:
+                state = 'cancelling'
+            else:
+                state = 'running' if future.running() else 'pending'
+            return {'state': state, 'progress': fraction, 'message': message}
+        if future.cancelled() or (cancel_requested and future.exception() is not None):
+            return {'state': 'cancelled', 'progress': fraction, 'message': "Annulé"}
+        error = future.exception()
+        if error is not None:
+            return {'state': 'failed', 'progress': fraction, 'message': str(error) or type(error).__name__}
+        return {'state': 'done', 'progress': 1.0, 'message': "Terminé", 'result': future.result()}
+
+    def cancel(self, job_id: str):
+        """Annule un job en attente ou demande l'interruption d'un job en cours"""
+        future = self._futures.get(job_id)
+        if future is None or future.done():
+            return
+        self._cancelled[job_id] = True
+        future.cancel()
+
+    def forget(self, job_id: str):
+        """Libère les ressources d'un job terminé"""
+        with self._lock:
+            self._futures.pop(job_id, None)
+            if self._manager is not None:
+                self._progress.pop(job_id, None)
+                self._cancelled.pop(job_id, None)
+
+@st.cache_resource
+def get_job_runner() -> JobRunner:
+    """Instance partagée du gestionnaire de jobs"""
+    return JobRunner()
+
+def submit_session_job(key: str, kind: str, *args, **kwargs) -> Dict[str, Any]:
+    """Soumet un job et mémorise sa poignée dans la session; un job identique déjà lancé est réutilisé"""
+    if 'jobs' not in st.session_state:
+        st.session_state.jobs = {}
+    handle = st.session_state.jobs.get(key)
+    if handle is None or handle['state'] in ('failed', 'cancelled'):
+        handle = {
+            'id': get_job_runner().submit(kind, *args, **kwargs),
+            'kind': kind,
+            'state': 'pending',
+            'progress': 0.0,
+            'message': "En attente",
+            'submitted_at': time.time()
+        }
+        st.session_state.jobs[key] = handle
+    return handle
+
+def poll_session_job(handle: Dict[str, Any]) -> Dict[str, Any]:
+    """Met à jour la poignée; le résultat est recopié dans la session puis libéré du pool"""
+    if handle['state'] in JOB_FINAL_STATES:
+        return handle
+    runner = get_job_runner()
+    status = runner.status(handle['id'])
+    if status['state'] == 'unknown':
+        status = {'state': 'failed', 'progress': handle['progress'], 'message': "Job perdu (serveur redémarré)"}
+    handle.update(status)
+    if handle['state'] in JOB_FINAL_STATES:
+        runner.forget(handle['id'])
+    return handle
+
 def create_advanced_risk_analysis(df: pd.DataFrame, ticker_data: Optional[List[Dict]] = None):
     """Analyse de risque avancée avec frontière efficiente corrigée"""
     if not isinstance(df, pd.DataFrame):
@@ -1534,6 +4244,10 @@ def create_advanced_risk_analysis(df: pd.DataFrame, ticker_data: Optional[List[D
     try:
         metrics = RiskPerformanceAnalyzer.calculate_advanced_metrics(df)
         st.markdown("#### 📊 Métriques de Performance")
+        if metrics['history_days'] == 0:
+            st.warning("⚠️ Historique de prix indisponible: les métriques de risque ne peuvent pas être calculées")
+        else:
+            st.caption(f"Calculées sur {metrics['history_days']} séances de valorisation historique du portefeuille")
         grade = RiskPerformanceAnalyzer.get_performance_grade(
             metrics['sharpe_ratio'],
             metrics['sortino_ratio']
@@ -1556,6 +4270,50 @@ def create_advanced_risk_analysis(df: pd.DataFrame, ticker_data: Optional[List[D
             st.metric("Max Drawdown", f"{metrics['max_drawdown']:.2%}")
             st.metric("Calmar Ratio", f"{metrics['calmar_ratio']:.3f}")
             st.metric("Information Ratio", f"{metrics['information_ratio']:.3f}")
+        if 'symbol' in df.columns and 'amount' in df.columns:
+            with st.expander("🎲 VaR/CVaR par simulation Monte Carlo"):
+                var_methods = {
+                    "Bootstrap historique": 'historical',
+                    "Normale": 'normal',
+                    "Student-t (ν=5)": 'student_t',
+                    "Historique filtrée (EWMA)": 'filtered'
+                }
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    selected_var_method = st.selectbox("Méthode", list(var_methods.keys()), key="var_method")
+                with col2:
+                    num_scenarios = st.select_slider("Scénarios", [10_000, 50_000, 100_000, 250_000, 500_000], value=100_000)
+                with col3:
+                    horizon_days = st.number_input("Horizon (jours)", min_value=1, max_value=60, value=1, step=1)
+                exposures = df.assign(symbol=df['symbol'].fillna('').astype(str).str.strip())
+                exposures = exposures[exposures['symbol'] != ''].groupby('symbol')['amount'].sum()
+                end_date = datetime.now()
+                start_date = end_date - timedelta(days=730)
+                var_key = (f"var:{var_methods[selected_var_method]}:{num_scenarios}:{horizon_days}:{start_date:%Y-%m-%d}:"
+                           + "|".join(f"{symbol}={value:.2f}" for symbol, value in exposures.items()))
+                if st.button("🎲 Lancer la simulation", key="run_var"):
+                    submit_session_job(
+                        var_key,
+                        'var',
+                        exposures.index.tolist(),
+                        exposures.tolist(),
+                        start_date.strftime('%Y-%m-%d'),
+                        end_date.strftime('%Y-%m-%d'),
+                        num_scenarios=num_scenarios,
+                        horizon_days=int(horizon_days),
+                        method=var_methods[selected_var_method],
+                        seed=42
+                    )
+                handle = st.session_state.get('jobs', {}).get(var_key)
+                if handle is not None:
+                    if poll_session_job(handle)['state'] not in JOB_FINAL_STATES:
+                        job_progress(handle)
+                    elif handle['state'] == 'done' and 'error' not in handle['result']:
+                        display_var_results(handle['result'])
+                    elif handle['state'] == 'done':
+                        st.error(f"❌ {handle['result']['error']}")
+                    elif handle['state'] == 'failed':
+                        st.error(f"❌ Erreur lors de la simulation: {handle['message']}")
         st.markdown("#### 📈 Profil de Risque")
         metrics_normalized = {
             'Sharpe Ratio': max(0, min(metrics['sharpe_ratio'] / 3, 1)),
@@ -1600,81 +4358,44 @@ def create_advanced_risk_analysis(df: pd.DataFrame, ticker_data: Optional[List[D
                     days_back = periods[selected_period]
                     end_date = datetime.now()
                     start_date = end_date - timedelta(days=days_back)
+                    cov_methods = {
+                        "Échantillon": 'sample',
+                        "Ledoit-Wolf": 'ledoit_wolf',
+                        "EWMA (λ=0.94)": 'ewma'
+                    }
+                    selected_cov_method = st.selectbox("Estimateur de covariance", list(cov_methods.keys()))
                 with col2:
-                    max_tickers = min(10, len(valid_symbols))
                     selected_tickers = st.multiselect(
-                        "Sélectionner les actifs (max 10)",
+                        "Sélectionner les actifs",
                         valid_symbols,
-                        default=valid_symbols[:max_tickers],
-                        max_selections=10
+                        default=valid_symbols
                     )
+                job_key = "optimisation:" + "|".join(sorted(selected_tickers)) + f":{start_date:%Y-%m-%d}:{cov_methods[selected_cov_method]}"
                 if st.button("🔄 Optimiser le portefeuille", key="optimize_portfolio"):
                     if len(selected_tickers) >= 2:
-                        with st.spinner("Calcul de l'optimisation..."):
-                            optimal_weights_df, metrics_ef = EfficientFrontier.get_efficient_frontier(
-                                selected_tickers,
-                                start_date.strftime('%Y-%m-%d'),
-                                end_date.strftime('%Y-%m-%d')
-                            )
-                            if not optimal_weights_df.empty and 'error' not in metrics_ef:
-                                st.success("✅ Optimisation réussie!")
-                                col1, col2, col3 = st.columns(3)
-                                with col1:
-                                    st.metric("Rendement Optimal", f"{metrics_ef['expected_return']:.2%}")
-                                with col2:
-                                    st.metric("Volatilité Optimale", f"{metrics_ef['volatility']:.2%}")
-                                with col3:
-                                    st.metric("Sharpe Ratio Optimal", f"{metrics_ef['sharpe_ratio']:.3f}")
-                                st.subheader("🎯 Allocation Optimale")
-                                comparison_data = []
-                                for symbol in optimal_weights_df.index:
-                                    current_weight = 0
-                                    if symbol in df['symbol'].values:
-                                        mask = df['symbol'] == symbol
-                                        if mask.any():
-                                            current_weight = df.loc[mask, 'weight'].iloc[0] / 100
-                                    optimal_weight = optimal_weights_df.loc[symbol, 'weight']
-                                    comparison_data.append({
-                                        'Actif': symbol,
-                                        'Poids Actuel (%)': current_weight * 100,
-                                        'Poids Optimal (%)': optimal_weight * 100,
-                                        'Différence (%)': (optimal_weight - current_weight) * 100
-                                    })
-                                comparison_df = pd.DataFrame(comparison_data)
-                                st.dataframe(
-                                    comparison_df.style.format({
-                                        'Poids Actuel (%)': '{:.2f}%',
-                                        'Poids Optimal (%)': '{:.2f}%',
-                                        'Différence (%)': '{:+.2f}%'
-                                    }).background_gradient(subset=['Différence (%)'], cmap='RdYlGn'),
-                                    use_container_width=True
-                                )
-                                fig_comparison = go.Figure()
-                                fig_comparison.add_trace(go.Bar(
-                                    name='Poids Actuel',
-                                    x=comparison_df['Actif'],
-                                    y=comparison_df['Poids Actuel (%)'],
-                                    marker_color='lightcoral'
-                                ))
-                                fig_comparison.add_trace(go.Bar(
-                                    name='Poids Optimal',
-                                    x=comparison_df['Actif'],
-                                    y=comparison_df['Poids Optimal (%)'],
-                                    marker_color='lightblue'
-                                ))
-                                fig_comparison.update_layout(
-                                    title='Comparaison Allocation Actuelle vs Optimale',
-                                    xaxis_title='Actifs',
-                                    yaxis_title='Poids (%)',
-                                    barmode='group',
-                                    height=400
-                                )
-                                st.plotly_chart(fig_comparison, use_container_width=True)
-                            else:
-                                error_msg = metrics_ef.get('error', 'Erreur inconnue')
-                                st.error(f"❌ Erreur lors de l'optimisation: {error_msg}")
+                        current_weights = df.groupby('symbol')['weight'].sum().to_dict()
+                        submit_session_job(
+                            job_key,
+                            'optimisation',
+                            selected_tickers,
+                            start_date.strftime('%Y-%m-%d'),
+                            end_date.strftime('%Y-%m-%d'),
+                            current_weights=current_weights,
+                            frontier_points=25,
+                            cov_method=cov_methods[selected_cov_method]
+                        )
+                        st.session_state.active_optimisation = job_key
                     else:
                         st.warning("⚠️ Sélectionnez au moins 2 actifs")
+                active_key = st.session_state.get('active_optimisation')
+                handle = st.session_state.get('jobs', {}).get(active_key) if active_key else None
+                if handle is not None:
+                    if active_key != job_key:
+                        st.caption("Résultat de la dernière optimisation lancée (paramètres différents de la sélection actuelle)")
+                    if poll_session_job(handle)['state'] in JOB_FINAL_STATES:
+                        display_optimisation_job(df, handle)
+                    else:
+                        job_progress(handle)
             else:
                 st.warning(f"⚠️ Au moins 2 symboles valides requis. Trouvés: {len(valid_symbols)}")
         else:
@@ -1683,28 +4404,163 @@ def create_advanced_risk_analysis(df: pd.DataFrame, ticker_data: Optional[List[D
         st.error(f"❌ Erreur lors de l'analyse: {str(e)}")
         st.write("Débogage:", str(e))
 
+def display_var_results(results: Dict):
+    """Affiche les VaR/CVaR simulées"""
+    value = results['portfolio_value']
+    col1, col2, col3, col4 = st.columns(4)
+    for column, level in zip((col1, col2), (0.95, 0.99)):
+        with column:
+            st.metric(f"VaR {level:.0%}", f"{results['var'][level]:,.0f}", f"{-results['var'][level] / value:.2%}" if value else None)
+    for column, level in zip((col3, col4), (0.95, 0.99)):
+        with column:
+            st.metric(f"CVaR {level:.0%}", f"{results['cvar'][level]:,.0f}", f"{-results['cvar'][level] / value:.2%}" if value else None)
+    st.caption(
+        f"{results['num_scenarios']:,} scénarios, horizon {results['horizon_days']} jour(s). "
+        f"P&L moyen: {results['expected_pnl']:,.0f}, écart-type: {results['pnl_volatility']:,.0f}"
+    )
+    if results.get('uncovered_value', 0) > 0:
+        st.warning(f"⚠️ {results['uncovered_value']:,.0f} de positions sans historique exclues de la simulation")
+
+def display_optimisation_results(df: pd.DataFrame, optimal_weights_df: pd.DataFrame, metrics_ef: Dict):
+    """Affiche le résultat d'une optimisation de portefeuille"""
+    if not optimal_weights_df.empty and 'error' not in metrics_ef:
+        st.success("✅ Optimisation réussie!")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Rendement Optimal", f"{metrics_ef['expected_return']:.2%}")
+        with col2:
+            st.metric("Volatilité Optimale", f"{metrics_ef['volatility']:.2%}")
+        with col3:
+            st.metric("Sharpe Ratio Optimal", f"{metrics_ef['sharpe_ratio']:.3f}")
+        st.subheader("🎯 Allocation Optimale")
+        comparison_data = []
+        for symbol in optimal_weights_df.index:
+            current_weight = 0
+            if symbol in df['symbol'].values:
+                mask = df['symbol'] == symbol
+                if mask.any():
+                    current_weight = df.loc[mask, 'weight'].iloc[0] / 100
+            optimal_weight = optimal_weights_df.loc[symbol, 'weight']
+            comparison_data.append({
+                'Actif': symbol,
+                'Poids Actuel (%)': current_weight * 100,
+                'Poids Optimal (%)': optimal_weight * 100,
+                'Différence (%)': (optimal_weight - current_weight) * 100
+            })
+        comparison_df = pd.DataFrame(comparison_data)
+        st.dataframe(
+            comparison_df.style.format({
+                'Poids Actuel (%)': '{:.2f}%',
+                'Poids Optimal (%)': '{:.2f}%',
+                'Différence (%)': '{:+.2f}%'
+            }).background_gradient(subset=['Différence (%)'], cmap='RdYlGn'),
+            use_container_width=True
+        )
+        fig_comparison = go.Figure()
+        fig_comparison.add_trace(go.Bar(
+            name='Poids Actuel',
+            x=comparison_df['Actif'],
+            y=comparison_df['Poids Actuel (%)'],
+            marker_color='lightcoral'
+        ))
+        fig_comparison.add_trace(go.Bar(
+            name='Poids Optimal',
+            x=comparison_df['Actif'],
+            y=comparison_df['Poids Optimal (%)'],
+            marker_color='lightblue'
+        ))
+        fig_comparison.update_layout(
+            title='Comparaison Allocation Actuelle vs Optimale',
+            xaxis_title='Actifs',
+            yaxis_title='Poids (%)',
+            barmode='group',
+            height=400
+        )
+        st.plotly_chart(fig_comparison, use_container_width=True)
+        if metrics_ef.get('frontier_returns'):
+            fig_frontier = go.Figure()
+            fig_frontier.add_trace(go.Scatter(
+                x=metrics_ef['frontier_volatilities'],
+                y=metrics_ef['frontier_returns'],
+                mode='lines+markers',
+                name='Frontière efficiente'
+            ))
+            fig_frontier.add_trace(go.Scatter(
+                x=[metrics_ef['volatility']],
+                y=[metrics_ef['expected_return']],
+                mode='markers',
+                marker=dict(size=14, symbol='star'),
+                name='Portefeuille optimal'
+            ))
+            fig_frontier.update_layout(
+                title='Frontière Efficiente',
+                xaxis_title='Volatilité',
+                yaxis_title='Rendement attendu',
+                xaxis_tickformat='.0%',
+                yaxis_tickformat='.0%',
+                height=400
+            )
+            st.plotly_chart(fig_frontier, use_container_width=True)
+    else:
+        error_msg = metrics_ef.get('error', 'Erreur inconnue')
+        st.error(f"❌ Erreur lors de l'optimisation: {error_msg}")
+
+def display_optimisation_job(df: pd.DataFrame, handle: Dict[str, Any]):
+    """Affiche l'issue d'un job d'optimisation terminé"""
+    if handle['state'] == 'cancelled':
+        st.info("⏹️ Optimisation annulée")
+    elif handle['state'] == 'failed':
+        st.error(f"❌ Erreur lors de l'optimisation: {handle['message']}")
+    else:
+        display_optimisation_results(df, *handle['result'])
+
+@st.fragment(run_every=1)
+def job_progress(handle: Dict[str, Any]):
+    """Suit un job en cours sans bloquer le reste de la page"""
+    poll_session_job(handle)
+    if handle['state'] in JOB_FINAL_STATES:
+        st.rerun()
+    st.progress(min(max(handle['progress'], 0.0), 1.0), text=f"⏳ {handle['message']}")
+    if handle['state'] == 'cancelling':
+        st.caption("Annulation en cours...")
+    elif st.button("⏹️ Annuler", key=f"cancel_{handle['id']}"):
+        get_job_runner().cancel(handle['id'])
+
+EXPORT_COLUMN_NAMES = {
+    'name': 'Nom',
+    'symbol': 'Symbole',
+    'quantity': 'Quantité',
+    'buyingPrice': 'Prix_Achat',
+    'lastPrice': 'Prix_Actuel',
+    'amount': 'Montant',
+    'weight_pct': 'Poids_Pct',
+    'perf': 'Performance_Pct',
+    'sector': 'Secteur',
+    'asset_type': 'Type_Actif'
+}
+
+def build_export_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Tableau des positions du rapport CSV"""
+    available_columns = [col for col in EXPORT_COLUMN_NAMES if col in df.columns]
+    return df[available_columns].rename(columns=EXPORT_COLUMN_NAMES)
+
+def build_json_report(df: pd.DataFrame) -> Dict:
+    """Contenu du rapport JSON: métadonnées et positions"""
+    return {
+        'metadata': {
+            'export_date': datetime.now().isoformat(),
+            'total_positions': len(df),
+            'total_value': df['amount'].sum() if 'amount' in df.columns else 0,
+            'portfolio_performance': (df['weight'] * df['perf']).sum() if all(col in df.columns for col in ['weight', 'perf']) else 0
+        },
+        'positions': df.to_dict('records')
+    }
+
 def export_portfolio_report(df: pd.DataFrame):
     """Permet d'exporter un rapport du portefeuille"""
     st.subheader("📤 Export du rapport")
     if st.button("📊 Générer rapport CSV"):
-        export_columns = ['name', 'symbol', 'quantity', 'buyingPrice', 'lastPrice',
-                          'amount', 'weight_pct', 'perf', 'sector', 'asset_type']
-        available_columns = [col for col in export_columns if col in df.columns]
-        export_df = df[available_columns].copy()
-        column_rename = {
-            'name': 'Nom',
-            'symbol': 'Symbole',
-            'quantity': 'Quantité',
-            'buyingPrice': 'Prix_Achat',
-            'lastPrice': 'Prix_Actuel',
-            'amount': 'Montant',
-            'weight_pct': 'Poids_Pct',
-            'perf': 'Performance_Pct',
-            'sector': 'Secteur',
-            'asset_type': 'Type_Actif'
-        }
-        export_df = export_df.rename(columns={k: v for k, v in column_rename.items() if k in export_df.columns})
-        csv = export_df.to_csv(index=False)
+        csv = build_export_frame(df).to_csv(index=False)
         st.download_button(
             label="💾 Télécharger CSV",
             data=csv,
@@ -1713,16 +4569,7 @@ def export_portfolio_report(df: pd.DataFrame):
         )
         st.success("✅ Rapport CSV généré avec succès!")
     if st.button("📋 Générer rapport JSON"):
-        report_data = {
-            'metadata': {
-                'export_date': datetime.now().isoformat(),
-                'total_positions': len(df),
-                'total_value': df['amount'].sum() if 'amount' in df.columns else 0,
-                'portfolio_performance': (df['weight'] * df['perf']).sum() if all(col in df.columns for col in ['weight', 'perf']) else 0
-            },
-            'positions': df.to_dict('records')
-        }
-        json_str = json.dumps(report_data, indent=2, ensure_ascii=False, default=str)
+        json_str = json.dumps(build_json_report(df), indent=2, ensure_ascii=False, default=str)
         st.download_button(
             label="💾 Télécharger JSON",
             data=json_str,
@@ -1736,63 +4583,177 @@ def export_portfolio_report(df: pd.DataFrame):
         else:
             st.info("Aucune donnée de portefeuille disponible")
 
+@st.fragment(run_every=0.5)
+def await_remote_search(query: str):
+    """Résultats partiels affichés: relance la page dès que la réponse Yahoo est en cache"""
+    if get_ticker_search_service().remote_state(query) == 'done':
+        st.rerun()
+
+def display_overview_tab(df: pd.DataFrame):
+    """Onglet vue d'ensemble: synthèse et répartitions"""
+    display_portfolio_summary(df)
+    col1, col2 = st.columns(2)
+    with col1:
+        if 'weight_pct' in df.columns:
+            fig_pie = cached_figure('positions', df, ['name', 'weight_pct'], lambda: px.pie(
+                df.head(10), values='weight_pct', names='name', title="Répartition par position (Top 10)", height=400
+            ))
+            st.plotly_chart(fig_pie, use_container_width=True)
+    with col2:
+        if 'asset_type' in df.columns and 'weight_pct' in df.columns:
+            fig_asset = cached_figure('asset_types', df, ['asset_type', 'weight_pct'], lambda: px.bar(
+                df.groupby('asset_type', observed=True)['weight_pct'].sum().reset_index(),
+                x='asset_type', y='weight_pct', title="Répartition par type d'actif", height=400
+            ))
+            st.plotly_chart(fig_asset, use_container_width=True)
+
+def display_diversification_tab(df: pd.DataFrame):
+    """Onglet diversification: concentration, secteurs et régions"""
+    st.subheader("🎯 Analyse de diversification")
+    concentration_metrics, sector_analysis, geo_analysis = get_diversification_analytics(df)
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Indice HHI", f"{concentration_metrics['hhi']:.3f}")
+    with col2:
+        st.metric("Actions effectives", f"{concentration_metrics['effective_stocks']:.1f}")
+    with col3:
+        st.metric("Top 3 concentration", f"{concentration_metrics['top3_concentration']:.1%}")
+    with col4:
+        st.metric("Niveau", concentration_metrics['concentration_level'])
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader("🏭 Diversification sectorielle")
+        if not sector_analysis.empty:
+            st.dataframe(sector_analysis.style.format({
+                'Weight_Pct': '{:.1f}%',
+                'Avg_Performance': '{:.2f}%'
+            }))
+            fig_sector = cached_figure('sectors', df, DIVERSIFICATION_COLUMNS, lambda: px.bar(
+                sector_analysis.head(8), x=sector_analysis.head(8).index, y='Weight_Pct',
+                title="Exposition sectorielle (%)", height=300
+            ).update_layout(xaxis_title="Secteur", yaxis_title="Poids (%)"))
+            st.plotly_chart(fig_sector, use_container_width=True)
+        else:
+            st.info("Données sectorielles non disponibles")
+    with col2:
+        st.subheader("🌍 Diversification géographique")
+        if not geo_analysis.empty:
+            st.dataframe(geo_analysis.style.format({
+                'Weight_Pct': '{:.1f}%',
+                'Avg_Performance': '{:.2f}%'
+            }))
+            fig_geo = cached_figure('regions', df, DIVERSIFICATION_COLUMNS, lambda: px.pie(
+                geo_analysis, values='Weight_Pct', names=geo_analysis.index, title="Répartition géographique", height=300
+            ))
+            st.plotly_chart(fig_geo, use_container_width=True)
+        else:
+            st.info("Données géographiques non disponibles")
+
+def display_recommendations_tab(df: pd.DataFrame):
+    """Onglet recommandations"""
+    st.subheader("🎯 Recommandations personnalisées")
+    concentration_metrics, sector_analysis, geo_analysis = get_diversification_analytics(df)
+    generate_recommendations(df, concentration_metrics, sector_analysis, geo_analysis)
+
+@st.fragment
+def render_tab(label: str, render: Callable[[pd.DataFrame], None], df: pd.DataFrame):
+    """Contenu d'un onglet en fragment: ses widgets ne réexécutent que cet onglet"""
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is None or not ctx.fragment_ids_this_run:
+        with span(f"Onglet {label}"):
+            render(df)
+        return
+    # Rerun du seul fragment: main() n'ouvre ni budget réseau ni trace pour lui
+    budget = start_fetch_budget()
+    trace = start_rerun_trace(scope=label)
+    degraded_notice = st.empty()
+    try:
+        with span(f"Onglet {label}"):
+            render(df)
+        display_degraded_mode(degraded_notice, budget)
+    finally:
+        finish_rerun_trace(trace)
+
 def main():
     """Fonction principale de l'application Streamlit"""
+    fetch_budget = start_fetch_budget()
+    trace = start_rerun_trace()
+    try:
+        render_page(fetch_budget)
+    finally:
+        # Aussi quand le rerun est interrompu par st.rerun() (ajout, suppression, actualisation des prix)
+        finish_rerun_trace(trace)
+    with st.sidebar:
+        display_instrumentation(trace)
+
+def render_page(fetch_budget: FetchBudget):
+    """Page de l'application: configuration, synthèse, onglets et gestion des positions"""
     st.title("📊 Portfolio Analyzer Pro")
     st.markdown("### Analysez et optimisez votre portefeuille d'investissement")
+    degraded_notice = st.empty()
     portfolio_manager = PortfolioManager()
     with st.sidebar:
         st.header("⚙️ Configuration")
         st.subheader("📁 Import/Export")
         uploaded_file = st.file_uploader(
             "Importer un portefeuille",
-            type=['csv', 'xlsx', 'json'],
-            help="Formats supportés: CSV, Excel, JSON"
+            type=['csv', 'xlsx', 'json', 'jsonl'],
+            help="Formats supportés: CSV, Excel, JSON, JSON Lines"
         )
-        if uploaded_file is not None:
+        # Le fichier reste attaché au widget: il n'est importé qu'une fois, pas à chaque rerun
+        if uploaded_file is not None and st.session_state.get('imported_file_id') != uploaded_file.file_id:
             try:
-                if uploaded_file.name.endswith('.csv'):
-                    df_imported = pd.read_csv(uploaded_file)
-                elif uploaded_file.name.endswith('.xlsx'):
-                    df_imported = pd.read_excel(uploaded_file)
-                elif uploaded_file.name.endswith('.json'):
-                    json_data = json.load(uploaded_file)
-                    if 'positions' in json_data:
-                        df_imported = pd.DataFrame(json_data['positions'])
-                    else:
-                        df_imported = pd.DataFrame(json_data)
-                df_enhanced = enhance_dataframe(df_imported)
-                st.session_state.portfolio_df = df_enhanced
-                st.session_state.original_df = df_imported.copy()
-                st.success(f"✅ Fichier importé: {len(df_enhanced)} positions")
+                progress_bar = st.progress(0.0, text="Import en cours...")
+                importer = PortfolioImporter(
+                    progress_callback=lambda fraction, message: progress_bar.progress(fraction, text=message)
+                )
+                with span('import'):
+                    df_imported = importer.read(uploaded_file, uploaded_file.name, uploaded_file.size)
+                    progress_bar.empty()
+                    df_enhanced = enhance_dataframe(df_imported)
+                portfolio_manager.replace_portfolio(df_enhanced)
+                st.session_state.imported_file_id = uploaded_file.file_id
+                st.success(f"✅ Fichier importé: {importer.rows_read:,} lignes regroupées en {len(df_enhanced)} positions")
             except Exception as e:
                 st.error(f"❌ Erreur lors de l'import: {str(e)}")
         st.subheader("➕ Ajouter une action")
         search_query = st.text_input("Rechercher un ticker ou nom d'entreprise")
         if search_query:
             with st.spinner("Recherche en cours..."):
-                search_results = TickerService.search_tickers(search_query, limit=5)
+                search_results = TickerService.search_tickers(search_query, limit=5, wait=0.1)
+            if get_ticker_search_service().remote_state(search_query) == 'pending':
+                await_remote_search(search_query)
             if search_results:
                 ticker_options = [f"{result['symbol']} - {result['name']}" for result in search_results]
-                selected_ticker_idx = st.selectbox(
+                # Options par libellé: la liste peut s'enrichir d'un rerun à l'autre (résultats Yahoo différés)
+                selected_ticker_label = st.selectbox(
                     "Sélectionner un ticker",
-                    range(len(ticker_options)),
-                    format_func=lambda x: ticker_options[x]
+                    ticker_options
                 )
-                selected_ticker = search_results[selected_ticker_idx]
+                selected_ticker = search_results[ticker_options.index(selected_ticker_label)]
                 with st.spinner("Validation du ticker..."):
                     ticker_data = TickerService.validate_ticker(selected_ticker['symbol'])
                 if ticker_data['valid']:
-                    st.info(f"**{ticker_data['name']}**\nPrix actuel: {ticker_data['price']:.2f} {ticker_data['currency']}")
+                    if ticker_data.get('stale'):
+                        price_time = ticker_data.get('price_time')
+                        as_of = f" du {datetime.fromtimestamp(price_time):%d/%m/%Y %H:%M}" if price_time else ""
+                        st.warning(f"⚠️ Yahoo Finance n'a pas répondu: dernier cours connu{as_of}, potentiellement obsolète")
+                        st.info(f"**{ticker_data['name']}**\nDernier cours connu: {ticker_data['price']:.2f} {ticker_data['currency']}")
+                    else:
+                        st.info(f"**{ticker_data['name']}**\nPrix actuel: {ticker_data['price']:.2f} {ticker_data['currency']}")
                     quantity = st.number_input("Quantité", min_value=1, value=1)
                     purchase_date = st.date_input("Date d'achat", datetime.now().strftime("%Y-%m-%d"))
                     st.write(f"**Date d'achat:** {purchase_date}")
                     st.markdown("**Prix d'achat:**")
-                    price_option = st.radio(
-                        "Choisir le prix d'achat",
-                        ["Prix actuel", "Prix personnalisé"],
-                        key="price_option"
-                    )
+                    if ticker_data.get('stale'):
+                        # Un cours obsolète n'est pas proposé comme prix d'achat
+                        price_option = "Prix personnalisé"
+                    else:
+                        price_option = st.radio(
+                            "Choisir le prix d'achat",
+                            ["Prix actuel", "Prix personnalisé"],
+                            key="price_option"
+                        )
                     buying_price = None
                     if price_option == "Prix actuel":
                         buying_price = ticker_data['price']
@@ -1839,8 +4800,8 @@ def main():
             else:
                 st.info("Aucun résultat trouvé")
     if not st.session_state.portfolio_df.empty:
-        df = st.session_state.portfolio_df
         metrics = portfolio_manager.update_portfolio_metrics()
+        df = st.session_state.portfolio_df
         col1, col2, col3, col4 = st.columns(4)
         with col1:
             st.metric("Valeur totale", f"{metrics['total_value']:,.2f} €")
@@ -1851,80 +4812,19 @@ def main():
         with col4:
             avg_weight = df['weight_pct'].mean() if 'weight_pct' in df.columns else 0
             st.metric("Poids moyen", f"{avg_weight:.1f}%")
-        tab1, tab2, tab3, tab4, tab5 = st.tabs([
-            "📊 Vue d'ensemble",
-            "📈 Diversification",
-            "⚠️ Analyse de risque",
-            "🎯 Recommandations",
-            "📤 Export"
-        ])
-        with tab1:
-            display_portfolio_summary(df)
-            col1, col2 = st.columns(2)
-            with col1:
-                if 'weight_pct' in df.columns:
-                    fig_pie = px.pie(df.head(10), values='weight_pct', names='name',
-                                   title="Répartition par position (Top 10)")
-                    fig_pie.update_layout(height=400)
-                    st.plotly_chart(fig_pie, use_container_width=True)
-            with col2:
-                if 'asset_type' in df.columns and 'weight_pct' in df.columns:
-                    asset_dist = df.groupby('asset_type')['weight_pct'].sum().reset_index()
-                    fig_asset = px.bar(asset_dist, x='asset_type', y='weight_pct',
-                                     title="Répartition par type d'actif")
-                    fig_asset.update_layout(height=400)
-                    st.plotly_chart(fig_asset, use_container_width=True)
-        with tab2:
-            st.subheader("🎯 Analyse de diversification")
-            concentration_metrics = DiversificationAnalyzer.calculate_concentration_metrics(df)
-            col1, col2, col3, col4 = st.columns(4)
-            with col1:
-                st.metric("Indice HHI", f"{concentration_metrics['hhi']:.3f}")
-            with col2:
-                st.metric("Actions effectives", f"{concentration_metrics['effective_stocks']:.1f}")
-            with col3:
-                st.metric("Top 3 concentration", f"{concentration_metrics['top3_concentration']:.1%}")
-            with col4:
-                st.metric("Niveau", concentration_metrics['concentration_level'])
-            col1, col2 = st.columns(2)
-            with col1:
-                st.subheader("🏭 Diversification sectorielle")
-                sector_analysis = DiversificationAnalyzer.analyze_sector_diversification(df)
-                if not sector_analysis.empty:
-                    st.dataframe(sector_analysis.style.format({
-                        'Weight_Pct': '{:.1f}%',
-                        'Avg_Performance': '{:.2f}%'
-                    }))
-                    fig_sector = px.bar(sector_analysis.head(8), x=sector_analysis.head(8).index,
-                                      y='Weight_Pct', title="Exposition sectorielle (%)")
-                    fig_sector.update_layout(height=300, xaxis_title="Secteur", yaxis_title="Poids (%)")
-                    st.plotly_chart(fig_sector, use_container_width=True)
-                else:
-                    st.info("Données sectorielles non disponibles")
-            with col2:
-                st.subheader("🌍 Diversification géographique")
-                geo_analysis = DiversificationAnalyzer.analyze_geographic_diversification(df)
-                if not geo_analysis.empty:
-                    st.dataframe(geo_analysis.style.format({
-                        'Weight_Pct': '{:.1f}%',
-                        'Avg_Performance': '{:.2f}%'
-                    }))
-                    fig_geo = px.pie(geo_analysis, values='Weight_Pct', names=geo_analysis.index,
-                                   title="Répartition géographique")
-                    fig_geo.update_layout(height=300)
-                    st.plotly_chart(fig_geo, use_container_width=True)
-                else:
-                    st.info("Données géographiques non disponibles")
-        with tab3:
-            create_advanced_risk_analysis(df)
-        with tab4:
-            st.subheader("🎯 Recommandations personnalisées")
-            concentration_metrics = DiversificationAnalyzer.calculate_concentration_metrics(df)
-            sector_analysis = DiversificationAnalyzer.analyze_sector_diversification(df)
-            geo_analysis = DiversificationAnalyzer.analyze_geographic_diversification(df)
-            generate_recommendations(df, concentration_metrics, sector_analysis, geo_analysis)
-        with tab5:
-            export_portfolio_report(df)
+        tab_renderers = {
+            "📊 Vue d'ensemble": display_overview_tab,
+            "📈 Diversification": display_diversification_tab,
+            "⚠️ Analyse de risque": create_advanced_risk_analysis,
+            "🎯 Recommandations": display_recommendations_tab,
+            "📤 Export": export_portfolio_report
+        }
+        # Seul l'onglet ouvert est calculé; changer d'onglet relance le script
+        tabs = st.tabs(list(tab_renderers), key="active_tab", on_change="rerun")
+        for tab, (label, render) in zip(tabs, tab_renderers.items()):
+            if tab.open:
+                with tab:
+                    render_tab(label, render, df)
         st.subheader("📋 Détail du portefeuille")
         display_columns = ['name', 'symbol', 'quantity', "purchase_date", 'buyingPrice', 'lastPrice',
                           'amount', 'weight_pct', 'perf', 'sector']
@@ -1965,10 +4865,13 @@ def main():
                 format_dict['Poids (%)'] = '{:.1f}'
             if 'Performance (%)' in df_display.columns:
                 format_dict['Performance (%)'] = '{:.2f}'
-            styled_df = df_display.style.format(format_dict)
-            if 'Performance (%)' in df_display.columns:
-                styled_df = styled_df.applymap(color_performance, subset=['Performance (%)'])
-            st.dataframe(styled_df, use_container_width=True, height=400)
+            if 'Date' in df_display.columns:
+                format_dict['Date'] = lambda d: f"{d:%Y-%m-%d}" if pd.notna(d) else ''
+            with span('Tableau détaillé (Styler)'):
+                styled_df = df_display.style.format(format_dict)
+                if 'Performance (%)' in df_display.columns:
+                    styled_df = styled_df.map(color_performance, subset=['Performance (%)'])
+                st.dataframe(styled_df, use_container_width=True, height=400)
         else:
             st.dataframe(df, use_container_width=True, height=400)
         st.subheader("🗑️ Gestion des positions")
@@ -1989,22 +4892,20 @@ def main():
             with col2:
                 if st.button("🔄 Actualiser les prix", type="primary"):
                     with st.spinner("Actualisation des prix en cours..."):
-                        updated_count = 0
-                        for idx, row in st.session_state.portfolio_df.iterrows():
-                            if 'symbol' in row and row['symbol']:
-                                try:
-                                    ticker_data = TickerService.validate_ticker(row['symbol'])
-                                    if ticker_data['valid']:
-                                        st.session_state.portfolio_df.at[idx, 'lastPrice'] = ticker_data['price']
-                                        updated_count += 1
-                                except:
-                                    continue
-                        if updated_count > 0:
+                        refresh_report = portfolio_manager.refresh_prices()
+                        st.session_state.price_refresh_report = refresh_report
+                        if refresh_report['updated'] > 0:
                             portfolio_manager.update_portfolio_metrics()
-                            st.success(f"✅ {updated_count} prix mis à jour!")
                             st.rerun()
                         else:
                             st.warning("Aucun prix n'a pu être mis à jour")
+                refresh_report = st.session_state.pop('price_refresh_report', None)
+                if refresh_report and refresh_report['updated'] > 0:
+                    st.success(f"✅ {refresh_report['updated']} prix mis à jour!")
+                if refresh_report and refresh_report['failed']:
+                    st.warning(f"Prix indisponibles: {', '.join(refresh_report['failed'])}")
+                if refresh_report and refresh_report['stale']:
+                    st.info(f"Prix potentiellement obsolètes: {', '.join(refresh_report['stale'])}")
     else:
         st.info("🚀 Commencez par importer un portefeuille ou ajouter des actions via la barre latérale.")
         with st.expander("📄 Format de fichier d'import"):
@@ -2024,6 +4925,9 @@ def main():
             Microsoft,MSFT,8,280.00
             ```
             """)
+    with st.sidebar:
+        display_session_memory()
+    display_degraded_mode(degraded_notice, fetch_budget)
 
 if __name__ == "__main__":
     main()